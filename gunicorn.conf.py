@@ -0,0 +1,44 @@
+# The settings of the production server, run it from the root of the repo with:
+#   gunicorn -c gunicorn.conf.py
+# Every setting can be changed with the environment variables below without editing this file.
+import os
+
+# The app served by the workers, the same one run.py starts
+wsgi_app = "run:flask_app"
+
+bind = os.environ.get("DMS_BIND", "0.0.0.0:49162")
+
+# This sets up one worker process per core, each handling a few requests at a time on its own threads
+workers = int(os.environ.get("DMS_WORKERS", os.cpu_count() or 1))
+worker_class = "gthread"
+threads = int(os.environ.get("DMS_THREADS", 4))
+
+# This loads the app (and the models, see when_ready) once in the parent before the workers are forked
+preload_app = True
+
+# The number of seconds a request may take and the number of seconds a worker gets to finish its requests on a reload
+timeout = int(os.environ.get("DMS_TIMEOUT", 120))
+graceful_timeout = int(os.environ.get("DMS_GRACEFUL_TIMEOUT", 30))
+
+# HTTPS is used when a certificate is given, otherwise it is expected to be handled in front of the server
+certfile = os.environ.get("DMS_CERTFILE")
+keyfile = os.environ.get("DMS_KEYFILE")
+
+accesslog = "-"
+
+
+def when_ready(server):
+    # This runs in the parent once the app is loaded, right before the first workers are forked
+    from src.serving import preload_models
+
+    app = server.app.wsgi()
+    app.config["SERVER_PID"] = os.getpid()  # lets a worker ask for a reload once it promotes new models
+    server.log.info("Preloaded %d models", preload_models(app))
+
+
+def on_reload(server):
+    # This runs in the parent on SIGHUP (sent after a model promotion or by systemctl reload) before the new workers
+    # are forked, the old workers finish the requests they are handling and exit
+    from src.serving import preload_models
+
+    server.log.info("Reloaded %d models", preload_models(server.app.wsgi()))
@@ -0,0 +1,143 @@
+import threading
+import time
+from functools import wraps
+
+from flask import session, redirect, url_for, flash, current_app
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from src.app import db
+from src.models import Admin
+
+
+class AdminCache:
+    '''
+    This remembers which emails are admins for a few seconds so the admin pages (and the job status polling) do not
+    query the admin_info table on every request. Only admins are remembered, so the cache holds at most one entry
+    per Admin row and someone who is not an admin is checked again every time.
+    Committing a change to an Admin row clears the cache of the process that made the change, the other web
+    workers see the change once their entries expire.
+    '''
+
+    def __init__(self, ttl=30):
+        '''
+        :param ttl: The number of seconds an answer is trusted before the table is read again
+        '''
+        self.ttl = ttl
+        self._entries = {}  # email -> expires
+        self._lock = threading.Lock()
+        self._generation = 0  # counts the invalidations so an answer read before one is not cached after it
+        self.hits = 0
+        self.misses = 0
+
+    def init_app(self, app):
+        '''
+        This function will set the time to live from the app config (ADMIN_CACHE_TTL)
+        :param app: The flask app
+        '''
+        self.ttl = app.config["ADMIN_CACHE_TTL"]
+        self.invalidate()
+
+    def is_admin(self, email) -> bool:
+        '''
+        This function will return whether an email belongs to an admin, reading the table only on a miss
+        :param email: The email of the logged in user
+        :return: True if there is an Admin row for the email
+        '''
+        now = time.monotonic()
+        with self._lock:
+            expires = self._entries.get(email)
+            if expires is not None and expires > now:
+                self.hits += 1
+                return True
+            self.misses += 1
+            generation = self._generation
+
+        is_admin = db.session.query(Admin.email).filter_by(email=email).first() is not None
+        with self._lock:
+            if is_admin and generation == self._generation:
+                self._entries[email] = now + self.ttl
+        return is_admin
+
+    def invalidate(self):
+        '''
+        This function will forget every cached answer, it is called whenever an Admin row changes
+        '''
+        with self._lock:
+            self._entries.clear()
+            self._generation += 1
+
+    def stats(self) -> dict:
+        '''
+        This function will return the hit and miss counts and the number of cached emails
+        '''
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "size": len(self._entries)}
+
+
+# The admin cache shared by every request handled by this process
+admin_cache = AdminCache()
+
+
+# A flush only changes the rows inside the transaction, the cache is cleared once the change is committed (or
+# rolled back, as this session may have cached a row it added) so no check can cache the old answer after it
+@event.listens_for(Session, "after_flush")
+def _admin_changed(session, flush_context):
+    if any(isinstance(row, Admin) for row in (*session.new, *session.dirty, *session.deleted)):
+        session.info["admin_changed"] = True
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _admin_bulk_changed(orm_execute_state):
+    # This catches Admin.query.delete() and other bulk statements that skip the flush
+    if (orm_execute_state.is_update or orm_execute_state.is_delete) and orm_execute_state.bind_mapper is not None \
+            and orm_execute_state.bind_mapper.class_ is Admin:
+        orm_execute_state.session.info["admin_changed"] = True
+
+
+@event.listens_for(Session, "after_commit")
+@event.listens_for(Session, "after_rollback")
+def _admin_committed(session):
+    if session.info.pop("admin_changed", False):
+        admin_cache.invalidate()
+
+
+def admin_denied():
+    '''
+    This function will check that the user in the session is an admin
+    :return: None if they are, otherwise the redirect to the home page (the session is logged out if it belongs to
+             someone who is not an admin)
+    '''
+    if not "username" in session:
+
+        # If not an admin, log out and redirect to home
+        flash("Access denied: You are not an admin.", "danger")
+
+        return redirect(url_for("core.home"))
+
+    username = session["username"]
+
+    if not admin_cache.is_admin(username):
+        # If not an admin, log out and redirect to home
+        flash("Access denied: You are not an admin.", "danger")
+        session.pop("username", None)
+
+        current_app.logger.error("Non-admin user had session active, logging out. Email: %s", username)
+
+        return redirect(url_for("core.home"))
+
+    return None
+
+
+def admin_required(view):
+    '''
+    This decorator will only run a route for a logged in admin, everyone else is sent to the home page
+    :param view: The route function
+    '''
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        denied = admin_denied()
+        if denied is not None:
+            return denied
+        return view(*args, **kwargs)
+    return wrapper
@@ -0,0 +1,177 @@
+import json
+import math
+import os
+
+import numpy as np
+import pandas as pd
+
+from src.encoder import soilDrainageMapping, floodFrequencyMapping
+
+# The number of CSV rows read into memory at a time
+CHUNK_SIZE = 100_000
+
+# The columns process_dataset does not train on
+dropped_columns = ['latitude', 'longitude', 'State', 'Soil_Surface_Texture']
+
+# The text columns are read as categories, which keep each distinct value once instead of a string for every row.
+# Cul_rating is left out as it is turned into numbers and the number columns are left to pandas so they get the same
+# types as process_dataset gives them
+CSV_DTYPES = {col: "category" for col in ['cul_matl', 'cul_type', 'Soil_Drainage_Class', 'Flooding_Frequency',
+                                          'State', 'Soil_Surface_Texture']}
+
+
+def _clean_chunk(chunk: pd.DataFrame):
+    '''
+    This function will apply the row filters of process_dataset to one chunk of the CSV
+    :param chunk: A chunk of the raw CSV
+    :return: The cleaned chunk (cul_type and cul_matl are still text), the cul_type and cul_matl values seen where
+        process_dataset one hot encodes them, and whether mapping the ordinal columns left any missing values
+    '''
+    chunk = chunk.dropna(axis=0).drop(columns=dropped_columns)
+
+    chunk = chunk[chunk.Cul_rating != "Unknown"]
+    chunk = chunk.assign(Cul_rating=chunk["Cul_rating"].astype(int))
+
+    chunk = chunk[chunk.cul_type != "UNKNOWN"]
+    types = chunk["cul_type"].unique()
+    chunk = chunk[chunk.cul_matl != "UNKNOWN"]
+    mats = chunk["cul_matl"].unique()
+
+    drainage = chunk['Soil_Drainage_Class'].map(soilDrainageMapping)
+    flooding = chunk['Flooding_Frequency'].map(floodFrequencyMapping)
+    missing = {
+        'Soil_Drainage_Class': bool(drainage.isna().any()),
+        'Flooding_Frequency': bool(flooding.isna().any()),
+    }
+    chunk = chunk.assign(Soil_Drainage_Class=drainage, Flooding_Frequency=flooding)
+    chunk = chunk[chunk['Flooding_Frequency'].notna()]
+
+    return chunk, types, mats, missing
+
+
+def _quantile(values, counts, q):
+    '''
+    This function will work out the linear quantile of a column from its sorted distinct values and their counts,
+    giving the same answer as Series.quantile on the full column
+    '''
+    total = int(counts.sum())
+    position = q * (total - 1)
+    lower = math.floor(position)
+    cumulative = np.cumsum(counts)
+    a = values[np.searchsorted(cumulative, lower, side='right')]
+    b = values[np.searchsorted(cumulative, min(lower + 1, total - 1), side='right')]
+
+    # The same interpolation numpy uses so the bounds match to the last bit
+    t = position - lower
+    return a + (b - a) * t if t < 0.5 else b - (b - a) * (1 - t)
+
+
+def process_dataset_file(csv_path, out_dir, chunksize=CHUNK_SIZE) -> int:
+    '''
+    This function will process a CSV the same way process_dataset does without ever holding the whole file in memory.
+    The first pass finds the one hot vocabulary, the column types and the Age value counts of each Cul_rating (which
+    give the exact quartiles), the second pass writes the rows that are kept into one numbered .npy file per column in out_dir.
+    :param csv_path: The path of the CSV to process
+    :param out_dir: The directory the processed columns are written to (see load_processed)
+    :param chunksize: The number of rows read at a time
+    :return: The number of rows in the processed dataset
+    '''
+    raw_types = {}
+    types, mats = set(), set()
+    missing = {'Soil_Drainage_Class': False, 'Flooding_Frequency': False}
+    age_counts = None
+
+    # First pass, everything the row filters and the outlier bounds need to know about the whole file
+    for raw in pd.read_csv(csv_path, chunksize=chunksize, dtype=CSV_DTYPES):
+        for col, dtype in raw.dtypes.items():
+            # The text columns are dropped, one hot encoded or mapped to numbers so their type is never used
+            dtype = np.dtype(object) if col in CSV_DTYPES else dtype
+            raw_types[col] = np.result_type(raw_types[col], dtype) if col in raw_types else dtype
+
+        chunk, chunk_types, chunk_mats, chunk_missing = _clean_chunk(raw)
+        types.update(chunk_types)
+        mats.update(chunk_mats)
+        for col, value in chunk_missing.items():
+            missing[col] = missing[col] or value
+
+        counts = chunk.groupby('Cul_rating')['Age'].value_counts()
+        age_counts = counts if age_counts is None else age_counts.add(counts, fill_value=0)
+
+    # The Age quartiles of each Cul_rating and the number of rows that are inside them
+    bounds = {}
+    num_rows = 0
+    if age_counts is not None:
+        for rate, counts in age_counts.groupby(level='Cul_rating'):
+            counts = counts.droplevel('Cul_rating').sort_index()
+            values = counts.index.to_numpy()
+            q1 = _quantile(values, counts.to_numpy(), 0.25)
+            q3 = _quantile(values, counts.to_numpy(), 0.75)
+            bounds[rate] = (q1, q3)
+            num_rows += int(counts[(values >= q1) & (values <= q3)].sum())
+
+    # The output columns and their types, matching what process_dataset gives for the whole file
+    dtypes = {}
+    for col, dtype in raw_types.items():
+        if col in dropped_columns or col in ('cul_type', 'cul_matl'):
+            continue
+        if col == 'Cul_rating':
+            dtype = np.dtype(int)
+        elif col in missing:
+            dtype = np.dtype(float) if missing[col] else np.dtype(np.int64)
+        dtypes[col] = dtype
+    for value in types:
+        dtypes[f"type_{value}"] = np.dtype(bool)
+    for value in mats:
+        dtypes[f"mat_{value}"] = np.dtype(bool)
+    columns = ['Cul_rating'] + sorted(col for col in dtypes if col != 'Cul_rating')
+
+    os.makedirs(out_dir, exist_ok=True)
+    # The files are numbered because category values can hold characters that are not allowed in a file name
+    arrays = {
+        col: np.lib.format.open_memmap(os.path.join(out_dir, f"{i}.npy"), mode="w+", dtype=dtypes[col], shape=(num_rows,))
+        for i, col in enumerate(columns)
+    }
+
+    # Second pass, the kept rows are written straight into the memory mapped columns
+    lower = pd.Series({rate: q1 for rate, (q1, q3) in bounds.items()}, dtype=float)
+    upper = pd.Series({rate: q3 for rate, (q1, q3) in bounds.items()}, dtype=float)
+    start = 0
+    if num_rows:
+        for raw in pd.read_csv(csv_path, chunksize=chunksize, dtype=CSV_DTYPES):
+            chunk = _clean_chunk(raw)[0]
+
+            q1 = chunk['Cul_rating'].map(lower)
+            q3 = chunk['Cul_rating'].map(upper)
+            chunk = chunk[(chunk['Age'] >= q1) & (chunk['Age'] <= q3)]
+            end = start + len(chunk)
+
+            for col in columns:
+                if col.startswith("type_") and col not in chunk:
+                    values = chunk['cul_type'].to_numpy() == col[len("type_"):]
+                elif col.startswith("mat_") and col not in chunk:
+                    values = chunk['cul_matl'].to_numpy() == col[len("mat_"):]
+                else:
+                    values = chunk[col].to_numpy()
+                arrays[col][start:end] = values
+            start = end
+
+    for array in arrays.values():
+        array.flush()
+    with open(os.path.join(out_dir, "columns.json"), "w") as f:
+        json.dump({"columns": columns, "rows": num_rows}, f)
+
+    return num_rows
+
+
+def load_processed(out_dir, mmap_mode="r") -> pd.DataFrame:
+    '''
+    This function will read a dataset written by process_dataset_file
+    :param out_dir: The directory the processed columns were written to
+    :param mmap_mode: How the columns are memory mapped, None reads them into memory
+    :return: The processed dataframe
+    '''
+    with open(os.path.join(out_dir, "columns.json")) as f:
+        columns = json.load(f)["columns"]
+    return pd.DataFrame({
+        col: np.load(os.path.join(out_dir, f"{i}.npy"), mmap_mode=mmap_mode) for i, col in enumerate(columns)
+    })
@@ -0,0 +1,235 @@
+import hashlib
+import json
+import os
+import shutil
+import threading
+
+# This is part of every cache key, raise it whenever process_dataset_file, the encoder or the training split change
+# so the datasets processed the old way are not used again
+PROCESSING_VERSION = 1
+
+ENTRY_FILE = "entry.json"
+
+# Every job using an entry leaves a file named <pid>-<job id> in this directory of the entry until it ends
+LEASE_DIR = "leases"
+
+# An entry is renamed to <key>.evicting-<pid> while it is removed
+EVICTING = ".evicting-"
+
+
+def file_hash(path) -> str:
+    '''
+    This function will return the SHA-256 of a file, read in blocks so the file is never in memory at once
+    :param path: The path of the file
+    :return: The hex digest
+    '''
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _alive(pid) -> bool:
+    '''
+    This function will return whether a process is running
+    :param pid: The process id, as a string
+    '''
+    try:
+        os.kill(int(pid), 0)
+    except ProcessLookupError:
+        return False
+    except (ValueError, OSError):
+        # The process belongs to another user
+        return True
+    return True
+
+
+def _dir_size(path) -> int:
+    return sum(os.path.getsize(os.path.join(root, name)) for root, _, names in os.walk(path) for name in names)
+
+
+class DatasetCache:
+    '''
+    This keeps the encoded training and testing splits of the uploaded datasets under instance/dataset-cache, keyed by
+    the hash of the uploaded file and the processing version, so uploading the same CSV again skips parsing,
+    cleaning and splitting it. Each entry is the directory written by save_split, which the training processes memory
+    map straight from the cache. The least recently used entries are removed once the cache is over its size, except
+    the ones a job is using: get and put give the job a lease on its entry until it calls release. A lease whose
+    process is gone (its worker was stopped) no longer counts.
+    '''
+
+    def __init__(self, cache_dir=None, max_bytes=2 * 1024 ** 3):
+        '''
+        :param cache_dir: The directory the entries are kept in
+        :param max_bytes: The largest total size of the entries, 0 turns the cache off
+        '''
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        '''
+        This function will set up the cache from the app config (DATASET_CACHE_SIZE)
+        :param app: The flask app
+        '''
+        self.cache_dir = os.path.join(app.instance_path, "dataset-cache")
+        self.max_bytes = app.config["DATASET_CACHE_SIZE"]
+
+    @property
+    def enabled(self) -> bool:
+        return self.cache_dir is not None and self.max_bytes > 0
+
+    def key(self, csv_path) -> str:
+        '''
+        This function will return the cache key of an uploaded file
+        :param csv_path: The path of the upload
+        '''
+        return f"{file_hash(csv_path)}-v{PROCESSING_VERSION}"
+
+    def entry_dir(self, key) -> str:
+        return os.path.join(self.cache_dir, key)
+
+    def get(self, key, user=None):
+        '''
+        This function will look up a processed dataset
+        :param key: The key from key()
+        :param user: The job that will use the dataset, the entry is not evicted until it calls release
+        :return: The split directory and the metadata stored with it, or None if the dataset is not cached
+        '''
+        if not self.enabled:
+            return None
+        entry = os.path.join(self.entry_dir(key), ENTRY_FILE)
+        try:
+            # The lease is taken before the entry is read, an eviction either sees it or has already moved the entry
+            if user is not None:
+                self._lease(key, user)
+            with open(entry) as f:
+                meta = json.load(f)
+        except FileNotFoundError:
+            if user is not None:
+                self.release(key, user)
+            return None
+
+        # The modification time of the entry file is when it was last used
+        os.utime(entry)
+        return self.entry_dir(key), meta
+
+    def put(self, key, split_dir, meta, user=None):
+        '''
+        This function will move a split written by save_split into the cache
+        :param key: The key from key()
+        :param split_dir: The split directory, it is moved so it must be on the same file system as the cache
+        :param meta: The metadata to store with it (e.g. the number of rows)
+        :param user: The job that will use the dataset, the entry is not evicted until it calls release
+        :return: The directory of the split in the cache, or split_dir itself when the cache is off
+        '''
+        if not self.enabled:
+            return split_dir
+
+        with open(os.path.join(split_dir, ENTRY_FILE), "w") as f:
+            json.dump(meta, f)
+        os.makedirs(os.path.join(split_dir, LEASE_DIR), exist_ok=True)
+        if user is not None:
+            open(os.path.join(split_dir, LEASE_DIR, self._lease_name(user)), "w").close()
+
+        os.makedirs(self.cache_dir, exist_ok=True)
+        with self._lock:
+            try:
+                os.rename(split_dir, self.entry_dir(key))
+            except OSError:
+                # Another job cached the same file first
+                if not os.path.exists(os.path.join(self.entry_dir(key), ENTRY_FILE)):
+                    raise
+                shutil.rmtree(split_dir)
+                if user is not None:
+                    self._lease(key, user)
+            self._evict(keep=key)
+        return self.entry_dir(key)
+
+    def release(self, key, user):
+        '''
+        This function will end the lease a job took on an entry with get or put
+        :param key: The key of the entry
+        :param user: The job
+        '''
+        if not self.enabled:
+            return
+        try:
+            os.remove(os.path.join(self.entry_dir(key), LEASE_DIR, self._lease_name(user)))
+        except FileNotFoundError:
+            pass
+
+    @staticmethod
+    def _lease_name(user) -> str:
+        return f"{os.getpid()}-{user}"
+
+    def _lease(self, key, user):
+        '''
+        This function will give a job a lease on an entry, it raises FileNotFoundError if the entry is gone
+        '''
+        leases = os.path.join(self.entry_dir(key), LEASE_DIR)
+        try:
+            open(os.path.join(leases, self._lease_name(user)), "w").close()
+        except FileNotFoundError:
+            # The entries cached before there were leases have no lease directory
+            if not os.path.exists(os.path.join(self.entry_dir(key), ENTRY_FILE)):
+                raise
+            os.makedirs(leases, exist_ok=True)
+            open(os.path.join(leases, self._lease_name(user)), "w").close()
+
+    @staticmethod
+    def _in_use(directory) -> bool:
+        '''
+        This function will return whether a job in a running process has a lease on the entry in a directory
+        '''
+        try:
+            names = os.listdir(os.path.join(directory, LEASE_DIR))
+        except FileNotFoundError:
+            return False
+        return any(_alive(name.split("-", 1)[0]) for name in names)
+
+    def _evict(self, keep):
+        '''
+        This function will remove the least recently used entries until the cache fits in max_bytes, entries that are
+        in use are skipped
+        :param keep: The key of the entry that was just added, it is never removed
+        '''
+        entries = []
+        for key in os.listdir(self.cache_dir):
+            if EVICTING in key:
+                # An entry a stopped process was removing
+                if not _alive(key.rsplit("-", 1)[1]):
+                    shutil.rmtree(self.entry_dir(key), ignore_errors=True)
+                continue
+            entry = os.path.join(self.entry_dir(key), ENTRY_FILE)
+            if key != keep and os.path.exists(entry):
+                entries.append((os.path.getmtime(entry), key))
+
+        total = _dir_size(self.cache_dir)
+        for _, key in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            if self._in_use(self.entry_dir(key)):
+                continue
+
+            # The entry is moved out of the way before it is deleted and put back if a job took a lease meanwhile
+            evicting = f"{self.entry_dir(key)}{EVICTING}{os.getpid()}"
+            try:
+                os.rename(self.entry_dir(key), evicting)
+            except OSError:
+                continue
+            if self._in_use(evicting):
+                try:
+                    os.rename(evicting, self.entry_dir(key))
+                    continue
+                except OSError:
+                    # Another job cached the same file again in the meantime, its copy is used from now on
+                    pass
+            size = _dir_size(evicting)
+            shutil.rmtree(evicting, ignore_errors=True)
+            total -= size
+
+    def clear(self):
+        if self.cache_dir is not None and os.path.exists(self.cache_dir):
+            shutil.rmtree(self.cache_dir)
@@ -1,8 +1,23 @@
-import pandas as pd
+from __future__ import annotations
+
 import os
-from datetime import datetime
+import io
+import time
+import csv
+from itertools import islice
+from typing import TYPE_CHECKING
+
+from src.encoder import FeatureEncoder, encoder_path, soilDrainageMapping, floodFrequencyMapping
+from src.storage import save_model, find_model_file, load_model
+from src.versions import create_version, promote, prune_versions
+from src.metrics import train_model_seconds, save_models_seconds
+
+# The number of trees (or boosting rounds) an incremental training adds to the current model
+INCREMENTAL_ESTIMATORS = 20
 
-from sklearn.metrics import accuracy_score
+# pandas and the model libraries take most of a second to import so they are only imported by the functions that use them
+if TYPE_CHECKING:
+    import pandas as pd
 
 
 def css_for_table():
@@ -37,71 +52,80 @@ def css_for_table():
     """
     return css
 
+def preview_dataset(stream, num_rows=5):
+    '''
+    This function will read the header and the first rows of an uploaded CSV and count the rest of the rows
+    one at a time, so the memory used stays the same no matter how big the file is
+    :param stream: The binary stream of the uploaded CSV
+    :param num_rows: The number of rows shown in the preview
+    :return: The preview dataframe, the number of rows and the column names from the header
+    '''
+    text = io.TextIOWrapper(stream, encoding="utf-8-sig", errors="replace", newline="")
+    try:
+        reader = csv.reader(text)
+        columns = next(reader, [])
+
+        # Blank lines are skipped the same way pandas skips them
+        rows = (row for row in reader if row)
+        head = list(islice(rows, num_rows))
+        num = len(head) + sum(1 for _ in rows)
+    finally:
+        # The wrapper is detached so it does not close the upload when it is garbage collected
+        text.detach()
+
+    # The preview rows are parsed by pandas so the columns get the same types as a full read
+    import pandas as pd
+
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    writer.writerows(head)
+    buffer.seek(0)
+    preview = pd.read_csv(buffer) if columns else pd.DataFrame()
+
+    return preview, num, columns
+
+
 def process_dataset(df: pd.DataFrame) -> pd.DataFrame:
     '''
     This function will process the dataset into the form that is needed to train the models and create a training and testing split
     :param df: This is the dataframe that is to be processed
     :return: This is the new processed dataframe
     '''
-    # Preprocess the dataset by dropping rows with any missing values and removing unnecessary columns
-    new_df = df.copy().dropna(axis=0)
-    new_df.drop(columns=['latitude', 'longitude','State','Soil_Surface_Texture'], axis=1, inplace=True)
-    new_df = new_df.fillna(new_df.mode().iloc[0])
+    import pandas as pd
 
-    # This makes sure that the Cul_rating column is of type integer
-    new_df = new_df[new_df.Cul_rating != "Unknown"]
-    new_df["Cul_rating"] = new_df["Cul_rating"].astype(int)
+    # Preprocess the dataset by dropping rows with any missing values and removing unnecessary columns
+    # This one null filter covers every numerical and ordinal column so they are not checked again
+    new_df = df.dropna(axis=0).drop(columns=['latitude', 'longitude', 'State', 'Soil_Surface_Texture'])
 
-    # This converts the cul_type column into one hot encoded columns
-    new_df = new_df[new_df.cul_type != "UNKNOWN"]
-    new_df_temp = pd.get_dummies(new_df["cul_type"], prefix='type')
-    new_df = pd.merge(left=new_df, right=new_df_temp, left_index=True, right_index=True)
-    new_df.drop(["cul_type"], axis=1, inplace=True)
+    # This removes the rows with an unknown rating or culvert type, the type columns come from the rows left
+    new_df = new_df[(new_df.Cul_rating != "Unknown") & (new_df.cul_type != "UNKNOWN")]
+    types = new_df["cul_type"].unique()
 
-    # This converts the cul_matl column into one hot encoded columns
+    # This removes the rows with an unknown culvert material, the material columns come from the rows left
     new_df = new_df[new_df.cul_matl != "UNKNOWN"]
-    new_df_temp = pd.get_dummies(new_df["cul_matl"], prefix='mat')
-    new_df = pd.merge(left=new_df, right=new_df_temp, left_index=True, right_index=True)
-    new_df.drop(["cul_matl"], axis=1, inplace=True)
-
-    # This makes sure that all the numerical columns don't have any missing values
-    new_df.dropna(subset=["Age"], axis=0, inplace=True)
-    new_df.dropna(subset=["Soil_Elec_Conductivity"], axis=0, inplace=True)
-    new_df.dropna(subset=["Soil_Moisture"], axis=0, inplace=True)
-    new_df.dropna(subset=["Soil_pH"], axis=0, inplace=True)
-    new_df.dropna(subset=["length"], axis=0, inplace=True)
-
-    # This maps the Soil_Drainage_Class column to numerical values
-    new_df.dropna(subset=['Soil_Drainage_Class'], axis=0, inplace=True)
-    new_df['Soil_Drainage_Class'] = new_df['Soil_Drainage_Class'].map(
-        {'Very poorly drained': 0,
-         'Poorly drained': 1,
-         'Somewhat poorly drained': 2,
-         'Moderately well drained': 3,
-         'Well drained': 4,
-         'High': 5,
-         'Somewhat excessively drained': 6,
-         'Excessively drained': 7, })
-
-    # This maps the Flooding_Frequency column to numerical values
-    new_df.dropna(subset=['Flooding_Frequency'], axis=0, inplace=True)
-    new_df['Flooding_Frequency'] = new_df['Flooding_Frequency'].map(
-        {'No': 0,
-         'very rare': 1,
-         'rare': 2,
-         'Occasional': 3,
-         'Frequent': 4, })
-    new_df.dropna(subset=['Flooding_Frequency'], axis=0, inplace=True)
-
-    # This removes outliers from the Age column based on the Cul_rating`
-    rates = new_df['Cul_rating'].unique()
-    rates.sort()
-    for rate in rates:
-        df = new_df['Age'][new_df.Cul_rating == rate]
-        q1 = df.quantile(q=0.25, interpolation='linear')
-        q3 = df.quantile(q=0.75, interpolation='linear')
-        new_df = new_df.drop(new_df[(new_df['Cul_rating'] == rate) & (new_df['Age'] < q1)].index)
-        new_df = new_df.drop(new_df[(new_df['Cul_rating'] == rate) & (new_df['Age'] > q3)].index)
+    mats = new_df["cul_matl"].unique()
+
+    # This makes sure that the Cul_rating column is of type integer and maps the ordinal columns to numerical values
+    new_df = new_df.assign(
+        Cul_rating=new_df["Cul_rating"].astype(int),
+        Soil_Drainage_Class=new_df['Soil_Drainage_Class'].map(soilDrainageMapping),
+        Flooding_Frequency=new_df['Flooding_Frequency'].map(floodFrequencyMapping),
+    )
+    new_df = new_df[new_df['Flooding_Frequency'].notna()]
+
+    # This removes outliers from the Age column based on the Cul_rating with one mask
+    ages = new_df.groupby('Cul_rating')['Age']
+    q1 = ages.transform('quantile', 0.25)
+    q3 = ages.transform('quantile', 0.75)
+    new_df = new_df[(new_df['Age'] >= q1) & (new_df['Age'] <= q3)]
+
+    # This converts the cul_type and cul_matl columns into one hot encoded columns
+    new_df = pd.concat([
+        new_df.drop(columns=['cul_type', 'cul_matl']),
+        pd.get_dummies(new_df["cul_type"].astype(pd.CategoricalDtype(types)), prefix='type'),
+        pd.get_dummies(new_df["cul_matl"].astype(pd.CategoricalDtype(mats)), prefix='mat'),
+    ], axis=1)
 
     # Order the columns in alphabetical order except for the target column which should be first
     target_col = 'Cul_rating'
@@ -112,7 +136,66 @@ def process_dataset(df: pd.DataFrame) -> pd.DataFrame:
 
     return new_df
 
-def train_model(name, path, db_path, X_train, Xtest, y_train, y_test):
+def load_current_model(path, db_path, model_format="pickle"):
+    '''
+    This function will load a model and its encoder from instance/current so it can be trained further
+    :param path: The file path of the model from AIModels
+    :param db_path: The instance directory
+    :param model_format: The format of the model from AIModels
+    :return: A (model, encoder) tuple or None if the model is not in instance/current
+    '''
+    found = find_model_file(db_path + "/current" + path, model_format)
+    if found is None:
+        return None
+
+    model = load_model(*found)
+    if os.path.exists(encoder_path(found[0])):
+        return model, FeatureEncoder.load(encoder_path(found[0]))
+    try:
+        return model, FeatureEncoder.from_model(model)
+    except ValueError:
+        return None
+
+
+def can_continue(name, model, y_train) -> bool:
+    '''
+    This function will check that a current model can be trained further on new data, the new labels must have
+    exactly the classes the model was trained with or its old and new trees would not agree on the class order
+    :param name: The name of the model
+    :param model: The current model (see load_current_model)
+    :param y_train: The new training labels
+    :return: True if train_model can continue from the model
+    '''
+    import numpy as np
+
+    if name == "Random Forest":
+        supported = hasattr(model, "estimators_") and "warm_start" in model.get_params()
+    elif name == "XGBoost":
+        supported = hasattr(model, "get_booster")
+    else:
+        supported = False
+    return supported and np.array_equal(np.unique(y_train), np.asarray(model.classes_))
+
+
+def build_model(name, n_jobs=None, params=None):
+    '''
+    This function will create an untrained model
+    :param name: The name of the model
+    :param n_jobs: The number of threads the model may use while training, None lets the library decide
+    :param params: Hyperparameters that replace the defaults (e.g. the best ones found by a search, see src/admin/search.py)
+    :return: The model or None if the model type is not supported
+    '''
+    if name == "Random Forest":
+        from sklearn.ensemble import RandomForestClassifier
+        return RandomForestClassifier(**{"n_estimators": 100, "random_state": 42, **(params or {})}, n_jobs=n_jobs)
+    if name == "XGBoost":
+        from xgboost import XGBClassifier
+        return XGBClassifier(**{"random_state": 42, **(params or {})}, n_jobs=n_jobs)
+    return None
+
+
+def train_model(name, path, db_path, X_train, Xtest, y_train, y_test, encoder=None, n_jobs=None, model_format="pickle",
+                base=None, params=None):
     '''
     This function will train a model based on the name provided.
     :param name: This is the name of the model to be trained.
@@ -122,11 +205,19 @@ def train_model(name, path, db_path, X_train, Xtest, y_train, y_test):
     :param X_test: This is the testing features.
     :param y_train: This is the training labels.
     :param y_test: This is the testing labels.
+    :param encoder: The FeatureEncoder fitted on the processed features, one is fitted on X_train if it is not given.
+                    X_train and Xtest may also be arrays that were already encoded with it.
+    :param n_jobs: The number of threads the model may use while training, None lets the library decide. The saved
+                   model does not keep it.
+    :param model_format: The format the model is saved in (AIModels.model_format), see src/storage.py.
+    :param base: A (model, encoder) tuple from load_current_model to train further instead of starting from nothing
+                 (see can_continue). The random forest gets INCREMENTAL_ESTIMATORS more trees trained on the new data
+                 and XGBoost INCREMENTAL_ESTIMATORS more boosting rounds, the features are encoded with its encoder.
+    :param params: Hyperparameters that replace the defaults of a model trained from nothing (see build_model).
     :return: The trained model's accuracy score on the test set.
     '''
-    from sklearn.ensemble import RandomForestClassifier
-    from xgboost import XGBClassifier
-    import pickle
+    import pandas as pd
+    from sklearn.metrics import accuracy_score
 
     db_dir = db_path + "/tmp"
 
@@ -135,73 +226,82 @@ def train_model(name, path, db_path, X_train, Xtest, y_train, y_test):
         os.mkdir(db_dir)
     else:
         # remove existing file if it exists
-        full_path = os.path.join(db_dir, path)
+        full_path = db_dir + path
         if os.path.exists(full_path):
             os.remove(full_path)
+        if os.path.exists(encoder_path(full_path)):
+            os.remove(encoder_path(full_path))
+
+    # The encoder fixes the column order so the model is trained on exactly what the rate page feeds it
+    if base is not None:
+        # A model trained further keeps the columns it was first trained with
+        base_model, base_encoder = base
+        if isinstance(X_train, pd.DataFrame):
+            X_train = base_encoder.transform_dataset(X_train)
+            Xtest = base_encoder.transform_dataset(Xtest)
+        else:
+            X_train = base_encoder.transform_encoded(X_train, encoder.columns)
+            Xtest = base_encoder.transform_encoded(Xtest, encoder.columns)
+        encoder = base_encoder
+    else:
+        if encoder is None:
+            encoder = FeatureEncoder.fit(X_train)
+        if isinstance(X_train, pd.DataFrame):
+            X_train = encoder.transform_dataset(X_train)
+            Xtest = encoder.transform_dataset(Xtest)
 
     # Train the model based on the name provided
-    if name == "Random Forest":
-        model = RandomForestClassifier(n_estimators=100, random_state=42)
-        model.fit(X_train, y_train)
-    elif name == "XGBoost":
-        model = XGBClassifier(random_state=42)
-        model.fit(X_train, y_train)
+    fit_params = {}
+    if name == "Random Forest" and base is not None:
+        model = base_model
+        model.set_params(warm_start=True, n_estimators=len(model.estimators_) + INCREMENTAL_ESTIMATORS, n_jobs=n_jobs)
+    elif name == "XGBoost" and base is not None:
+        model = build_model(name, n_jobs, {"n_estimators": INCREMENTAL_ESTIMATORS})
+        fit_params["xgb_model"] = base_model.get_booster()
     else:
+        model = build_model(name, n_jobs, params)
+    if model is None:
         return "Model type not supported."
 
+    with train_model_seconds.time(name):
+        model.fit(X_train, y_train, **fit_params)
+
+    if name == "Random Forest":
+        model.set_params(warm_start=False)
+
+    # The threads are only for training, a saved model that kept them would start a thread pool for every rating
+    model.set_params(n_jobs=None)
+
     # Save the trained model to the specified path
-    with open(db_dir + path, 'wb') as f:
-        pickle.dump(model, f)
+    save_model(model, db_dir + path, model_format)
+
+    # Save the encoder next to the model so both get promoted together
+    encoder.save(encoder_path(db_dir + path))
 
     # Return the accuracy score of the model on the test set
     return round(accuracy_score(y_test, model.predict(Xtest)),3)
 
 def save_models(db_path):
     '''
-    This function will save the trained models to the instance/current directory
+    This function will make the trained models in instance/tmp the current model set.
+    The models become a new version in instance/versions and instance/current is switched to it in one rename, so a
+    rating never sees a mix of old and new models. The older versions are kept for rollback (see src/versions.py).
     '''
 
-    temp_dir = db_path + "/tmp/"
-    current_dir = db_path + "/current/"
-
-    # If the current directory does not exist, create it
-    if not os.path.exists(current_dir):
-        os.mkdir(current_dir)
+    start = time.perf_counter()
+    temp_dir = os.path.join(db_path, "tmp")
 
     # If the temp directory does not exist, there are no models to save
-    if not os.path.exists(temp_dir):
+    if not os.path.exists(temp_dir) or not os.listdir(temp_dir):
         return "No models to save."
 
-    # Checks if the current directory exists and moves all files to a new directory called the current time stamp
-    if os.listdir(current_dir):
-        time_stamp = datetime.now().strftime("%Y-%m-%d_%H.%M.%S") # Format: YYYY-MM-DD_HH.MM.SS
-        new_dir = os.path.join(db_path, time_stamp) # New directory path
-        os.mkdir(new_dir) # Create the new directory
-
-        # Moves all files from the current directory to the new time stamp directory
-        for file_name in os.listdir(current_dir):
-            full_file_name = os.path.join(current_dir, file_name)
-            if os.path.isfile(full_file_name):
-                os.replace(full_file_name, os.path.join(new_dir, file_name))
-
-    # Moves all files from the temp directory to the current directory
-    for file_name in os.listdir(temp_dir):
-        full_file_name = os.path.join(temp_dir, file_name)
-        if os.path.isfile(full_file_name):
-            os.replace(full_file_name, os.path.join(current_dir, file_name))
-
-    os.rmdir(temp_dir)
-
-    # This removes the third-oldest time stamp directory if there are more than 2
-    time_stamp_dirs = [d for d in os.listdir(db_path) if os.path.isdir(os.path.join(db_path, d))]  # List of time stamp directories
-    if len(time_stamp_dirs) > 3:
-        time_stamp_dirs.sort()
-        dir_to_remove = os.path.join(db_path, time_stamp_dirs[0])  # Get the oldest directory
-        for file_name in os.listdir(dir_to_remove):
-            full_file_name = os.path.join(dir_to_remove, file_name)
-            if os.path.isfile(full_file_name):
-                os.remove(full_file_name)
-        os.rmdir(dir_to_remove)
+    # The temp directory becomes the new version and is made current
+    version_id = create_version(db_path, temp_dir)
+    promote(db_path, version_id)
+
+    # This removes the oldest versions once there are more than RETAINED_VERSIONS
+    prune_versions(db_path)
 
+    save_models_seconds.observe(time.perf_counter() - start)
     return "Models saved"
 
@@ -0,0 +1,549 @@
+import json
+import multiprocessing
+import os
+import shutil
+import signal
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor, wait
+from datetime import datetime
+
+from src.admin.dataset_cache import DatasetCache
+from src.admin.search import sample_configs, halving_rungs, run_trial
+from src.admin.training import save_processed_split, plan_threads, train_split_model
+from src.metrics import train_model_seconds
+
+
+def _prepare_dataset(csv_path, processed_dir, split_dir):
+    '''
+    This function runs in a pool process and turns the uploaded CSV into the encoded training and testing split
+    :param csv_path: The path of the uploaded CSV
+    :param processed_dir: The directory the processed dataset is written to
+    :param split_dir: The directory the split and its encoder are written to
+    :return: The number of rows left after processing
+    '''
+    from src.admin.dataset import process_dataset_file
+
+    # The CSV is processed in chunks and the split is gathered from the memory mapped columns in chunks, so the
+    # whole dataset is never in memory
+    rows = process_dataset_file(csv_path, processed_dir)
+    save_processed_split(split_dir, processed_dir)
+    return rows
+
+
+# A job whose status was not written for this many seconds is no longer running (its server was stopped)
+STALE_SECONDS = 60
+
+# The states of a job that has not ended
+RUNNING_STATES = ("queued", "preparing", "training")
+
+# The file in instance/jobs holding the pid of the server to reload once the running jobs end
+RELOAD_FILE = "reload-pending"
+
+
+class JobCancelled(Exception):
+    '''
+    This is raised inside a job when an admin cancelled it
+    '''
+
+
+class JobRunner:
+    '''
+    This runs the training jobs started from the admin page on a local process pool so the web workers stay free.
+    Every job gets a directory under instance/jobs holding its upload, its splits and a status.json file, so the
+    status can be read and the job cancelled from any web worker. Models are trained into the job directory and
+    only copied into instance/tmp once every model finished, ready for the dataset swap.
+    The models of a job train at the same time, each one memory mapping the same split, and the cores are divided
+    between the models and the threads inside each model.
+    The splits are kept in the dataset cache, so a job whose upload was already processed trains straight away.
+    A job can also be a hyperparameter search of one model (see create_search), which keeps its trials in its status
+    so it can be resumed after it was cancelled or its server stopped. A training job whose server stopped is
+    marked failed the next time its status is read.
+    The jobs run inside the web worker that started them, so a server reload asked for while one is running waits
+    until the last one ends (see defer_reload).
+    '''
+
+    def __init__(self, max_workers=2, cores=None, max_age=24 * 60 * 60):
+        '''
+        :param max_workers: The number of pool processes used for training
+        :param cores: The number of cores the training may use, every core is used if it is not given
+        :param max_age: The number of seconds a finished job is kept before its directory is removed
+        '''
+        self.max_workers = max_workers
+        self.cores = cores
+        self.max_age = max_age
+        self.jobs_dir = None
+        self._lock = threading.Lock()
+        self._pool = None
+        self.dataset_cache = DatasetCache()
+
+    def init_app(self, app):
+        '''
+        This function will set up the runner from the app config
+        :param app: The flask app
+        '''
+        self.max_workers = app.config["TRAINING_WORKERS"]
+        self.cores = app.config["TRAINING_CORES"]
+        self.jobs_dir = os.path.join(app.instance_path, "jobs")
+        self.dataset_cache.init_app(app)
+
+    def _get_pool(self):
+        # Spawned processes do not inherit the web server's threads or open connections
+        with self._lock:
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.max_workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                )
+            return self._pool
+
+    def create(self, models, mode="full") -> str:
+        '''
+        This function will create the directory and status of a new job
+        :param models: The (model_name, file_path, model_format) tuples of the models to train
+        :param mode: "full", "incremental" or "compare" (see train_split_model)
+        :return: The job id
+        '''
+        self._prune()
+
+        job_id = uuid.uuid4().hex
+        os.makedirs(self.job_dir(job_id))
+        self._write_status(job_id, {
+            "id": job_id,
+            "kind": "training",
+            "status": "queued",
+            "created": datetime.now().isoformat(timespec="seconds"),
+            "updated": datetime.now().isoformat(timespec="seconds"),
+            "rows": None,
+            "cached": False,
+            "mode": mode,
+            "error": None,
+            "models": [
+                {"name": model_name, "file_path": file_path, "format": model_format, "status": "pending", "accuracy": None}
+                for model_name, file_path, model_format in models
+            ],
+        })
+        return job_id
+
+    def create_search(self, model, space, num_configs=9, eta=3) -> str:
+        '''
+        This function will create a job that searches the hyperparameters of one model with successive halving, every
+        rung trains the best 1/eta of the configurations on eta times as much data and the best configuration of the
+        last rung is trained on the whole split, ready to be promoted into instance/tmp
+        :param model: The (model_name, file_path, model_format) tuple of the model
+        :param space: A dict of hyperparameter name to the list of values to try (see src/admin/search.py)
+        :param num_configs: The number of configurations in the first rung
+        :param eta: The factor the configurations are cut by every rung
+        :return: The job id
+        '''
+        job_id = self.create([model])
+        status = self.status(job_id)
+        status["kind"] = "search"
+        status["search"] = {"space": space, "eta": eta, "configs": sample_configs(space, num_configs)}
+        status["trials"] = []
+        status["best"] = None
+        status["promoted"] = False
+        self._write_status(job_id, status)
+        return job_id
+
+    def start(self, job_id, db_path):
+        '''
+        This function will start a job whose upload was saved to upload_path(job_id)
+        :param job_id: The job id from create
+        :param db_path: The instance directory the trained models are staged in
+        '''
+        thread = threading.Thread(target=self._run, args=(job_id, db_path), daemon=True, name=f"job-{job_id}")
+        thread.start()
+
+    def job_dir(self, job_id) -> str:
+        return os.path.join(self.jobs_dir, job_id)
+
+    def upload_path(self, job_id) -> str:
+        return os.path.join(self.job_dir(job_id), "upload.csv")
+
+    def status(self, job_id):
+        '''
+        This function will return the status of a job
+        :param job_id: The job id
+        :return: The status dict or None if there is no such job
+        '''
+        # Job ids are only ever hex strings, anything else cannot name a job directory
+        if not job_id.isalnum():
+            return None
+        try:
+            with open(os.path.join(self.job_dir(job_id), "status.json")) as f:
+                status = json.load(f)
+        except FileNotFoundError:
+            return None
+
+        # A training job cannot be resumed so one whose server stopped has failed, a search is left to be resumed
+        if status.get("kind") != "search" and self._stale(job_id, status):
+            status["status"] = "failed"
+            status["error"] = "The server stopped while the job was running."
+            for model in status["models"]:
+                if model["status"] in ("pending", "training"):
+                    model["status"] = "failed"
+            self._write_status(job_id, status)
+        return status
+
+    def _stale(self, job_id, status) -> bool:
+        '''
+        This function will return whether a job that has not ended stopped writing its status (its server stopped)
+        '''
+        if status["status"] not in RUNNING_STATES:
+            return False
+        path = os.path.join(self.job_dir(job_id), "status.json")
+        return time.time() - os.path.getmtime(path) > STALE_SECONDS
+
+    def interrupted(self, job_id) -> bool:
+        '''
+        This function will return whether a job stopped without ending, because it was cancelled or its server stopped
+        :param job_id: The job id
+        '''
+        status = self.status(job_id)
+        if status is None:
+            return False
+        return status["status"] == "cancelled" or self._stale(job_id, status)
+
+    def active_jobs(self) -> list:
+        '''
+        This function will list the jobs that are running in any worker
+        :return: The job ids
+        '''
+        if self.jobs_dir is None or not os.path.exists(self.jobs_dir):
+            return []
+        active = []
+        for job_id in os.listdir(self.jobs_dir):
+            status = self.status(job_id) if os.path.isdir(self.job_dir(job_id)) else None
+            if status is not None and status["status"] in RUNNING_STATES and not self._stale(job_id, status):
+                active.append(job_id)
+        return active
+
+    def defer_reload(self, server_pid) -> bool:
+        '''
+        This function will hold back a server reload while jobs are running, as the reload would stop them. The last
+        job to end sends it instead.
+        :param server_pid: The pid of the server to reload
+        :return: True if the reload was held back, False if it can be sent now
+        '''
+        if not self.active_jobs():
+            return False
+        path = os.path.join(self.jobs_dir, RELOAD_FILE)
+        with open(path + ".tmp", "w") as f:
+            f.write(str(server_pid))
+        os.replace(path + ".tmp", path)
+        return True
+
+    def _reload_if_pending(self):
+        '''
+        This function will send the reload held back by defer_reload once no job is running
+        '''
+        path = os.path.join(self.jobs_dir, RELOAD_FILE)
+        if not os.path.exists(path) or self.active_jobs():
+            return
+        try:
+            with open(path) as f:
+                server_pid = int(f.read())
+            # Removing the file claims the reload so only one worker sends it
+            os.remove(path)
+        except (OSError, ValueError):
+            return
+        os.kill(server_pid, signal.SIGHUP)
+
+    def resume(self, job_id, db_path) -> bool:
+        '''
+        This function will start an interrupted search again, the trials it already finished are not run again
+        :param job_id: The job id
+        :param db_path: The instance directory the best model is staged in
+        :return: True if the search was started again
+        '''
+        status = self.status(job_id)
+        if status is None or status.get("kind") != "search" or not self.interrupted(job_id) \
+                or not os.path.exists(self.upload_path(job_id)):
+            return False
+
+        # Everything but the upload and the status is made again
+        for file_name in os.listdir(self.job_dir(job_id)):
+            full_file_name = os.path.join(self.job_dir(job_id), file_name)
+            if os.path.isdir(full_file_name):
+                shutil.rmtree(full_file_name)
+            elif file_name not in ("status.json", "upload.csv"):
+                os.remove(full_file_name)
+
+        status["status"] = "queued"
+        status["error"] = None
+        for model in status["models"]:
+            model["status"] = "pending"
+        self._write_status(job_id, status)
+        self.start(job_id, db_path)
+        return True
+
+    def promote_search(self, job_id, db_path) -> bool:
+        '''
+        This function will move the model trained with the best configuration of a finished search into instance/tmp,
+        where the dataset swap picks it up
+        :param job_id: The job id
+        :param db_path: The instance directory
+        :return: True if the model was moved
+        '''
+        status = self.status(job_id)
+        if status is None or status.get("kind") != "search" or status["status"] != "finished" or status["promoted"]:
+            return False
+
+        self._stage_models(self.job_dir(job_id), db_path)
+        status["promoted"] = True
+        self._write_status(job_id, status)
+        return True
+
+    def cancel(self, job_id) -> bool:
+        '''
+        This function will ask a job to stop, a model that is already training finishes but is thrown away
+        :param job_id: The job id
+        :return: True if the job was still running
+        '''
+        status = self.status(job_id)
+        if status is None or status["status"] in ("finished", "failed", "cancelled"):
+            return False
+
+        # Nothing is running to notice the request when the server of a search stopped
+        if self._stale(job_id, status):
+            status["status"] = "cancelled"
+            self._write_status(job_id, status)
+            return True
+
+        open(os.path.join(self.job_dir(job_id), "cancel"), "w").close()
+        return True
+
+    def _run(self, job_id, db_path):
+        '''
+        This function runs on a background thread and walks a job through preparing the dataset and training each model
+        '''
+        job_dir = self.job_dir(job_id)
+        status = self.status(job_id)
+        pool = self._get_pool()
+        cache_key = None
+
+        try:
+            self._check_cancelled(job_id)
+            status["status"] = "preparing"
+            self._write_status(job_id, status)
+            cache_key, split_dir = self._prepare(job_id, status, pool)
+
+            status["status"] = "training"
+            if status.get("kind") == "search":
+                self._search(job_id, status, split_dir, pool)
+            else:
+                self._train(job_id, status, split_dir, db_path, pool)
+                self._check_cancelled(job_id)
+                self._stage_models(job_dir, db_path)
+            status["status"] = "finished"
+        except JobCancelled:
+            status["status"] = "cancelled"
+            for model in status["models"]:
+                if model["status"] in ("pending", "training"):
+                    model["status"] = "cancelled"
+        except Exception as e:
+            status["status"] = "failed"
+            status["error"] = str(e)
+        finally:
+            # Only the status is kept once the job is over, a search also keeps its best model until it is promoted
+            # and the upload while it can be resumed
+            keep = {"status.json"}
+            if status.get("kind") == "search":
+                keep.add("tmp")
+                if status["status"] == "cancelled":
+                    keep.add("upload.csv")
+            for file_name in os.listdir(job_dir):
+                full_file_name = os.path.join(job_dir, file_name)
+                if file_name not in keep:
+                    if os.path.isdir(full_file_name):
+                        shutil.rmtree(full_file_name)
+                    else:
+                        os.remove(full_file_name)
+            if cache_key is not None:
+                self.dataset_cache.release(cache_key, job_id)
+            self._write_status(job_id, status)
+            self._reload_if_pending()
+
+    def _train(self, job_id, status, split_dir, db_path, pool):
+        '''
+        This function will train every model of a job at once, sharing the cores out between them
+        '''
+        # The pool already caps how many models train at once, only the threads of each model are set here
+        _, threads = plan_threads(len(status["models"]), self.max_workers, self.cores)
+        futures = {
+            pool.submit(
+                train_split_model, model["name"], model["file_path"], model["format"], split_dir,
+                self.job_dir(job_id), threads, status.get("mode", "full"), db_path
+            ): model
+            for model in status["models"]
+        }
+
+        def trained(model, result):
+            if isinstance(result["accuracy"], str):
+                model["status"] = "failed"
+                model["error"] = result["accuracy"]
+            else:
+                model["status"] = "done"
+                model.update(result)
+                train_model_seconds.observe(result["seconds"], model["name"])
+
+        def training(model):
+            model["status"] = "training"
+
+        self._wait_all(job_id, status, futures, trained, training)
+
+    def _search(self, job_id, status, split_dir, pool):
+        '''
+        This function will run the rungs of a search, the trials of a rung run at once and only the best configurations
+        go on to the next rung, the best one of the last rung is trained on the whole split
+        '''
+        model = status["models"][0]
+        search = status["search"]
+        model["status"] = "training"
+
+        survivors = list(range(len(search["configs"])))
+        for rung, (size, fraction) in enumerate(halving_rungs(len(survivors), search["eta"])):
+            survivors = survivors[:size]
+
+            # The trials recorded before the search was interrupted are not run again
+            finished = {trial["config"] for trial in status["trials"] if trial["rung"] == rung}
+            todo = [config for config in survivors if config not in finished]
+            _, threads = plan_threads(max(1, len(todo)), self.max_workers, self.cores)
+            futures = {
+                pool.submit(run_trial, model["name"], search["configs"][config], split_dir, fraction, threads): config
+                for config in todo
+            }
+
+            def scored(config, result):
+                status["trials"].append({"config": config, "rung": rung, "fraction": fraction, **result})
+
+            self._wait_all(job_id, status, futures, scored)
+
+            # The configurations are ranked by their accuracy on this rung, the sort keeps ties in their order
+            scores = {trial["config"]: trial["accuracy"] for trial in status["trials"] if trial["rung"] == rung}
+            survivors = sorted((config for config in survivors if scores.get(config) is not None),
+                               key=lambda config: -scores[config])
+            if not survivors:
+                raise ValueError("Every trial of the search failed.")
+
+        self._check_cancelled(job_id)
+        best = survivors[0]
+        _, threads = plan_threads(1, self.max_workers, self.cores)
+        result = self._result(job_id, status, pool.submit(
+            train_split_model, model["name"], model["file_path"], model["format"], split_dir, self.job_dir(job_id),
+            threads, "full", None, search["configs"][best]
+        ))
+        if isinstance(result["accuracy"], str):
+            raise ValueError(result["accuracy"])
+
+        model["status"] = "done"
+        model.update(result)
+        status["best"] = {"config": best, "params": search["configs"][best], "validation_accuracy": scores[best],
+                          "accuracy": result["accuracy"]}
+
+    def _wait_all(self, job_id, status, futures, on_done, on_running=None):
+        '''
+        This function will wait for the futures of a job, writing its status as they finish
+        :param futures: A dict of future to the item it belongs to
+        :param on_done: Called with the item and the result of every future that finished
+        :param on_running: Called with the item of every future still running
+        :raises JobCancelled: If the job was cancelled, the futures that have not started are dropped and the ones
+            running are waited for and thrown away
+        '''
+        pending = set(futures)
+        while pending:
+            done, pending = wait(pending, timeout=0.5)
+
+            for future in done:
+                on_done(futures[future], future.result())
+            if on_running is not None:
+                for future in pending:
+                    if future.running():
+                        on_running(futures[future])
+            self._write_status(job_id, status)
+
+            if pending and self._cancel_requested(job_id):
+                for future in pending:
+                    future.cancel()
+                wait(pending)
+                raise JobCancelled()
+
+    def _result(self, job_id, status, future):
+        '''
+        This function will wait for one future of a job, its status keeps being written so the job does not look stale
+        '''
+        results = []
+        self._wait_all(job_id, status, {future: None}, lambda _, result: results.append(result))
+        return results[0]
+
+    def _prepare(self, job_id, status, pool) -> tuple:
+        '''
+        This function will return the split of a job's upload, from the dataset cache if the same file was processed
+        before, otherwise it is processed on the pool and added to the cache. The job holds a lease on the cache entry
+        until it ends.
+        :return: The cache key and the split directory
+        '''
+        key = self.dataset_cache.key(self.upload_path(job_id))
+        cached = self.dataset_cache.get(key, user=job_id)
+        if cached is not None:
+            split_dir, meta = cached
+            status["rows"] = meta["rows"]
+            status["cached"] = True
+            return key, split_dir
+
+        processed_dir = os.path.join(self.job_dir(job_id), "processed")
+        split_dir = os.path.join(self.job_dir(job_id), "split")
+        status["rows"] = self._result(job_id, status, pool.submit(
+            _prepare_dataset, self.upload_path(job_id), processed_dir, split_dir
+        ))
+        return key, self.dataset_cache.put(key, split_dir, {
+            "rows": status["rows"],
+            "created": datetime.now().isoformat(timespec="seconds"),
+        }, user=job_id)
+
+    def _cancel_requested(self, job_id):
+        return os.path.exists(os.path.join(self.job_dir(job_id), "cancel"))
+
+    def _check_cancelled(self, job_id):
+        if self._cancel_requested(job_id):
+            raise JobCancelled()
+
+    def _stage_models(self, job_dir, db_path):
+        '''
+        This function will move the trained models of a job into instance/tmp where the dataset swap picks them up
+        '''
+        job_tmp = os.path.join(job_dir, "tmp")
+        temp_dir = os.path.join(db_path, "tmp")
+        if not os.path.exists(job_tmp):
+            return
+
+        os.makedirs(temp_dir, exist_ok=True)
+        for file_name in os.listdir(job_tmp):
+            os.replace(os.path.join(job_tmp, file_name), os.path.join(temp_dir, file_name))
+
+    def _write_status(self, job_id, status):
+        # Written to a temporary file first so a reader never sees half a status
+        status["updated"] = datetime.now().isoformat(timespec="seconds")
+        path = os.path.join(self.job_dir(job_id), "status.json")
+        with open(path + ".tmp", "w") as f:
+            json.dump(status, f)
+        os.replace(path + ".tmp", path)
+
+    def _prune(self):
+        '''
+        This function will remove the directories of jobs that ended more than max_age seconds ago
+        '''
+        if not os.path.exists(self.jobs_dir):
+            return
+        for job_id in os.listdir(self.jobs_dir):
+            status = self.status(job_id)
+            path = os.path.join(self.job_dir(job_id), "status.json")
+            if status is not None and status["status"] in ("finished", "failed", "cancelled"):
+                if time.time() - os.path.getmtime(path) > self.max_age:
+                    shutil.rmtree(self.job_dir(job_id))
+
+
+# The job runner shared by every request handled by this process
+job_runner = JobRunner()
@@ -1,16 +1,26 @@
 # Imports needed for admin routes
-from flask import Blueprint, render_template, request, session, redirect, url_for, flash, current_app, jsonify
+from flask import Blueprint, render_template, request, session, redirect, url_for, flash, current_app, jsonify, Response
 from authlib.integrations.flask_client import OAuth
 
 from src.api_key import *
-from sklearn.model_selection import train_test_split
 
 # Import models
 from src.app import db
 from src.models import Admin, AIModels
 from src.admin.functions import *
+from src.registry import model_registry
+from src.rate.cache import prediction_cache
+from src.admin.jobs import job_runner
+from src.storage import default_formats, model_file
+from src.metrics import metrics
+from src.serving import request_reload
+from src.admin.auth import admin_cache, admin_required, admin_denied
+from src.versions import list_versions, promote, rollback
+from src.admin.search import DEFAULT_SPACES, check_space
+from src.uploads import read_header, save_upload
 
 from datetime import datetime
+import json
 
 # Define the correct columns for the dataset
 correct_column_list = ['latitude', 'longitude', 'length',
@@ -35,63 +45,36 @@ google = oauth.register(
 # Admin index route
 @admin_bp.route("/")
 def index():
-    # Check if user is logged in
-    if "username" in session:
-
-        username = session["username"]
-
-        if not Admin.query.filter_by(email=username).first():
-            # If not an admin, log out and redirect to home
-            flash("Access denied: You are not an admin.", "danger")
-            session.pop("username", None)
-
-            current_app.logger.error("Non-admin user had session active, logging out. Email: %s", username)
+    # If not logged in, redirect to login page
+    if "username" not in session:
+        return redirect(url_for("admin.login"))
 
-            return redirect(url_for("core.home"))
+    # Someone who is logged in but is not an admin is logged out
+    denied = admin_denied()
+    if denied is not None:
+        return denied
 
-        # If not logged in, redirect to login page
-        return render_template("admin.html")
-    else:
-        # If logged in, render the admin dashboard
-        return redirect(url_for("admin.login"))
+    # If logged in, render the admin dashboard
+    return render_template("admin.html")
 
 # Admin POST route to handle form submissions
 @admin_bp.route("/", methods=['POST'])
+@admin_required
 def admin_post():
-
-    if not "username" in session:
-
-        # If not an admin, log out and redirect to home
-        flash("Access denied: You are not an admin.", "danger")
-
-        return redirect(url_for("core.home"))
-
-    username = session["username"]
-
-    if not Admin.query.filter_by(email=username).first():
-        # If not an admin, log out and redirect to home
-        flash("Access denied: You are not an admin.", "danger")
-        session.pop("username", None)
-
-        current_app.logger.error("Non-admin user had session active, logging out. Email: %s", username)
-
-        return redirect(url_for("core.home"))
-
     # Handles the preview of the dataset
     if "dataset-preview" in request.form:
         file = request.files.get('file') # saves the file uploaded
 
         # Checks to make sure that the file is a CSV
         if file and file.content_type == 'text/csv':
-            # Reads the CSV into a DataFrame, generates a preview, and counts the number of rows
-            df = pd.read_csv(file)
-            preview_html = df.head().to_html()
-            num_rows = len(df)
+            # Reads the first rows for the preview and counts the rest without loading the whole CSV
+            preview, num_rows, columns = preview_dataset(file.stream)
+            preview_html = preview.to_html()
 
-            # Checks if the columns are correct and sets the flag accordingly
+            # Checks if the columns are correct from the header and sets the flag accordingly
             flag = True
             for col in correct_column_list:
-                if col not in df.columns.to_list():
+                if col not in columns:
                     flag = False
                     break
 
@@ -115,6 +98,9 @@ def admin_post():
             flash("Error saving models before dataset swap.", "danger")
             return redirect(url_for("admin.index"))
 
+        # The registry switches to the new version once it has loaded it, the cached predictions are stale
+        prediction_cache.bump_version()
+
         # Updates the date_updated and updated_by fields for all AI models
         for model in AIModels.query.all():
             model.date_updated = datetime.now()
@@ -122,6 +108,12 @@ def admin_post():
 
             db.session.commit()
 
+        # The promoted models that are still pickled are written in their native format before they are served
+        model_registry.migrate(db_path + "/current")
+
+        # Under the production server the workers are replaced by ones forked with the new models
+        request_reload()
+
         # The dataset swap process was completed successfully
         flash("Dataset swapped successfully.", "success")
         return redirect(url_for("admin.index"))
@@ -143,88 +135,200 @@ def admin_post():
                     
         # Gets the model details from the form
         model_name = request.form.get("model_name")
-        file_path = path + ".pkl"
+        model_format = default_formats.get(model_name, "pickle")
+        file_path = model_file(path, model_format)
         admin_email = session["username"]
         description = request.form.get("description")
+        inference_backend = "compiled" if request.form.get("inference_backend") == "compiled" else "native"
 
         # Creates a new AI model entry in the database
-        new_model = AIModels(model_name, file_path, admin_email, description)
+        new_model = AIModels(model_name, file_path, admin_email, description, model_format, inference_backend)
         db.session.add(new_model)
         db.session.commit()
 
+        # A new model was registered so the cached AIModels metadata and predictions are stale
+        model_registry.invalidate()
+        prediction_cache.bump_version()
+
         return redirect(url_for("admin.index"))
 
     flash("No valid action specified.", "danger")
 
     return redirect(url_for("admin.index"))
 
+def upload_error(file):
+    '''
+    This function will check that an upload is a CSV with the right columns, reading only its header
+    :param file: The uploaded file
+    :return: None if the upload can be used, otherwise the error response
+    '''
+    # Checks to make sure that the file is a CSV
+    if not (file and file.content_type == 'text/csv'):
+        return jsonify("Error: Please upload a CSV file."), 400
+
+    # Checks if the columns are correct from the header alone, the body is only parsed by the job
+    header = read_header(file)
+
+    flag = True
+    for col in correct_column_list:
+        if col not in header:
+            flag = False
+            break
+
+    # If columns are incorrect, flash an error message and redirect
+    if not flag:
+        flash("The uploaded dataset does not have the correct columns.", "danger")
+        return jsonify("Error: Incorrect columns in dataset.")
+
+    return None
+
 @admin_bp.route("/test_training", methods=['POST'])
+@admin_required
 def test_training():
+    # This route starts a background job that evaluates the accuracy of every model on the uploaded dataset
+    file = request.files.get('file')
+    error = upload_error(file)
+    if error is not None:
+        return error
 
-    if not "username" in session:
+    # The models are trained from nothing unless the current ones should be trained further on the upload
+    mode = request.form.get("training_mode", "full")
+    if mode not in ("full", "incremental", "compare"):
+        return jsonify("Error: Unknown training mode."), 400
 
-        # If not an admin, log out and redirect to home
-        flash("Access denied: You are not an admin.", "danger")
+    # Saves the upload into a new job and starts training every AI model in the background
+    ai_models = [(model.model_name, model.file_path, model.model_format) for model in AIModels.query.all()]
+    job_id = job_runner.create(ai_models, mode)
+    save_upload(file, job_runner.upload_path(job_id))
+    job_runner.start(job_id, current_app.instance_path)
 
-        return redirect(url_for("core.home"))
+    return jsonify({"job_id": job_id, "status_url": url_for("admin.job_status", job_id=job_id)}), 202
 
-    username = session["username"]
 
-    if not Admin.query.filter_by(email=username).first():
-        # If not an admin, log out and redirect to home
-        flash("Access denied: You are not an admin.", "danger")
-        session.pop("username", None)
+@admin_bp.route("/jobs/<job_id>")
+@admin_required
+def job_status(job_id):
+    # Returns the status, per-model progress and accuracy results of a training job
+    status = job_runner.status(job_id)
+    if status is None:
+        return jsonify({"error": "No such job."}), 404
 
-        current_app.logger.error("Non-admin user had session active, logging out. Email: %s", username)
+    return jsonify(status)
+
+
+@admin_bp.route("/jobs/<job_id>/cancel", methods=['POST'])
+@admin_required
+def job_cancel(job_id):
+    # Asks the job to stop, it is marked cancelled once the step it is on ends
+    if job_runner.status(job_id) is None:
+        return jsonify({"error": "No such job."}), 404
+
+    return jsonify({"cancelled": job_runner.cancel(job_id)})
 
-        return redirect(url_for("core.home"))
 
-    # This route is for testing purposes to evaluate model accuracy
+@admin_bp.route("/searches", methods=['POST'])
+@admin_required
+def search_start():
+    # This route starts a background hyperparameter search of one model on the uploaded dataset
     file = request.files.get('file')
+    error = upload_error(file)
+    if error is not None:
+        return error
 
-    string = "Accuracy Results:\n" # Initialize the string to hold accuracy results
+    model = AIModels.query.filter_by(model_name=request.form.get("model_name")).first()
+    if model is None:
+        return jsonify({"error": "No such model."}), 404
 
-    # Checks to make sure that the file is a CSV
-    if file and file.content_type == 'text/csv':
-        df = pd.read_csv(file)
+    # The space is a JSON object of hyperparameter name to the values to try, each model has a default one
+    try:
+        space = check_space(json.loads(request.form["space"]) if request.form.get("space")
+                            else DEFAULT_SPACES.get(model.model_name))
+        num_configs = int(request.form.get("trials", 9))
+        eta = int(request.form.get("eta", 3))
+        if num_configs < 1 or eta < 2:
+            raise ValueError("There must be at least one trial and eta must be at least 2.")
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
 
-        # Checks if the columns are correct and sets the flag accordingly
-        flag = True
-        for col in correct_column_list:
-            if col not in df.columns.to_list():
-                flag = False
-                break
+    job_id = job_runner.create_search((model.model_name, model.file_path, model.model_format), space, num_configs, eta)
+    save_upload(file, job_runner.upload_path(job_id))
+    job_runner.start(job_id, current_app.instance_path)
 
-        # If columns are incorrect, flash an error message and redirect
-        if not flag:
-            flash("The uploaded dataset does not have the correct columns.", "danger")
-            return jsonify("Error: Incorrect columns in dataset.")
+    return jsonify({"job_id": job_id, "status_url": url_for("admin.job_status", job_id=job_id)}), 202
 
-        # Process the dataset and create training and testing splits
-        processed_df = process_dataset(df)
 
-        # Gets the features and labels from the processed dataframe
-        dataset_label = processed_df['Cul_rating']
-        dataset_features = processed_df.drop(columns=['Cul_rating'], axis=1)
+@admin_bp.route("/jobs/<job_id>/resume", methods=['POST'])
+@admin_required
+def job_resume(job_id):
+    # Starts a search that was cancelled or whose server stopped again, the finished trials are kept
+    if job_runner.status(job_id) is None:
+        return jsonify({"error": "No such job."}), 404
 
-        # Creates the training and testing splits
-        X_train, X_test, y_train, y_test = train_test_split(
-            dataset_features, dataset_label, test_size=0.2, random_state=42
-        )
+    return jsonify({"resumed": job_runner.resume(job_id, current_app.instance_path)})
 
-        db_path = current_app.instance_path
 
-        # Update all AI models with the new dataset splits
-        ai_models = AIModels.query.all()
-        for model in ai_models:
-            # Gets the path to the model dataset file
-            path = model.file_path
+@admin_bp.route("/jobs/<job_id>/promote", methods=['POST'])
+@admin_required
+def job_promote(job_id):
+    # Stages the model trained with the best configuration of a search in instance/tmp for the dataset swap
+    if job_runner.status(job_id) is None:
+        return jsonify({"error": "No such job."}), 404
+
+    promoted = job_runner.promote_search(job_id, current_app.instance_path)
+    if promoted:
+        current_app.logger.info("Best configuration of search %s staged by %s", job_id, session["username"])
+    return jsonify({"promoted": promoted})
+
+
+@admin_bp.route("/versions")
+@admin_required
+def model_versions():
+    # Returns the retained model sets, the current one is marked
+    return jsonify(list_versions(current_app.instance_path))
+
+
+@admin_bp.route("/versions/<version_id>/promote", methods=['POST'])
+@admin_required
+def version_promote(version_id):
+    # Makes a retained model set current again, the models are not retrained or copied
+    try:
+        promote(current_app.instance_path, version_id)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 404
+
+    prediction_cache.bump_version()
+    model_registry.migrate(current_app.instance_path + "/current")
+    request_reload()
+    current_app.logger.info("Model version %s promoted by %s", version_id, session["username"])
+
+    return jsonify({"current": version_id})
+
+
+@admin_bp.route("/versions/rollback", methods=['POST'])
+@admin_required
+def version_rollback():
+    # Makes the model set before the current one current again
+    try:
+        version_id = rollback(current_app.instance_path)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 409
+
+    prediction_cache.bump_version()
+    model_registry.migrate(current_app.instance_path + "/current")
+    request_reload()
+    current_app.logger.info("Model version rolled back to %s by %s", version_id, session["username"])
+
+    return jsonify({"current": version_id})
 
-            flag = train_model(model.model_name, path, db_path, X_train, X_test, y_train, y_test)  # Train the model and saves them
 
-            string += f"{model.model_name}: {flag}\n" # Append the accuracy result to the string
+@admin_bp.route("/metrics")
+@admin_required
+def metrics_export():
+    # Returns the latency histograms of this worker in the Prometheus text format
+    if not metrics.enabled:
+        return jsonify({"error": "Metrics are turned off."}), 404
 
-    return jsonify(string) # Return the accuracy results as JSON
+    return Response(metrics.render(), mimetype="text/plain; version=0.0.4")
 
 
 @admin_bp.route("/login")
@@ -252,7 +356,7 @@ def authorize():
     email = user_info["email"]
 
     # Check if the user is an admin
-    if not Admin.query.filter_by(email=email).first():
+    if not admin_cache.is_admin(email):
         # If not an admin, deny access
         flash("Access denied: You are not an admin.", "danger")
         return redirect(url_for("core.home"))
@@ -0,0 +1,111 @@
+import itertools
+import math
+import random
+import time
+
+import numpy as np
+
+from src.admin.functions import build_model
+from src.admin.training import load_split
+
+# The hyperparameters tried for each model when the admin does not give a space of their own
+DEFAULT_SPACES = {
+    "Random Forest": {
+        "n_estimators": [100, 200, 400],
+        "max_depth": [None, 10, 20],
+        "min_samples_leaf": [1, 2, 4],
+        "max_features": ["sqrt", 0.5],
+    },
+    "XGBoost": {
+        "n_estimators": [100, 300],
+        "max_depth": [3, 6, 9],
+        "learning_rate": [0.05, 0.1, 0.3],
+        "subsample": [0.8, 1.0],
+    },
+}
+
+# The share of the training split held back to score the trials, the test split is only used for the best one
+VALIDATION_SHARE = 0.2
+
+
+def check_space(space) -> dict:
+    '''
+    This function will check a search space given by an admin
+    :param space: A dict of hyperparameter name to the list of values to try
+    :return: The space
+    :raises ValueError: If the space is not a dict of non-empty lists
+    '''
+    if not isinstance(space, dict) or not space:
+        raise ValueError("The search space must map hyperparameter names to lists of values.")
+    for name, values in space.items():
+        if not isinstance(values, list) or not values:
+            raise ValueError(f"The values of {name} must be a non-empty list.")
+    return space
+
+
+def sample_configs(space, num_configs, seed=42) -> list:
+    '''
+    This function will pick distinct configurations from the grid of a search space
+    :param space: A dict of hyperparameter name to the list of values to try
+    :param num_configs: The number of configurations, the whole grid is used if it is smaller
+    :param seed: The seed of the sampling so a search can be repeated
+    :return: A list of dicts of hyperparameters
+    '''
+    names = sorted(space)
+    grid = list(itertools.product(*(space[name] for name in names)))
+    picked = random.Random(seed).sample(grid, min(num_configs, len(grid)))
+    return [dict(zip(names, values)) for values in picked]
+
+
+def halving_rungs(num_configs, eta=3, min_fraction=1 / 9) -> list:
+    '''
+    This function will plan the rungs of successive halving, every rung trains the best 1/eta of the configurations of
+    the rung before on eta times as much of the training data, the last rung uses all of it. The plan ends early at
+    the first rung with one configuration as there is nothing left to compare.
+    :param num_configs: The number of configurations in the first rung
+    :param eta: The factor the configurations are cut by and the data grows by
+    :param min_fraction: The share of the training data the first rung uses
+    :return: A list of (number of configurations, share of the training data) tuples
+    '''
+    num_rungs = max(1, int(round(math.log(1 / min_fraction, eta))) + 1)
+    rungs = []
+    for rung in range(num_rungs):
+        fraction = 1.0 if rung == num_rungs - 1 else min_fraction * eta ** rung
+        size = max(1, math.ceil(num_configs / eta ** rung))
+        rungs.append((size, fraction))
+        if size == 1:
+            break
+    return rungs
+
+
+def run_trial(model_name, params, split_dir, fraction, n_jobs):
+    '''
+    This function runs in a pool process and scores one configuration on part of a memory mapped split
+    :param model_name: The name of the model
+    :param params: The hyperparameters to try
+    :param split_dir: The directory written by save_split
+    :param fraction: The share of the training rows (less the validation rows) the model is trained on
+    :param n_jobs: The number of threads the model may use
+    :return: A dict with the validation accuracy and the number of seconds training took, or with an error message
+    '''
+    from sklearn.metrics import accuracy_score
+
+    _, X_train, _, y_train, _ = load_split(split_dir)
+
+    # The same rows are held back for every trial so their scores can be compared
+    order = np.random.default_rng(42).permutation(len(y_train))
+    num_validation = max(1, int(len(order) * VALIDATION_SHARE))
+    validation, train = order[:num_validation], order[num_validation:]
+    train = np.sort(train[:max(1, math.ceil(len(train) * fraction))])
+
+    model = build_model(model_name, n_jobs, params)
+    if model is None:
+        return {"accuracy": None, "error": "Model type not supported."}
+
+    start = time.perf_counter()
+    try:
+        model.fit(X_train[train], y_train[train])
+        accuracy = accuracy_score(y_train[validation], model.predict(X_train[validation]))
+    except Exception as e:
+        return {"accuracy": None, "error": str(e)}
+    return {"accuracy": round(float(accuracy), 3), "seconds": time.perf_counter() - start}
@@ -0,0 +1,147 @@
+import json
+import os
+import shutil
+import time
+
+import numpy as np
+
+from src.admin.functions import train_model, load_current_model, can_continue
+from src.encoder import FeatureEncoder
+
+split_names = ["X_train", "X_test", "y_train", "y_test"]
+
+
+def save_split(split_dir, encoder, X_train, X_test, y_train, y_test):
+    '''
+    This function will write an encoded training and testing split as .npy files so every training process can
+    memory map the same copy instead of being sent its own
+    :param split_dir: The directory the split is written to
+    :param encoder: The FeatureEncoder fitted on the processed features, it is saved with the split
+    :param X_train: The training features dataframe
+    :param X_test: The testing features dataframe
+    :param y_train: The training labels
+    :param y_test: The testing labels
+    '''
+    os.makedirs(split_dir, exist_ok=True)
+    encoder.save(os.path.join(split_dir, "split.encoder.json"))
+
+    arrays = {
+        "X_train": encoder.transform_dataset(X_train),
+        "X_test": encoder.transform_dataset(X_test),
+        "y_train": np.asarray(y_train, dtype=np.int64),
+        "y_test": np.asarray(y_test, dtype=np.int64),
+    }
+    for name, array in arrays.items():
+        np.save(os.path.join(split_dir, name + ".npy"), np.ascontiguousarray(array))
+
+
+def save_processed_split(split_dir, processed_dir, test_size=0.2, random_state=42, chunksize=100_000):
+    '''
+    This function will write the training and testing split of a dataset written by process_dataset_file without
+    loading it. Only the row numbers are split (the same rows train_test_split gives for the whole dataframe), then
+    the rows are gathered from the memory mapped columns a chunk at a time, so memory holds the row numbers (8 bytes a
+    row) and one chunk of the encoded split.
+    :param split_dir: The directory the split is written to, as save_split writes it
+    :param processed_dir: The directory written by process_dataset_file
+    :param test_size: The share of the rows that go in the testing split
+    :param random_state: The seed of the shuffle
+    :param chunksize: The number of rows encoded at a time
+    '''
+    from sklearn.model_selection import train_test_split
+
+    with open(os.path.join(processed_dir, "columns.json")) as f:
+        processed = json.load(f)
+    columns = {col: np.load(os.path.join(processed_dir, f"{i}.npy"), mmap_mode="r")
+               for i, col in enumerate(processed["columns"])}
+    labels = columns.pop("Cul_rating")
+
+    # The encoder is fitted on every row so no category only in the test split is lost
+    encoder = FeatureEncoder(list(columns))
+    os.makedirs(split_dir, exist_ok=True)
+    encoder.save(os.path.join(split_dir, "split.encoder.json"))
+
+    train_rows, test_rows = train_test_split(np.arange(processed["rows"]), test_size=test_size,
+                                             random_state=random_state)
+    for suffix, rows in [("train", train_rows), ("test", test_rows)]:
+        features = np.lib.format.open_memmap(os.path.join(split_dir, f"X_{suffix}.npy"), mode="w+",
+                                             dtype=np.float32, shape=(len(rows), len(encoder.columns)))
+        targets = np.lib.format.open_memmap(os.path.join(split_dir, f"y_{suffix}.npy"), mode="w+",
+                                            dtype=np.int64, shape=(len(rows),))
+        for start in range(0, len(rows), chunksize):
+            chunk = rows[start:start + chunksize]
+            features[start:start + len(chunk)] = np.column_stack([columns[col][chunk] for col in encoder.columns])
+            targets[start:start + len(chunk)] = labels[chunk]
+        features.flush()
+        targets.flush()
+
+
+def load_split(split_dir):
+    '''
+    This function will memory map a split written by save_split
+    :param split_dir: The directory the split was written to
+    :return: The encoder and the read-only X_train, X_test, y_train and y_test arrays
+    '''
+    encoder = FeatureEncoder.load(os.path.join(split_dir, "split.encoder.json"))
+    arrays = [np.load(os.path.join(split_dir, name + ".npy"), mmap_mode="r") for name in split_names]
+    return encoder, *arrays
+
+
+def plan_threads(num_models, max_processes, cores=None):
+    '''
+    This function will divide the cores between training models at the same time and the threads inside each model
+    :param num_models: The number of models to train
+    :param max_processes: The largest number of models that may train at the same time
+    :param cores: The number of cores to use, every core is used if it is not given
+    :return: The number of models trained at the same time and the number of threads each one gets
+    '''
+    cores = cores or os.cpu_count() or 1
+    processes = max(1, min(num_models, max_processes, cores))
+    return processes, max(1, cores // processes)
+
+
+def train_split_model(model_name, file_path, model_format, split_dir, out_dir, n_jobs, mode="full", db_path=None,
+                      params=None):
+    '''
+    This function runs in a pool process and trains one model on a memory mapped split
+    :param model_name: The name of the model to train
+    :param file_path: The file path of the model from AIModels
+    :param model_format: The format of the model from AIModels
+    :param split_dir: The directory written by save_split
+    :param out_dir: The directory the model is saved under (in its tmp directory)
+    :param n_jobs: The number of threads the model may use
+    :param mode: "full" trains from nothing, "incremental" trains the model in db_path/current further (a full
+        training is used when it cannot be continued) and "compare" also trains a full model only to compare accuracy
+    :param db_path: The instance directory holding the current models
+    :param params: Hyperparameters that replace the defaults of a full training (see build_model)
+    :return: A dict with the accuracy of the model on the test set (or a message if the model type is not supported),
+        the number of seconds training took (the pool process cannot record it in the metrics of the web process)
+        and the mode that was used, in "compare" mode also the accuracy and seconds of the full training
+    '''
+    encoder, X_train, X_test, y_train, y_test = load_split(split_dir)
+
+    base = None
+    if mode in ("incremental", "compare"):
+        base = load_current_model(file_path, db_path, model_format)
+        if base is not None and not can_continue(model_name, base[0], y_train):
+            base = None
+
+    start = time.perf_counter()
+    accuracy = train_model(model_name, file_path, out_dir, X_train, X_test, y_train, y_test, encoder, n_jobs=n_jobs,
+                           model_format=model_format, base=base, params=params)
+    result = {
+        "accuracy": accuracy,
+        "seconds": time.perf_counter() - start,
+        "mode": "full" if base is None else "incremental",
+    }
+
+    # The full training is thrown away, it is only there to show what the incremental training gave up
+    if mode == "compare" and base is not None and not isinstance(accuracy, str):
+        full_dir = os.path.join(out_dir, "full-" + os.path.splitext(os.path.basename(file_path))[0])
+        os.makedirs(full_dir, exist_ok=True)
+        start = time.perf_counter()
+        result["full_accuracy"] = train_model(model_name, file_path, full_dir, X_train, X_test, y_train, y_test,
+                                              encoder, n_jobs=n_jobs, model_format=model_format)
+        result["full_seconds"] = time.perf_counter() - start
+        shutil.rmtree(full_dir)
+
+    return result
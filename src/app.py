@@ -7,15 +7,35 @@ from src.api_key import SECRET_KEY
 
 db = SQLAlchemy()
 
-def create_app():
+def create_app(config=None, instance_path=None):
     # create and configure the Flask application
-    app = Flask(__name__, template_folder="templates", static_folder="static", static_url_path="/")
+    # config overrides the settings below and instance_path moves the database and models (used by the benchmarks)
+    app = Flask(__name__, template_folder="templates", static_folder="static", static_url_path="/", instance_path=instance_path)
     app.config["SQLALCHEMY_DATABASE_URI"] = 'sqlite:///admin.db'
     app.config["SECRET_KEY"] = SECRET_KEY
+    app.config["INFERENCE_WORKERS"] = 4  # The number of models that can predict at the same time
+    app.config["INFERENCE_TIMEOUT"] = 5.0  # The number of seconds a rating waits for the models
+    app.config["PREDICTION_CACHE_TYPE"] = "lru"  # "lru" (in-process), "filesystem" (shared by workers) or "null"
+    app.config["PREDICTION_CACHE_SIZE"] = 1024  # The number of cached ratings
+    app.config["PREDICTION_CACHE_TTL"] = 300  # The number of seconds a cached rating is kept
+    app.config["TRAINING_WORKERS"] = 2  # The number of models that can train at the same time
+    app.config["TRAINING_CORES"] = None  # The number of cores training may use, None uses every core
+    app.config["DATASET_CACHE_SIZE"] = 2 * 1024 ** 3  # The number of bytes of processed datasets kept, 0 turns the cache off
+    app.config["MAX_CONTENT_LENGTH"] = 1024 ** 3  # The largest request (and so dataset upload) in bytes, bigger ones get a 413
+    app.config["ADMIN_CACHE_TTL"] = 30  # The number of seconds an admin check is cached
+    app.config["METRICS_ENABLED"] = True  # Whether the latency metrics at /admin/metrics are recorded
     app.permanent_session_lifetime = timedelta(hours=1)
+    app.config.update(config or {})
 
     db.init_app(app)
 
+    # Big uploads are spooled to files under instance/uploads (see src/uploads.py)
+    from werkzeug.exceptions import RequestEntityTooLarge
+    from src.uploads import SpooledRequest, upload_too_large, remove_stale_uploads
+    app.request_class = SpooledRequest
+    app.register_error_handler(RequestEntityTooLarge, upload_too_large)
+    remove_stale_uploads(app)
+
     # import and register all blueprints
     from src.rate.routes import rate_bp
     from src.admin.routes import admin_bp
@@ -25,6 +45,30 @@ def create_app():
     app.register_blueprint(admin_bp, url_prefix="/admin", config = app.config)
     app.register_blueprint(core_bp, url_prefix="/", config = app.config)
 
+    # Size the thread pool that runs the ensemble predictions
+    from src.rate.inference import inference_executor
+    inference_executor.configure(app.config["INFERENCE_WORKERS"], app.config["INFERENCE_TIMEOUT"])
+
+    # Set up the cache in front of the ensemble
+    from src.rate.cache import prediction_cache
+    prediction_cache.init_app(app)
+
+    # Set up the background training jobs
+    from src.admin.jobs import job_runner
+    job_runner.init_app(app)
+
+    # Set up the cache of the admin checks
+    from src.admin.auth import admin_cache
+    admin_cache.init_app(app)
+
+    # Serve the fingerprinted static files built by python -m src.assets
+    from src.assets import asset_manifest
+    asset_manifest.init_app(app)
+
+    # Turn the latency metrics on or off
+    from src.metrics import metrics
+    metrics.init_app(app)
+
     migrate = Migrate(app, db)
 
     return app
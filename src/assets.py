@@ -0,0 +1,266 @@
+import argparse
+import hashlib
+import io
+import json
+import logging
+import os
+import shutil
+
+from flask import request
+from markupsafe import Markup, escape
+
+logger = logging.getLogger(__name__)
+
+# The widths (in pixels) every image is resized to, an image is never made bigger than it is
+IMAGE_WIDTHS = (160, 400, 800, 1600)
+
+# The compressed formats every image is also written in, best first, with the Pillow format and save options
+IMAGE_FORMATS = {
+    "image/avif": ("AVIF", ".avif", {"quality": 55}),
+    "image/webp": ("WEBP", ".webp", {"quality": 80, "method": 6}),
+}
+
+# The formats the images come in, every image is also resized in its own format for browsers without the ones above
+SOURCE_FORMATS = {
+    ".png": ("image/png", "PNG", {"optimize": True}),
+    ".jpg": ("image/jpeg", "JPEG", {"quality": 85, "optimize": True, "progressive": True}),
+    ".jpeg": ("image/jpeg", "JPEG", {"quality": 85, "optimize": True, "progressive": True}),
+}
+
+# The other static files that are fingerprinted, relative to the static folder
+FINGERPRINTED_FILES = ("css/styles.css",)
+
+# The built files go in this directory of the static folder, with the manifest that maps the files to them
+BUILD_DIR = "dist"
+MANIFEST_FILE = "manifest.json"
+
+# A fingerprinted file never changes (a new version gets a new name) so browsers may keep it for a year
+IMMUTABLE_CACHE_CONTROL = f"public, max-age={365 * 24 * 60 * 60}, immutable"
+
+
+def fingerprint(data) -> str:
+    return hashlib.sha256(data).hexdigest()[:12]
+
+
+def _write(out_dir, rel_path, suffix, data) -> str:
+    '''
+    This function will write a built file named after its content
+    :return: The path of the file relative to the static folder
+    '''
+    stem = os.path.splitext(rel_path)[0]
+    built = f"{BUILD_DIR}/{stem}.{fingerprint(data)}{suffix}"
+    path = os.path.join(out_dir, *built.split("/")[1:])
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(data)
+    return built
+
+
+def _encode(image, pil_format, options) -> bytes:
+    buffer = io.BytesIO()
+    image.save(buffer, pil_format, **options)
+    return buffer.getvalue()
+
+
+def _build_image(static_dir, out_dir, rel_path) -> dict:
+    '''
+    This function will write the resized and compressed versions of one image
+    :return: The manifest entry of the image
+    '''
+    from PIL import Image, ImageOps
+
+    with open(os.path.join(static_dir, rel_path), "rb") as f:
+        source = f.read()
+    mimetype, source_format, source_options = SOURCE_FORMATS[os.path.splitext(rel_path)[1].lower()]
+
+    image = ImageOps.exif_transpose(Image.open(io.BytesIO(source)))
+    has_alpha = image.mode in ("RGBA", "LA") or (image.mode == "P" and "transparency" in image.info)
+    image = image.convert("RGBA" if has_alpha and source_format != "JPEG" else "RGB")
+    width, height = image.size
+
+    widths = [w for w in IMAGE_WIDTHS if w < width] + [min(width, IMAGE_WIDTHS[-1])]
+    formats = {**IMAGE_FORMATS, mimetype: (source_format, os.path.splitext(rel_path)[1], source_options)}
+
+    sources = {}
+    for w in widths:
+        resized = image if w == width else image.resize((w, max(1, round(height * w / width))), Image.LANCZOS)
+        for variant_type, (pil_format, suffix, options) in formats.items():
+            data = _encode(resized, pil_format, options)
+
+            # Recompressing an image at its own size and format can make it bigger, the original is kept then
+            if variant_type == mimetype and w == width and len(data) > len(source):
+                data = source
+            sources.setdefault(variant_type, []).append([_write(out_dir, rel_path, suffix, data), w])
+
+    return {
+        "url": sources[mimetype][-1][0],
+        "type": mimetype,
+        "width": widths[-1],
+        "height": max(1, round(height * widths[-1] / width)),
+        "sources": sources,
+        "source_hash": fingerprint(source),
+    }
+
+
+def build_assets(static_dir, out_dir=None) -> dict:
+    '''
+    This function will build the fingerprinted static files: every image in img/ is resized to IMAGE_WIDTHS and
+    written as AVIF, WebP and its own format, and FINGERPRINTED_FILES are copied, each under a name with the hash of
+    its content. The files from an earlier build are removed.
+    :param static_dir: The static folder of the app
+    :param out_dir: The directory the files and the manifest are written to, BUILD_DIR in static_dir by default
+    :return: The manifest, a dict of the path of every file relative to the static folder to what it was built into
+    '''
+    out_dir = out_dir or os.path.join(static_dir, BUILD_DIR)
+    if os.path.isdir(out_dir):
+        shutil.rmtree(out_dir)
+    os.makedirs(out_dir)
+
+    manifest = {}
+    for rel_path in FINGERPRINTED_FILES:
+        with open(os.path.join(static_dir, rel_path), "rb") as f:
+            data = f.read()
+        manifest[rel_path] = {"url": _write(out_dir, rel_path, os.path.splitext(rel_path)[1], data),
+                              "source_hash": fingerprint(data)}
+
+    image_dir = os.path.join(static_dir, "img")
+    for file_name in sorted(os.listdir(image_dir)) if os.path.isdir(image_dir) else []:
+        if os.path.splitext(file_name)[1].lower() in SOURCE_FORMATS:
+            manifest[f"img/{file_name}"] = _build_image(static_dir, out_dir, f"img/{file_name}")
+
+    # The manifest is written last so a build that fails part way is never used
+    with open(os.path.join(out_dir, MANIFEST_FILE), "w") as f:
+        json.dump(manifest, f, indent=1)
+    return manifest
+
+
+class AssetManifest:
+    '''
+    This maps the static files to the fingerprinted files built by build_assets. The templates use asset_url and
+    picture instead of writing the paths, so the built files are used once they exist and the original files are
+    served until then (or for any file that changed since the build).
+    '''
+
+    def __init__(self):
+        self.entries = {}
+        self.url_prefix = "/"
+
+    def init_app(self, app):
+        '''
+        This function will load the manifest of the app's static folder, add the template helpers and the cache
+        headers of the fingerprinted files
+        :param app: The flask app
+        '''
+        self.url_prefix = app.static_url_path.rstrip("/") + "/"
+        self.load(app.static_folder)
+        app.jinja_env.globals.update(asset_url=self.url, picture=self.picture)
+        app.after_request(cache_fingerprinted)
+
+    def load(self, static_dir):
+        '''
+        This function will load the manifest written by build_assets, the files that changed since are left out
+        :param static_dir: The static folder the files were built from
+        '''
+        self.entries = {}
+        try:
+            with open(os.path.join(static_dir, BUILD_DIR, MANIFEST_FILE)) as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            return
+
+        for rel_path, entry in manifest.items():
+            try:
+                with open(os.path.join(static_dir, rel_path), "rb") as f:
+                    current = fingerprint(f.read())
+            except OSError:
+                continue
+            if current == entry["source_hash"]:
+                self.entries[rel_path] = entry
+            else:
+                logger.warning("%s changed since the static files were built, run python -m src.assets", rel_path)
+
+    def url(self, path, width=None, mimetype=None) -> str:
+        '''
+        This function will return the URL of a static file
+        :param path: The path of the file relative to the static folder
+        :param width: The smallest width (in pixels) of an image, the smallest version that is at least as wide is used
+        :param mimetype: The format of an image, its own format by default
+        :return: The URL of the fingerprinted file or of the original if it was not built
+        '''
+        entry = self.entries.get(path)
+        if entry is None:
+            return self.url_prefix + path
+        if width is None and mimetype is None:
+            return self.url_prefix + entry["url"]
+
+        sources = entry["sources"][mimetype or entry["type"]]
+        built = next((url for url, w in sources if width is None or w >= width), sources[-1][0])
+        return self.url_prefix + built
+
+    def srcset(self, path, mimetype) -> str:
+        entry = self.entries[path]
+        return ", ".join(f"{self.url_prefix}{url} {w}w" for url, w in entry["sources"][mimetype])
+
+    def picture(self, path, alt, sizes="100vw", **attrs) -> Markup:
+        '''
+        This function will return a <picture> that lets the browser pick the best format and size of an image
+        :param path: The path of the image relative to the static folder
+        :param alt: The alt text
+        :param sizes: The sizes attribute, how wide the image is shown
+        :param attrs: Other attributes of the <img> (class, style, loading...), its width and height default to the
+            image's own so the page does not move when it loads
+        :return: The HTML
+        '''
+        entry = self.entries.get(path)
+        if entry is not None:
+            attrs = {"width": entry["width"], "height": entry["height"], **attrs}
+        img_attrs = "".join(f' {name}="{escape(value)}"' for name, value in attrs.items())
+
+        if entry is None:
+            return Markup(f'<img src="{escape(self.url(path))}" alt="{escape(alt)}"{img_attrs} />')
+
+        own_type = entry["type"]
+        sources = "".join(
+            f'<source type="{mimetype}" srcset="{escape(self.srcset(path, mimetype))}" sizes="{escape(sizes)}" />'
+            for mimetype in entry["sources"] if mimetype != own_type
+        )
+        return Markup(
+            f'<picture>{sources}<img src="{escape(self.url(path))}" srcset="{escape(self.srcset(path, own_type))}" '
+            f'sizes="{escape(sizes)}" alt="{escape(alt)}"{img_attrs} /></picture>'
+        )
+
+
+def cache_fingerprinted(response):
+    '''
+    This function runs after every request and lets browsers keep the fingerprinted files, the other static files
+    keep Flask's headers (checked with their ETag every time)
+    '''
+    if request.endpoint == "static" and response.status_code in (200, 304) \
+            and request.view_args.get("filename", "").startswith(BUILD_DIR + "/"):
+        response.headers["Cache-Control"] = IMMUTABLE_CACHE_CONTROL
+    return response
+
+
+asset_manifest = AssetManifest()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the fingerprinted and compressed static files")
+    parser.add_argument("--static", default=os.path.join(os.path.dirname(__file__), "static"),
+                        help="The static folder of the app")
+    args = parser.parse_args()
+
+    manifest = build_assets(args.static)
+
+    # The size of each file and of the biggest version of it in every format
+    for rel_path, entry in manifest.items():
+        sizes = {"source": os.path.join(args.static, rel_path)}
+        for mimetype, sources in entry.get("sources", {"built": [[entry["url"], None]]}).items():
+            sizes[mimetype] = os.path.join(args.static, sources[-1][0])
+        print(rel_path)
+        for name, path in sizes.items():
+            print(f"  {name:12} {os.path.getsize(path) / 1024:8.1f} KB")
+
+
+if __name__ == "__main__":
+    main()
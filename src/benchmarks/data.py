@@ -0,0 +1,77 @@
+import numpy as np
+import pandas as pd
+
+from src.rate.functions import soilDrainageOptions, culvertMaterialOptions, culvertShapeOptions, floodFrequencyOptions
+
+# The states and surface textures the generated culverts are spread over
+states = ['CT', 'MA', 'ME', 'NH', 'NY', 'RI', 'VT']
+textures = ['Loam', 'Silt loam', 'Sandy loam', 'Clay', 'Gravelly loam', 'Muck']
+
+
+def synthetic_inventory(num_rows, seed=0, missing=0.02) -> pd.DataFrame:
+    '''
+    This function will make a random culvert inventory with every column of an uploaded dataset (correct_column_list)
+    The categories are the ones the rate page offers and older culverts get lower ratings, so the models have something
+    to learn. Some values are unknown, unmapped or missing so every cleaning step of process_dataset has work to do.
+    :param num_rows: The number of rows
+    :param seed: The random seed
+    :param missing: The fraction of values removed from a few of the columns
+    :return: The inventory dataframe
+    '''
+    rng = np.random.default_rng(seed)
+
+    age = rng.gamma(shape=2.0, scale=15.0, size=num_rows).round().astype(int)
+    material = rng.choice(culvertMaterialOptions + ['UNKNOWN'], num_rows)
+    shape = rng.choice(culvertShapeOptions + ['UNKNOWN'], num_rows)
+
+    # Ratings fall with age and are a little better for concrete, with some noise
+    concrete = np.isin(material, ['Reinforced Concrete', 'Unreinforced Concrete'])
+    score = 5 - age / 20 + concrete * 0.5 + rng.normal(0, 0.8, num_rows)
+    rating = np.clip(np.round(score), 0, 5).astype(int).astype(str)
+    rating[rng.random(num_rows) < 0.01] = 'Unknown'
+
+    df = pd.DataFrame({
+        'latitude': rng.uniform(40.9, 47.5, num_rows).round(5),
+        'longitude': rng.uniform(-79.8, -66.9, num_rows).round(5),
+        'length': rng.lognormal(3.5, 0.6, num_rows).round(1),
+        'cul_matl': material,
+        'cul_type': shape,
+        'Soil_Drainage_Class': rng.choice(soilDrainageOptions, num_rows),
+        'Soil_Moisture': rng.uniform(5, 45, num_rows).round(1),
+        'Soil_pH': rng.normal(6.2, 0.8, num_rows).clip(3.5, 9).round(1),
+        'Soil_Elec_Conductivity': rng.gamma(2.0, 0.3, num_rows).round(2),
+        'Soil_Surface_Texture': rng.choice(textures, num_rows),
+        'Flooding_Frequency': rng.choice(floodFrequencyOptions + ['Unknown'], num_rows),
+        'State': rng.choice(states, num_rows),
+        'Age': age,
+        'Cul_rating': rating,
+    })
+
+    for col in ['Age', 'Soil_pH', 'cul_type', 'State']:
+        df[col] = df[col].mask(rng.random(num_rows) < missing)
+
+    return df
+
+
+def rate_forms(num_forms, seed=0) -> list:
+    '''
+    This function will make random rate page submissions
+    :param num_forms: The number of submissions
+    :param seed: The random seed
+    :return: A list of form dicts
+    '''
+    rng = np.random.default_rng(seed)
+    return [
+        {
+            "soil_ph": str(round(rng.uniform(4, 9), 1)),
+            "soil_drainage": rng.choice(soilDrainageOptions),
+            "soil_moisture": str(round(rng.uniform(5, 45), 1)),
+            "soil_ec": str(round(rng.uniform(0, 2), 2)),
+            "flood_frequency": rng.choice(floodFrequencyOptions),
+            "culvert_material": rng.choice(culvertMaterialOptions),
+            "culvert_shape": rng.choice(culvertShapeOptions),
+            "culvert_length": str(round(rng.uniform(5, 120), 1)),
+            "culvert_age": str(rng.integers(0, 90)),
+        }
+        for _ in range(num_forms)
+    ]
@@ -0,0 +1,66 @@
+import pandas as pd
+
+from src.encoder import soilDrainageMapping, floodFrequencyMapping
+
+
+def legacy_process_dataset(df: pd.DataFrame) -> pd.DataFrame:
+    '''
+    This is process_dataset as it was before the cleaning was vectorized, it is kept to check the new one against
+    :param df: This is the dataframe that is to be processed
+    :return: This is the new processed dataframe
+    '''
+    # Preprocess the dataset by dropping rows with any missing values and removing unnecessary columns
+    new_df = df.copy().dropna(axis=0)
+    new_df.drop(columns=['latitude', 'longitude','State','Soil_Surface_Texture'], axis=1, inplace=True)
+    new_df = new_df.fillna(new_df.mode().iloc[0])
+
+    # This makes sure that the Cul_rating column is of type integer
+    new_df = new_df[new_df.Cul_rating != "Unknown"]
+    new_df["Cul_rating"] = new_df["Cul_rating"].astype(int)
+
+    # This converts the cul_type column into one hot encoded columns
+    new_df = new_df[new_df.cul_type != "UNKNOWN"]
+    new_df_temp = pd.get_dummies(new_df["cul_type"], prefix='type')
+    new_df = pd.merge(left=new_df, right=new_df_temp, left_index=True, right_index=True)
+    new_df.drop(["cul_type"], axis=1, inplace=True)
+
+    # This converts the cul_matl column into one hot encoded columns
+    new_df = new_df[new_df.cul_matl != "UNKNOWN"]
+    new_df_temp = pd.get_dummies(new_df["cul_matl"], prefix='mat')
+    new_df = pd.merge(left=new_df, right=new_df_temp, left_index=True, right_index=True)
+    new_df.drop(["cul_matl"], axis=1, inplace=True)
+
+    # This makes sure that all the numerical columns don't have any missing values
+    new_df.dropna(subset=["Age"], axis=0, inplace=True)
+    new_df.dropna(subset=["Soil_Elec_Conductivity"], axis=0, inplace=True)
+    new_df.dropna(subset=["Soil_Moisture"], axis=0, inplace=True)
+    new_df.dropna(subset=["Soil_pH"], axis=0, inplace=True)
+    new_df.dropna(subset=["length"], axis=0, inplace=True)
+
+    # This maps the Soil_Drainage_Class column to numerical values
+    new_df.dropna(subset=['Soil_Drainage_Class'], axis=0, inplace=True)
+    new_df['Soil_Drainage_Class'] = new_df['Soil_Drainage_Class'].map(soilDrainageMapping)
+
+    # This maps the Flooding_Frequency column to numerical values
+    new_df.dropna(subset=['Flooding_Frequency'], axis=0, inplace=True)
+    new_df['Flooding_Frequency'] = new_df['Flooding_Frequency'].map(floodFrequencyMapping)
+    new_df.dropna(subset=['Flooding_Frequency'], axis=0, inplace=True)
+
+    # This removes outliers from the Age column based on the Cul_rating`
+    rates = new_df['Cul_rating'].unique()
+    rates.sort()
+    for rate in rates:
+        df = new_df['Age'][new_df.Cul_rating == rate]
+        q1 = df.quantile(q=0.25, interpolation='linear')
+        q3 = df.quantile(q=0.75, interpolation='linear')
+        new_df = new_df.drop(new_df[(new_df['Cul_rating'] == rate) & (new_df['Age'] < q1)].index)
+        new_df = new_df.drop(new_df[(new_df['Cul_rating'] == rate) & (new_df['Age'] > q3)].index)
+
+    # Order the columns in alphabetical order except for the target column which should be first
+    target_col = 'Cul_rating'
+    cols = [col for col in new_df.columns if col != target_col]
+    cols.sort()
+    cols = [target_col] + cols
+    new_df = new_df[cols]
+
+    return new_df
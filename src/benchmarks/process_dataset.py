@@ -0,0 +1,38 @@
+import argparse
+import time
+
+from src.admin.functions import process_dataset
+from src.benchmarks.data import synthetic_inventory
+from src.benchmarks.legacy import legacy_process_dataset
+
+
+def best_time(function, df, repeat):
+    '''
+    This function will return the fastest of a number of runs of a function
+    '''
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function(df)
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare process_dataset with the version before it was vectorized")
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    df = synthetic_inventory(args.rows)
+    legacy = best_time(legacy_process_dataset, df, args.repeat)
+    current = best_time(process_dataset, df, args.repeat)
+
+    print(f"rows: {args.rows}")
+    print(f"legacy process_dataset: {legacy:.3f}s")
+    print(f"process_dataset: {current:.3f}s")
+    print(f"speedup: {legacy / current:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+import argparse
+import os
+import subprocess
+import sys
+import time
+
+# The root of the repo, the startup is measured from there the same way run.py is started
+repo_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# The libraries that must not be imported until a page needs them
+heavy_modules = ["pandas", "sklearn", "xgboost", "scipy"]
+
+# The number of seconds a new process may take to create the app and answer its first core page
+STARTUP_BUDGET = 1.0
+
+# Creates the app and answers one core page, the same work a new worker does before it can serve
+startup_statement = (
+    "from src.app import create_app\n"
+    "app = create_app()\n"
+    "response = app.test_client().get('{path}')\n"
+    "assert response.status_code == 200, response.status_code\n"
+)
+
+
+def import_times(statement=startup_statement.format(path="/why")) -> dict:
+    '''
+    This function will run a statement in a new interpreter with python -X importtime and read the report
+    :param statement: The python code to run
+    :return: A dict of module name -> (own microseconds, cumulative microseconds) for every module it imported
+    '''
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", statement], cwd=repo_root,
+                            capture_output=True, text=True, check=True)
+
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "imported package" in line:
+            continue
+        own, cumulative, name = line[len("import time:"):].split("|")
+        if own.strip().isdigit():
+            times[name.strip()] = (int(own), int(cumulative))
+    return times
+
+
+def startup_seconds(path="/why") -> float:
+    '''
+    This function will time a new interpreter from when it is started until the app has answered a page
+    :param path: The page requested
+    :return: The number of seconds it took
+    '''
+    start = time.perf_counter()
+    subprocess.run([sys.executable, "-c", startup_statement.format(path=path)], cwd=repo_root,
+                   capture_output=True, check=True)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Report what the app imports when it starts and how long it takes")
+    parser.add_argument("--top", type=int, default=20, help="The number of slowest imports shown")
+    parser.add_argument("--path", default="/why", help="The page requested after the app is created")
+    args = parser.parse_args()
+
+    times = import_times(startup_statement.format(path=args.path))
+    print(f"{'cumulative ms':>14} {'own ms':>8}  module")
+    for name, (own, cumulative) in sorted(times.items(), key=lambda item: item[1][1], reverse=True)[:args.top]:
+        print(f"{cumulative / 1000:14.1f} {own / 1000:8.1f}  {name}")
+
+    imported = [name for name in heavy_modules if name in times]
+    print(f"Heavy modules imported: {', '.join(imported) or 'none'}")
+
+    seconds = startup_seconds(args.path)
+    print(f"Started and answered {args.path} in {seconds * 1000:.0f} ms (budget {STARTUP_BUDGET * 1000:.0f} ms)")
+    if imported or seconds > STARTUP_BUDGET:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,240 @@
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+import numpy as np
+
+from src.benchmarks.data import synthetic_inventory, rate_forms
+
+# The models trained and served by the benchmarks
+benchmark_models = ["Random Forest", "XGBoost"]
+
+
+def best_time(function, repeat) -> float:
+    '''
+    This function will return the fastest of a number of runs of a function in seconds
+    '''
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def bench_process_dataset(df, repeat) -> dict:
+    from src.admin.functions import process_dataset
+
+    return {"seconds": best_time(lambda: process_dataset(df), repeat)}
+
+
+def bench_train_model(processed_df, model_name, instance_path) -> dict:
+    '''
+    This function will time training one model, the model is left in instance_path/tmp for bench_save_models
+    '''
+    from sklearn.model_selection import train_test_split
+    from src.admin.functions import train_model
+    from src.storage import default_formats
+
+    labels = processed_df['Cul_rating']
+    features = processed_df.drop(columns=['Cul_rating'])
+    X_train, X_test, y_train, y_test = train_test_split(features, labels, test_size=0.2, random_state=42)
+
+    model_format = default_formats[model_name]
+    start = time.perf_counter()
+    accuracy = train_model(model_name, _file_path(model_name, model_format), instance_path,
+                           X_train, X_test, y_train, y_test, model_format=model_format)
+    return {"seconds": time.perf_counter() - start, "accuracy": accuracy}
+
+
+def bench_save_models(instance_path) -> dict:
+    from src.admin.functions import save_models
+
+    start = time.perf_counter()
+    result = save_models(instance_path)
+    if result != "Models saved":
+        raise RuntimeError(result)
+    return {"seconds": time.perf_counter() - start}
+
+
+def bench_predict(instance_path, model_name, inference_backend, num_rows=200) -> dict:
+    '''
+    This function will time single-row predicts of a saved model, the way the rate page calls it
+    '''
+    from src.rate.compiled import compile_model
+    from src.storage import default_formats, load_model
+    from src.encoder import FeatureEncoder, encoder_path
+
+    model_format = default_formats[model_name]
+    full_path = os.path.join(instance_path, "current") + _file_path(model_name, model_format)
+    model = load_model(full_path, model_format)
+    encoder = FeatureEncoder.load(encoder_path(full_path))
+    if inference_backend == "compiled":
+        model = compile_model(model)
+
+    rows = [encoder.transform_record(form) for form in _validated_forms(num_rows)]
+    model.predict(rows[0])
+
+    times = []
+    for row in rows:
+        start = time.perf_counter()
+        model.predict(row)
+        times.append(time.perf_counter() - start)
+    return {"seconds": float(np.median(times))}
+
+
+def _validated_forms(num_forms) -> list:
+    from src.rate.functions import validate_record
+
+    return [validate_record(form) for form in rate_forms(num_forms)]
+
+
+def bench_rate(instance_path, num_requests, inference_backend) -> dict:
+    '''
+    This function will time rate page submissions through the Flask test client with the saved models
+    The prediction cache is turned off so every request runs the ensemble
+    '''
+    from src.app import create_app, db
+    from src.models import Admin, AIModels
+    from src.registry import model_registry
+    from src.storage import default_formats
+
+    app = create_app(
+        config={"SQLALCHEMY_DATABASE_URI": f"sqlite:///{instance_path}/benchmark.db", "PREDICTION_CACHE_TYPE": "null"},
+        instance_path=instance_path,
+    )
+    with app.app_context():
+        db.create_all()
+        AIModels.query.delete()
+        if db.session.get(Admin, "benchmark@example.com") is None:
+            db.session.add(Admin("benchmark@example.com"))
+        for model_name in benchmark_models:
+            model_format = default_formats[model_name]
+            db.session.add(AIModels(model_name, _file_path(model_name, model_format), "benchmark@example.com",
+                                    model_format=model_format, inference_backend=inference_backend))
+        db.session.commit()
+    model_registry.invalidate()
+
+    client = app.test_client()
+    forms = rate_forms(num_requests)
+    client.post("/rate/", data=forms[0])  # loads the models
+
+    times = []
+    for form in forms:
+        start = time.perf_counter()
+        response = client.post("/rate/", data=form)
+        times.append(time.perf_counter() - start)
+        if response.status_code != 200:
+            raise RuntimeError(f"The rate page answered {response.status_code}")
+
+    return {
+        "seconds": float(np.median(times)),
+        "p95_seconds": float(np.percentile(times, 95)),
+        "requests": num_requests,
+    }
+
+
+def _file_path(model_name, model_format):
+    from src.storage import model_file
+
+    return model_file("/benchmark" + model_name.replace(" ", ""), model_format)
+
+
+def run_suite(scales, repeat=3, rate_requests=200, log=print) -> dict:
+    '''
+    This function will run every benchmark at every scale
+    :param scales: The numbers of inventory rows to benchmark with
+    :param repeat: The number of runs of process_dataset and of the startup, the fastest is kept
+    :param rate_requests: The number of rate page submissions timed at each scale
+    :param log: Called with a line of progress after each benchmark
+    :return: The results, every benchmark has a "seconds" value where lower is better
+    '''
+    from src.admin.functions import process_dataset
+
+    from src.benchmarks.startup import startup_seconds
+
+    results = {}
+
+    def record(name, result):
+        results[name] = result
+        log(f"{name}: {result['seconds'] * 1000:.2f} ms")
+
+    record("startup", {"seconds": min(startup_seconds() for _ in range(repeat))})
+
+    for rows in scales:
+        df = synthetic_inventory(rows)
+        record(f"process_dataset[{rows}]", bench_process_dataset(df, repeat))
+        processed_df = process_dataset(df)
+
+        with tempfile.TemporaryDirectory() as instance_path:
+            for model_name in benchmark_models:
+                record(f"train_model[{model_name}][{rows}]", bench_train_model(processed_df, model_name, instance_path))
+            record(f"save_models[{rows}]", bench_save_models(instance_path))
+            for backend in ["native", "compiled"]:
+                for model_name in benchmark_models:
+                    record(f"predict[{model_name}][{backend}][{rows}]",
+                           bench_predict(instance_path, model_name, backend))
+                record(f"rate[{backend}][{rows}]", bench_rate(instance_path, rate_requests, backend))
+
+    return {
+        "meta": {
+            "date": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "scales": list(scales),
+        },
+        "results": results,
+    }
+
+
+def compare(results, baseline, threshold) -> list:
+    '''
+    This function will find the benchmarks that got slower than the baseline by more than the threshold
+    :param results: The results from run_suite
+    :param baseline: Earlier results from run_suite
+    :param threshold: The allowed slowdown, 0.25 allows a benchmark to take 25% longer
+    :return: A list of (name, baseline seconds, seconds) tuples of the regressions
+    '''
+    regressions = []
+    for name, result in results["results"].items():
+        before = baseline["results"].get(name)
+        if before is not None and result["seconds"] > before["seconds"] * (1 + threshold):
+            regressions.append((name, before["seconds"], result["seconds"]))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time startup, dataset processing, training, model saving and rating")
+    parser.add_argument("--scales", type=int, nargs="+", default=[10_000, 100_000],
+                        help="The numbers of inventory rows to benchmark with (e.g. 10000 100000 1000000)")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--rate-requests", type=int, default=200)
+    parser.add_argument("--output", default="benchmark-results.json", help="Where the results are written")
+    parser.add_argument("--baseline", help="Results of an earlier run to compare against")
+    parser.add_argument("--threshold", type=float, default=0.25, help="The allowed slowdown against the baseline")
+    args = parser.parse_args()
+
+    results = run_suite(args.scales, args.repeat, args.rate_requests)
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"Results written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.threshold)
+        for name, before, after in regressions:
+            print(f"REGRESSION {name}: {before * 1000:.2f} ms -> {after * 1000:.2f} ms")
+        if regressions:
+            sys.exit(1)
+        print(f"No benchmark is more than {args.threshold:.0%} slower than {args.baseline}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,207 @@
+import json
+import os
+
+import numpy as np
+
+# These are the numerical values used for the ordinal columns in training and inference
+soilDrainageMapping = {
+    'Very poorly drained': 0,
+    'Poorly drained': 1,
+    'Somewhat poorly drained': 2,
+    'Moderately well drained': 3,
+    'Well drained': 4,
+    'High': 5,
+    'Somewhat excessively drained': 6,
+    'Excessively drained': 7,
+}
+
+floodFrequencyMapping = {
+    'No': 0,
+    'very rare': 1,
+    'rare': 2,
+    'Occasional': 3,
+    'Frequent': 4,
+}
+
+# How each rate form field maps onto the processed dataset columns
+numeric_columns = {
+    "soil_ph": "Soil_pH",
+    "soil_moisture": "Soil_Moisture",
+    "soil_ec": "Soil_Elec_Conductivity",
+    "culvert_length": "length",
+    "culvert_age": "Age",
+}
+
+ordinal_columns = {
+    "soil_drainage": ("Soil_Drainage_Class", soilDrainageMapping),
+    "flood_frequency": ("Flooding_Frequency", floodFrequencyMapping),
+}
+
+one_hot_prefixes = {
+    "culvert_material": "mat_",
+    "culvert_shape": "type_",
+}
+
+# The rate form fields an explanation splits a prediction between, every encoded column belongs to one of them
+explained_fields = [*numeric_columns, *ordinal_columns, *one_hot_prefixes]
+
+ENCODER_VERSION = 1
+
+
+def encoder_path(model_path: str) -> str:
+    '''
+    This function will return the path of the encoder file that is stored next to a model
+    :param model_path: The path of the model file
+    :return: The path of the matching encoder file
+    '''
+    return os.path.splitext(model_path)[0] + ".encoder.json"
+
+
+class FeatureEncoder:
+    '''
+    This class turns culvert records into the exact feature matrix a model was trained on.
+    It is fitted on the processed training features so the column order and the one-hot vocabulary
+    always match the model, and everything it needs is worked out once when it is created.
+    '''
+
+    def __init__(self, columns):
+        '''
+        :param columns: The feature columns in the order the model expects them
+        '''
+        self.columns = list(columns)
+        index = {col: i for i, col in enumerate(self.columns)}
+
+        # Precompute where every field ends up so encoding is only array writes
+        self._numeric = [(field, index[col]) for field, col in numeric_columns.items() if col in index]
+        self._ordinal = [(field, mapping, index[col]) for field, (col, mapping) in ordinal_columns.items() if col in index]
+        self._one_hot = {
+            field: {col[len(prefix):]: i for col, i in index.items() if col.startswith(prefix)}
+            for field, prefix in one_hot_prefixes.items()
+        }
+
+        # This sums the columns of each field, the last row and column carry the base value of an explanation
+        self._field_totals = np.zeros((len(self.columns) + 1, len(explained_fields) + 1), dtype=np.float32)
+        self._field_totals[-1, -1] = 1
+        for field, i in self._numeric:
+            self._field_totals[i, explained_fields.index(field)] = 1
+        for field, _, i in self._ordinal:
+            self._field_totals[i, explained_fields.index(field)] = 1
+        for field, lookup in self._one_hot.items():
+            for i in lookup.values():
+                self._field_totals[i, explained_fields.index(field)] = 1
+
+    @classmethod
+    def fit(cls, features) -> "FeatureEncoder":
+        '''
+        This function will fit an encoder on the processed training features (process_dataset without Cul_rating)
+        :param features: The training features dataframe
+        :return: The fitted encoder
+        '''
+        return cls(features.columns)
+
+    @classmethod
+    def from_model(cls, model) -> "FeatureEncoder":
+        '''
+        This function will rebuild the encoder of a model that was saved before encoders were stored next to models
+        :param model: A model trained on a processed dataframe
+        :return: The encoder using the feature names the model was trained with
+        :raises ValueError: If the model does not know its feature names
+        '''
+        columns = getattr(model, "feature_names_in_", None)
+        if columns is None and hasattr(model, "get_booster"):
+            columns = model.get_booster().feature_names
+        if columns is None:
+            raise ValueError("The model does not record the feature names it was trained with.")
+        return cls(columns)
+
+    def save(self, path):
+        '''
+        This function will write the encoder to a JSON file
+        :param path: The path of the encoder file (see encoder_path)
+        '''
+        with open(path, "w") as f:
+            json.dump({"version": ENCODER_VERSION, "columns": self.columns}, f)
+
+    @classmethod
+    def load(cls, path) -> "FeatureEncoder":
+        '''
+        This function will read an encoder written by save
+        :param path: The path of the encoder file
+        :return: The encoder
+        '''
+        with open(path) as f:
+            return cls(json.load(f)["columns"])
+
+    def transform_record(self, record: dict) -> np.ndarray:
+        '''
+        This function will encode one validated record into a single row feature matrix
+        :param record: A validated record using the rate form field names
+        :return: A float32 array with shape (1, number of columns)
+        '''
+        row = np.zeros((1, len(self.columns)), dtype=np.float32)
+
+        for field, i in self._numeric:
+            row[0, i] = record[field]
+        for field, mapping, i in self._ordinal:
+            row[0, i] = mapping[record[field]]
+        for field, lookup in self._one_hot.items():
+            i = lookup.get(record[field])
+            if i is not None:
+                row[0, i] = 1
+
+        return row
+
+    def transform(self, records) -> np.ndarray:
+        '''
+        This function will encode a batch of validated records into a feature matrix
+        :param records: A dataframe of validated records using the rate form field names
+        :return: A float32 array with shape (number of records, number of columns)
+        '''
+        matrix = np.zeros((len(records), len(self.columns)), dtype=np.float32)
+
+        for field, i in self._numeric:
+            matrix[:, i] = records[field].to_numpy(dtype=np.float32)
+        for field, mapping, i in self._ordinal:
+            matrix[:, i] = records[field].map(mapping).to_numpy(dtype=np.float32)
+        for field, lookup in self._one_hot.items():
+            values = records[field].to_numpy()
+            for value, i in lookup.items():
+                matrix[:, i] = values == value
+
+        return matrix
+
+    def transform_dataset(self, features) -> np.ndarray:
+        '''
+        This function will line up processed dataset features with the encoder columns
+        One-hot columns the encoder has not seen are dropped and missing ones are filled with zeros
+        :param features: A dataframe of processed features (see process_dataset)
+        :return: A float32 array with shape (number of rows, number of columns)
+        '''
+        return features.reindex(columns=self.columns, fill_value=0).to_numpy(dtype=np.float32)
+
+    def transform_encoded(self, matrix, columns) -> np.ndarray:
+        '''
+        This function will line up a feature matrix that was encoded with other columns with the encoder columns
+        Columns the encoder does not have are dropped and missing ones are filled with zeros
+        :param matrix: The encoded feature matrix
+        :param columns: The columns of the matrix in order
+        :return: A float32 array with shape (number of rows, number of columns)
+        '''
+        if list(columns) == self.columns:
+            return np.asarray(matrix, dtype=np.float32)
+
+        index = {col: i for i, col in enumerate(columns)}
+        lined_up = np.zeros((len(matrix), len(self.columns)), dtype=np.float32)
+        for i, col in enumerate(self.columns):
+            if col in index:
+                lined_up[:, i] = matrix[:, index[col]]
+        return lined_up
+
+    def field_totals(self, contributions) -> np.ndarray:
+        '''
+        This function will add up the contributions of the columns of each rate form field (the one-hot columns of
+        the culvert material become one culvert material contribution)
+        :param contributions: An array with shape (rows, number of columns + 1), the last column is the base value
+        :return: An array with shape (rows, len(explained_fields) + 1), the last column is the base value
+        '''
+        return np.asarray(contributions, dtype=np.float32) @ self._field_totals
@@ -0,0 +1,279 @@
+import bisect
+import math
+import threading
+import time
+
+# The upper bounds (in seconds) of the histogram buckets, from 100 microseconds to 5 minutes
+DEFAULT_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+                   1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names, values, extra=None) -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra is not None:
+        pairs.append(f'{extra[0]}="{extra[1]}"')
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value) -> str:
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value))
+
+
+class _Timer:
+    '''
+    This times the block it wraps and gives the duration to a histogram
+    '''
+    __slots__ = ("histogram", "label_values", "start")
+
+    def __init__(self, histogram, label_values):
+        self.histogram = histogram
+        self.label_values = label_values
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.start, *self.label_values)
+        return False
+
+
+class _NullTimer:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_null_timer = _NullTimer()
+
+
+class Histogram:
+    '''
+    This counts observations (normally durations in seconds) into cumulative buckets the way Prometheus expects.
+    Every combination of label values gets its own series.
+    '''
+    kind = "histogram"
+
+    def __init__(self, registry, name, help_text, labels=(), buckets=DEFAULT_BUCKETS):
+        '''
+        :param registry: The MetricsRegistry the histogram is exported by
+        :param name: The metric name
+        :param help_text: The description shown in the exported text
+        :param labels: The label names
+        :param buckets: The upper bounds of the buckets
+        '''
+        self.registry = registry
+        self.name = name
+        self.help_text = help_text
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        self._series = {}  # label values -> [bucket counts, sum, count]
+        self._lock = threading.Lock()
+        registry.register(self)
+
+    def observe(self, value, *label_values):
+        '''
+        This function will record an observation
+        :param value: The observed value
+        :param label_values: The value of every label in order
+        '''
+        if not self.registry.enabled:
+            return
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def time(self, *label_values):
+        '''
+        This function will return a context manager that observes how long its block took
+        :param label_values: The value of every label in order
+        '''
+        if not self.registry.enabled:
+            return _null_timer
+        return _Timer(self, label_values)
+
+    def collect(self):
+        with self._lock:
+            series = {labels: (list(counts), total, count) for labels, (counts, total, count) in self._series.items()}
+
+        lines = []
+        for label_values, (counts, total, count) in sorted(series.items()):
+            cumulative = 0
+            for bound, bucket in zip(self.buckets + (math.inf,), counts):
+                cumulative += bucket
+                le = ("le", _format_value(bound))
+                lines.append(f"{self.name}_bucket{_format_labels(self.labels, label_values, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labels, label_values)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(self.labels, label_values)} {count}")
+        return lines
+
+    def reset(self):
+        with self._lock:
+            self._series.clear()
+
+
+class Counter:
+    '''
+    This is a value that only goes up, such as the number of timed out predictions
+    '''
+    kind = "counter"
+
+    def __init__(self, registry, name, help_text, labels=()):
+        self.registry = registry
+        self.name = name
+        self.help_text = help_text
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+        registry.register(self)
+
+    def inc(self, *label_values, amount=1):
+        if not self.registry.enabled:
+            return
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def collect(self):
+        with self._lock:
+            values = dict(self._values)
+        return [f"{self.name}{_format_labels(self.labels, labels)} {_format_value(value)}"
+                for labels, value in sorted(values.items())]
+
+    def reset(self):
+        with self._lock:
+            self._values.clear()
+
+
+class CallbackMetric:
+    '''
+    This is a value that is read from a callback when the metrics are exported, so it costs nothing until then
+    '''
+
+    def __init__(self, registry, name, help_text, callback, kind="gauge"):
+        '''
+        :param callback: A callable returning the current value, or None when there is nothing to report
+        :param kind: "gauge", or "counter" when the value only goes up
+        '''
+        self.registry = registry
+        self.name = name
+        self.help_text = help_text
+        self.callback = callback
+        self.kind = kind
+        registry.register(self)
+
+    def collect(self):
+        value = self.callback()
+        return [] if value is None else [f"{self.name} {_format_value(value)}"]
+
+    def reset(self):
+        pass
+
+
+class MetricsRegistry:
+    '''
+    This holds every metric of the process and renders them in the Prometheus text format.
+    Each web worker and training process keeps its own numbers, a scrape only sees the worker that answers it.
+    '''
+
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+        self._metrics = []
+
+    def init_app(self, app):
+        '''
+        This function will turn the metrics on or off from the app config (METRICS_ENABLED)
+        :param app: The flask app
+        '''
+        self.enabled = app.config["METRICS_ENABLED"]
+
+    def register(self, metric):
+        self._metrics.append(metric)
+
+    def render(self) -> str:
+        '''
+        This function will return every metric in the Prometheus text exposition format
+        :return: The exported text
+        '''
+        lines = []
+        for metric in self._metrics:
+            lines.append(f"# HELP {metric.name} {metric.help_text}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.collect())
+        return "\n".join(lines) + "\n"
+
+    def reset(self):
+        '''
+        This function will clear every recorded value
+        '''
+        for metric in self._metrics:
+            metric.reset()
+
+
+# The metrics shared by every request handled by this process
+metrics = MetricsRegistry()
+
+rate_stage_seconds = Histogram(
+    metrics, "dms_rate_stage_seconds", "Time spent in each stage of a rate request.", labels=("stage",)
+)
+model_predict_seconds = Histogram(
+    metrics, "dms_model_predict_seconds", "Time each model spent in predict.", labels=("model",)
+)
+model_explain_seconds = Histogram(
+    metrics, "dms_model_explain_seconds", "Time each model spent explaining its predictions.", labels=("model",)
+)
+model_timeouts_total = Counter(
+    metrics, "dms_model_timeouts_total", "Predictions that did not finish before the inference timeout.",
+    labels=("model",)
+)
+registry_query_seconds = Histogram(
+    metrics, "dms_registry_query_seconds", "Time spent reading the AIModels table."
+)
+model_load_seconds = Histogram(
+    metrics, "dms_model_load_seconds", "Time spent reading a model file from disk.", labels=("format",)
+)
+train_model_seconds = Histogram(
+    metrics, "dms_train_model_seconds", "Time spent training one model.", labels=("model",)
+)
+save_models_seconds = Histogram(
+    metrics, "dms_save_models_seconds", "Time save_models spent moving the model files."
+)
+
+
+def _cache_stat(name):
+    def read():
+        from src.rate.cache import prediction_cache
+
+        return prediction_cache.stats()[name]
+    return read
+
+
+for _stat in ("hits", "misses", "evictions"):
+    CallbackMetric(metrics, f"dms_prediction_cache_{_stat}_total", f"The {_stat} of the prediction cache.",
+                   _cache_stat(_stat), kind="counter")
+CallbackMetric(metrics, "dms_prediction_cache_size", "The number of entries in the prediction cache.", _cache_stat("size"))
+
+
+def _admin_cache_stat(name):
+    def read():
+        from src.admin.auth import admin_cache
+
+        return admin_cache.stats()[name]
+    return read
+
+
+for _stat in ("hits", "misses"):
+    CallbackMetric(metrics, f"dms_admin_cache_{_stat}_total", f"The {_stat} of the admin check cache.",
+                   _admin_cache_stat(_stat), kind="counter")
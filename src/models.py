@@ -19,15 +19,20 @@ class AIModels(db.Model):
 
     model_name = db.Column(db.String(255), primary_key=True, unique=True, nullable=False)
     file_path = db.Column(db.String(512), nullable=False)
+    model_format = db.Column(db.String(32), nullable=False, default="pickle", server_default="pickle")
+    inference_backend = db.Column(db.String(32), nullable=False, default="native", server_default="native")
     admin_email = db.Column(db.String(255), db.ForeignKey('admin_info.email'), nullable=False)
     updated_by = db.Column(db.String(255), db.ForeignKey('admin_info.email'), nullable=True)
     date_created = db.Column(db.DateTime, default=datetime.now)
     date_updated = db.Column(db.DateTime, default=datetime.now, onupdate=datetime.now)
     description = db.Column(db.Text, nullable=True)
 
-    def __init__(self, model_name, file_path, admin_email, description=None):
+    def __init__(self, model_name, file_path, admin_email, description=None, model_format="pickle",
+                 inference_backend="native"):
         self.model_name = model_name
         self.file_path = file_path
+        self.model_format = model_format
+        self.inference_backend = inference_backend
         self.admin_email = admin_email
         self.description = description
         self.date_created = datetime.now()
@@ -0,0 +1,184 @@
+import hashlib
+import json
+import os
+import threading
+import uuid
+from collections import OrderedDict
+from time import time
+
+import numpy as np
+from cachelib import BaseCache, FileSystemCache, NullCache
+
+from src.rate.functions import rate_fields, numeric_fields
+
+VERSION_KEY = "rate:model-set-version"
+
+# This is part of every key, it changes when the cached value changes shape so old entries are not read
+ENTRY_FORMAT = 2
+
+
+class LRUCache(BaseCache):
+    '''
+    This is an in-process cachelib backend that evicts the least recently used entry once it is full.
+    Values are kept as python objects so nothing is serialized on a hit.
+    '''
+
+    def __init__(self, threshold=1024, default_timeout=300):
+        '''
+        :param threshold: The largest number of entries kept before the least recently used one is evicted
+        :param default_timeout: The number of seconds an entry lives, 0 means it never expires
+        '''
+        BaseCache.__init__(self, default_timeout)
+        self._threshold = threshold
+        self._cache = OrderedDict()  # key -> (expires, value)
+        self._lock = threading.Lock()
+        self.evictions = 0
+
+    def _expires(self, timeout):
+        timeout = self._normalize_timeout(timeout)
+        return time() + timeout if timeout > 0 else 0
+
+    def get(self, key):
+        with self._lock:
+            item = self._cache.get(key)
+            if item is None:
+                return None
+            expires, value = item
+            if expires and expires <= time():
+                del self._cache[key]
+                return None
+            self._cache.move_to_end(key)
+            return value
+
+    def set(self, key, value, timeout=None):
+        with self._lock:
+            self._cache[key] = (self._expires(timeout), value)
+            self._cache.move_to_end(key)
+            while len(self._cache) > self._threshold:
+                self._cache.popitem(last=False)
+                self.evictions += 1
+        return True
+
+    def add(self, key, value, timeout=None):
+        if self.has(key):
+            return False
+        return self.set(key, value, timeout)
+
+    def delete(self, key):
+        with self._lock:
+            return self._cache.pop(key, None) is not None
+
+    def has(self, key):
+        return self.get(key) is not None
+
+    def clear(self):
+        with self._lock:
+            self._cache.clear()
+        return True
+
+    def __len__(self):
+        return len(self._cache)
+
+
+class PredictionCache:
+    '''
+    This caches the ensemble predictions for a record so repeated ratings skip the models.
+    Keys are built from the record as the models see it (numbers as float32), the files of the models that are
+    served and a model-set version that is changed whenever the models are swapped, so a stale prediction is never
+    returned. Any cachelib backend can be used, the default is an in-process LRU.
+    '''
+
+    def __init__(self, backend=None):
+        '''
+        :param backend: The cachelib backend, an LRUCache is used if it is not given
+        '''
+        self.backend = backend if backend is not None else LRUCache()
+        self.hits = 0
+        self.misses = 0
+
+    def init_app(self, app):
+        '''
+        This function will build the backend from the app config
+        PREDICTION_CACHE_TYPE is "lru" (in-process), "filesystem" (shared by every worker) or "null" (disabled)
+        :param app: The flask app
+        '''
+        cache_type = app.config["PREDICTION_CACHE_TYPE"]
+        size = app.config["PREDICTION_CACHE_SIZE"]
+        ttl = app.config["PREDICTION_CACHE_TTL"]
+
+        if cache_type == "filesystem":
+            cache_dir = os.path.join(app.instance_path, "prediction_cache")
+            self.backend = FileSystemCache(cache_dir, threshold=size, default_timeout=ttl)
+        elif cache_type == "null":
+            self.backend = NullCache()
+        else:
+            self.backend = LRUCache(threshold=size, default_timeout=ttl)
+
+    def version(self) -> str:
+        '''
+        This function will return the current model-set version, a new random one is made if there is none
+        :return: The model-set version
+        '''
+        version = self.backend.get(VERSION_KEY)
+        if version is None:
+            self.backend.add(VERSION_KEY, uuid.uuid4().hex, timeout=0)
+            version = self.backend.get(VERSION_KEY)
+        return version
+
+    def bump_version(self):
+        '''
+        This function will change the model-set version so every cached prediction stops being used
+        '''
+        self.backend.set(VERSION_KEY, uuid.uuid4().hex, timeout=0)
+
+    def key(self, record: dict, models) -> str:
+        '''
+        This function will build the cache key for a record
+        :param record: A validated record
+        :param models: The LoadedModel tuples that rate the record
+        :return: The cache key
+        '''
+        canonical = [
+            np.float32(record[field]).item() if field in numeric_fields else record[field]
+            for field in rate_fields
+        ]
+        fingerprint = [[model.model_name, model.signature] for model in models]
+        payload = json.dumps([ENTRY_FORMAT, self.version(), fingerprint, canonical])
+        return "rate:" + hashlib.sha1(payload.encode()).hexdigest()
+
+    def get(self, key):
+        '''
+        This function will return the cached predictions for a key and count the hit or miss
+        :param key: The key from PredictionCache.key
+        :return: The cached value or None
+        '''
+        value = self.backend.get(key)
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    def set(self, key, predictions):
+        '''
+        This function will cache the predictions for a key
+        :param key: The key from PredictionCache.key
+        :param predictions: The value to cache, the rate page caches the predictions and explanations from predict_ensemble
+        '''
+        self.backend.set(key, predictions)
+
+    def stats(self) -> dict:
+        '''
+        This function will return the cache counters
+        :return: A dict of the hits, misses, evictions and number of entries (None when the backend does not track it)
+        '''
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": getattr(self.backend, "evictions", None),
+            "size": len(self.backend) if isinstance(self.backend, LRUCache) else None,
+        }
+
+
+# The prediction cache shared by every request handled by this process
+prediction_cache = PredictionCache()
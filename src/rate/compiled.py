@@ -0,0 +1,288 @@
+import json
+
+import numpy as np
+
+
+class CompiledTrees:
+    '''
+    This is a tree ensemble flattened into packed numpy arrays so a few rows can be scored without the input checks
+    and conversions that sklearn and XGBoost run on every predict call.
+    Every tree is stored in the same node arrays and a row goes to the left child when its feature is less than or
+    equal to the threshold. Leaves point at themselves with an infinite threshold so every row can walk the same
+    number of steps. The features are compared as float32, like both libraries do, and must not be missing.
+    '''
+
+    def __init__(self, kind, classes, feature, threshold, left, right, value, roots, depth, base=None, mean=None):
+        '''
+        :param kind: "forest" (averaged leaf probabilities), "softprob" or "logistic" (summed XGBoost leaf margins)
+        :param classes: The classes of the original model
+        :param feature: The feature each node splits on
+        :param threshold: The float32 threshold of each node
+        :param left: The left child of each node
+        :param right: The right child of each node
+        :param value: The leaf values, (nodes, classes) probabilities for a forest and (nodes,) margins when boosted
+        :param roots: The root node of each tree
+        :param depth: The depth of the deepest tree
+        :param base: The starting margin of each class when boosted
+        :param mean: The average leaf margin under each node when boosted (weighted by the training hessian), only
+            used by contributions, a forest uses the class fractions in value
+        '''
+        self.kind = kind
+        self.classes_ = np.asarray(classes)
+        self.feature = np.asarray(feature, dtype=np.intp)
+        self.threshold = np.asarray(threshold, dtype=np.float32)
+        self.left = np.asarray(left, dtype=np.intp)
+        self.right = np.asarray(right, dtype=np.intp)
+        self.value = np.asarray(value)
+        self.roots = np.asarray(roots, dtype=np.intp)
+        self.depth = int(depth)
+        self.base = None if base is None else np.asarray(base, dtype=np.float32)
+        self.mean = None if mean is None else np.asarray(mean, dtype=np.float64)
+
+    def apply(self, X) -> np.ndarray:
+        '''
+        This function will walk every row down every tree at the same time
+        :param X: The encoded features
+        :return: The leaf each row ends in for every tree, with shape (rows, trees)
+        '''
+        X = np.asarray(X, dtype=np.float32)
+        rows = np.arange(len(X))[:, None]
+        node = np.broadcast_to(self.roots, (len(X), len(self.roots)))
+        for _ in range(self.depth):
+            node = np.where(X[rows, self.feature[node]] <= self.threshold[node], self.left[node], self.right[node])
+        return node
+
+    def predict_proba(self, X) -> np.ndarray:
+        '''
+        This function will return the class probabilities the original model gives
+        :param X: The encoded features
+        :return: The probabilities with shape (rows, classes)
+        '''
+        leaves = self.apply(X)
+
+        # The leaves are added up one tree at a time in tree order so the rounding is the same as the libraries
+        if self.kind == "forest":
+            return np.cumsum(self.value[leaves], axis=1)[:, -1] / len(self.roots)
+
+        margins = self.value[leaves].reshape(len(leaves), -1, len(self.base))
+        start = np.broadcast_to(self.base, (len(leaves), 1, len(self.base)))
+        margin = np.cumsum(np.concatenate([start, margins], axis=1), axis=1, dtype=np.float32)[:, -1]
+
+        if self.kind == "logistic":
+            positive = 1 / (1 + np.exp(-margin[:, 0]))
+            return np.stack([1 - positive, positive], axis=1)
+
+        exp = np.exp(margin - margin.max(axis=1, keepdims=True))
+        return exp / exp.sum(axis=1, keepdims=True)
+
+    def contributions(self, X, predicted=None) -> np.ndarray:
+        '''
+        This function will split the score of the class predicted for every row between the features. Each row is
+        walked down every tree and every split it passes is credited to its feature with the change it makes to the
+        value of the node (the tree path attribution XGBoost gives with approx_contribs). The scores are
+        probabilities for a forest and margins when boosted, the base value and the contributions of a row add up
+        to its score.
+        :param X: The encoded features
+        :param predicted: The classes predicted for the rows, they are predicted again if they are not given
+        :return: An array with shape (rows, features + 1), the last column is the base value every row starts from
+        '''
+        X = np.asarray(X, dtype=np.float32)
+        num_rows, num_features = X.shape
+        num_trees = len(self.roots)
+        if predicted is None:
+            index = np.argmax(self.predict_proba(X), axis=1)
+        else:
+            index = np.searchsorted(self.classes_, predicted)
+
+        # Every (row, tree) pair that counts towards the predicted class of its row, with the weight it counts with
+        # and the column of its node values that holds the score of the class
+        row = np.repeat(np.arange(num_rows), num_trees)
+        tree = np.tile(np.arange(num_trees), num_rows)
+        if self.kind == "forest":
+            values = self.value
+            column = index[row]
+            weight = np.full(len(row), 1 / num_trees)
+            base = np.zeros(num_rows)
+        else:
+            if self.mean is None:
+                raise ValueError("The node values needed for contributions were not compiled.")
+            values = self.mean[:, np.newaxis]
+            if self.kind == "logistic":
+                # The margin is the score of class 1 so it counts against class 0
+                sign = np.where(index == 1, 1.0, -1.0)
+                weight = sign[row]
+                base = self.base[0] * sign
+            else:
+                # Only the trees of the predicted class add to its margin
+                mine = tree % len(self.base) == index[row]
+                row, tree = row[mine], tree[mine]
+                weight = np.ones(len(row))
+                base = self.base[index].astype(np.float64)
+            column = np.zeros(len(row), dtype=np.intp)
+
+        node = self.roots[tree]
+        base = base + np.bincount(row, values[node, column] * weight, minlength=num_rows)
+
+        width = num_features + 1
+        totals = np.zeros(num_rows * width)
+        while len(node):
+            feature = self.feature[node]
+            child = np.where(X[row, feature] <= self.threshold[node], self.left[node], self.right[node])
+
+            # A leaf points at itself, the pairs that reached one are done
+            moving = child != node
+            if not moving.all():
+                row, column, weight, node, child, feature = (
+                    array[moving] for array in (row, column, weight, node, child, feature)
+                )
+
+            change = (values[child, column] - values[node, column]) * weight
+            totals += np.bincount(row * width + feature, change, minlength=len(totals))
+            node = child
+
+        totals = totals.reshape(num_rows, width)
+        totals[:, -1] = base
+        return totals
+
+    def predict(self, X) -> np.ndarray:
+        '''
+        This function will return the class the original model predicts
+        :param X: The encoded features
+        :return: The predicted classes
+        '''
+        return self.classes_[np.argmax(self.predict_proba(X), axis=1)]
+
+
+def _round_down(threshold, upper) -> np.ndarray:
+    '''
+    This function will return the largest float32 threshold t where a float32 x <= t is the same as the original test
+    :param threshold: The original thresholds
+    :param upper: True when the original test is x <= threshold, False when it is x < threshold
+    '''
+    threshold = np.asarray(threshold)
+    rounded = threshold.astype(np.float32)
+    too_high = rounded > threshold if upper else rounded >= threshold
+    return np.where(too_high, np.nextafter(rounded, np.float32(-np.inf)), rounded)
+
+
+def _flatten(trees):
+    '''
+    This function will pack a list of (feature, threshold, left, right, value) trees into shared node arrays
+    Leaves are marked with a left child of -1 and are turned into nodes that point at themselves
+    '''
+    feature, threshold, left, right, value, roots = [], [], [], [], [], []
+    offset = 0
+    for tree_feature, tree_threshold, tree_left, tree_right, tree_value in trees:
+        leaf = tree_left < 0
+        index = np.arange(len(tree_left)) + offset
+
+        roots.append(offset)
+        feature.append(np.where(leaf, 0, tree_feature))
+        threshold.append(np.where(leaf, np.float32(np.inf), tree_threshold).astype(np.float32))
+        left.append(np.where(leaf, index, tree_left + offset))
+        right.append(np.where(leaf, index, tree_right + offset))
+        value.append(tree_value)
+        offset += len(tree_left)
+
+    return (np.concatenate(feature), np.concatenate(threshold), np.concatenate(left), np.concatenate(right),
+            np.concatenate(value), np.array(roots))
+
+
+def _compile_forest(model) -> CompiledTrees:
+    trees = []
+    depth = 0
+    for estimator in model.estimators_:
+        tree = estimator.tree_
+        if tree.n_outputs != 1:
+            raise ValueError("Only forests with one output can be compiled.")
+
+        # Each tree gives the class fractions of its leaf, the same as DecisionTreeClassifier.predict_proba
+        value = tree.value[:, 0, :]
+        normalizer = value.sum(axis=1)[:, np.newaxis]
+        normalizer[normalizer == 0.0] = 1.0
+
+        trees.append((tree.feature, _round_down(tree.threshold, upper=True), tree.children_left,
+                      tree.children_right, value / normalizer))
+        depth = max(depth, tree.max_depth)
+
+    feature, threshold, left, right, value, roots = _flatten(trees)
+    return CompiledTrees("forest", model.classes_, feature, threshold, left, right, value, roots, depth)
+
+
+def _compile_xgboost(model) -> CompiledTrees:
+    learner = json.loads(model.get_booster().save_raw("json"))["learner"]
+    objective = learner["objective"]["name"]
+    booster = learner["gradient_booster"]
+    if booster["name"] != "gbtree":
+        raise ValueError(f"The {booster['name']} booster cannot be compiled.")
+    if objective not in ("multi:softprob", "binary:logistic"):
+        raise ValueError(f"Models with the {objective} objective cannot be compiled.")
+
+    base = np.array(json.loads(learner["learner_model_param"]["base_score"]), dtype=np.float32)
+    num_class = max(1, int(learner["learner_model_param"]["num_class"]))
+    if objective == "binary:logistic":
+        base = np.log(base / (1 - base))
+
+    # Every boosting round adds one tree per class in class order
+    tree_info = booster["model"]["tree_info"]
+    if tree_info != list(range(num_class)) * (len(tree_info) // num_class):
+        raise ValueError("The trees of the model are not in boosting round order.")
+
+    trees = []
+    means = []
+    depth = 0
+    for tree in booster["model"]["trees"]:
+        if any(tree["split_type"]):
+            raise ValueError("Models with categorical splits cannot be compiled.")
+
+        left = np.array(tree["left_children"])
+        right = np.array(tree["right_children"])
+        conditions = np.array(tree["split_conditions"], dtype=np.float32)
+        trees.append((np.array(tree["split_indices"]), _round_down(conditions, upper=False), left, right, conditions))
+        means.append(_node_means(left, right, conditions, np.array(tree["sum_hessian"])))
+        depth = max(depth, _depth(left, right))
+
+    feature, threshold, left, right, value, roots = _flatten(trees)
+    kind = "softprob" if objective == "multi:softprob" else "logistic"
+    return CompiledTrees(kind, model.classes_, feature, threshold, left, right, value, roots, depth, base,
+                         np.concatenate(means))
+
+
+def _node_means(left, right, leaf_values, hessian) -> np.ndarray:
+    '''
+    This function will return the average leaf value under each node of a boosted tree, weighted by the hessian of
+    the training rows that reached each leaf the same way XGBoost does for approx_contribs
+    '''
+    mean = leaf_values.astype(np.float64)
+
+    # Children are always numbered after their parent so they are done first
+    for node in range(len(left) - 1, -1, -1):
+        if left[node] >= 0:
+            l, r = left[node], right[node]
+            mean[node] = (hessian[l] * mean[l] + hessian[r] * mean[r]) / (hessian[l] + hessian[r])
+    return mean
+
+
+def _depth(left, right) -> int:
+    '''
+    This function will return the number of splits on the longest path of a tree
+    '''
+    depth = np.zeros(len(left), dtype=int)
+    for node in range(len(left)):
+        if left[node] >= 0:
+            depth[left[node]] = depth[right[node]] = depth[node] + 1
+    return int(depth.max())
+
+
+def compile_model(model) -> CompiledTrees:
+    '''
+    This function will flatten a trained RandomForestClassifier or XGBClassifier into a CompiledTrees
+    :param model: The trained model
+    :return: The compiled model, its predictions are the same as the original model's
+    :raises ValueError: If the model cannot be compiled
+    '''
+    if hasattr(model, "get_booster"):
+        return _compile_xgboost(model)
+    if hasattr(model, "estimators_") and all(hasattr(estimator, "tree_") for estimator in model.estimators_):
+        return _compile_forest(model)
+    raise ValueError(f"{type(model).__name__} models cannot be compiled.")
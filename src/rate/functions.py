@@ -0,0 +1,267 @@
+from __future__ import annotations
+
+from functools import partial
+from typing import TYPE_CHECKING
+
+import numpy as np
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+from src.encoder import explained_fields
+from src.metrics import rate_stage_seconds, model_predict_seconds, model_explain_seconds, model_timeouts_total
+from src.rate.explain import explain_predictions
+from src.rate.inference import inference_executor
+
+soilDrainageOptions = [
+    "Excessively drained",
+    "Somewhat excessively drained",
+    "Well drained",
+    "Moderately well drained",
+    "High",
+    "Somewhat poorly drained",
+    "Poorly drained",
+    "Very poorly drained",
+]
+
+culvertMaterialOptions = [
+    "Aluminum",
+    "Corrugated Steel",
+    "High Density Polyethylene",
+    "Poly Vinyl Chloride",
+    "Steel Plate",
+    "Steel plate",
+    "Reinforced Concrete",
+    "Unreinforced Concrete",
+]
+
+culvertShapeOptions = [
+    "Arch",
+    "Round",
+    "Ellipse/Squashed",
+    "Box",
+    "Other",
+]
+
+floodFrequencyOptions = [
+    "No",
+    "very rare",
+    "rare",
+    "Occasional",
+    "Frequent",
+]
+
+# The form fields read by the rate page, these are also the columns of a batch CSV
+rate_fields = [
+    "soil_ph",
+    "soil_drainage",
+    "soil_moisture",
+    "soil_ec",
+    "flood_frequency",
+    "culvert_material",
+    "culvert_shape",
+    "culvert_length",
+    "culvert_age",
+]
+
+# The fields that must be numeric and the fields that must be one of the option lists
+numeric_fields = ["soil_ph", "soil_moisture", "soil_ec", "culvert_length", "culvert_age"]
+option_fields = {
+    "soil_drainage": soilDrainageOptions,
+    "flood_frequency": floodFrequencyOptions,
+    "culvert_material": culvertMaterialOptions,
+    "culvert_shape": culvertShapeOptions,
+}
+
+# The readable names used in the validation error messages
+option_labels = {
+    "soil_drainage": "soil drainage",
+    "flood_frequency": "flood frequency",
+    "culvert_material": "culvert material",
+    "culvert_shape": "culvert shape",
+}
+
+
+# The readable names of the fields, used on the results page
+field_labels = {
+    "soil_ph": "Soil pH",
+    "soil_drainage": "Soil drainage class",
+    "soil_moisture": "Soil moisture (%)",
+    "soil_ec": "Soil electrical conductivity",
+    "flood_frequency": "Flood frequency",
+    "culvert_material": "Culvert material",
+    "culvert_shape": "Culvert shape",
+    "culvert_length": "Culvert length (ft)",
+    "culvert_age": "Culvert age (years)",
+}
+
+
+# Helper function that converts a numeric rating into a human-readable label
+def describe_condition(score: int) -> str:
+    if score >= 5:
+        return "The culvert is in excellent condition."
+    elif score == 4:
+        return "The culvert is in good condition with minor concerns."
+    elif score == 3:
+        return "The culvert is in fair condition and should be monitored."
+    elif score == 2:
+        return "The culvert is in poor condition and maintenance is recommended."
+    else:
+        return "The culvert is in critical condition and should be evaluated urgently."
+
+
+def validate_record(record: dict) -> dict:
+    '''
+    This function will validate a single culvert record and convert the numeric fields, with the same rules as
+    validate_frame so the form, the batch upload and the API accept the same values
+    :param record: A dict holding every field in rate_fields as it was submitted
+    :return: A new dict with the numeric fields converted to numbers
+    :raises ValueError: If a field is missing, not numeric or not one of the allowed options
+    '''
+    import pandas as pd
+
+    records, errors = validate_frame(pd.DataFrame({field: [record.get(field)] for field in rate_fields}, dtype=object))
+    if errors[0]:
+        raise ValueError(errors[0])
+
+    validated = {field: record[field] for field in rate_fields}
+    for field in numeric_fields:
+        validated[field] = float(records.loc[0, field])
+    validated["culvert_age"] = int(validated["culvert_age"])
+    return validated
+
+
+def validate_frame(df: pd.DataFrame) -> tuple[pd.DataFrame, pd.Series]:
+    '''
+    This function will validate every row of a batch of culvert records at once
+    :param df: The dataframe of records, it must have every column in rate_fields
+    :return: The records with numeric columns converted, and a series holding the error message for each row ("" if valid)
+    :raises ValueError: If a required column is missing
+    '''
+    import pandas as pd
+
+    missing = [field for field in rate_fields if field not in df.columns]
+    if missing:
+        raise ValueError(f"Missing required columns: {', '.join(missing)}.")
+
+    records = df[rate_fields].copy()
+    errors = pd.Series("", index=df.index, dtype=object)
+
+    # Empty cells are reported before anything else
+    empty = records.isna() | (records.astype(str).apply(lambda col: col.str.strip()) == "")
+    errors[empty.any(axis=1)] = "Missing required field."
+
+    for field in numeric_fields:
+        values = pd.to_numeric(records[field], errors="coerce")
+
+        # The models take float32 features, so infinite numbers and numbers too big for float32 are rejected, and a
+        # JSON true or false is not a number
+        invalid = values.isna() | records[field].map(lambda value: isinstance(value, (bool, np.bool_)))
+        magnitude = values.astype(float).abs()
+        invalid |= ~np.isfinite(magnitude) | (magnitude > np.finfo(np.float32).max)
+        if field == "culvert_age":
+            invalid |= values % 1 != 0
+        errors[invalid & (errors == "")] = f"Invalid {field}."
+        records[field] = values
+
+    for field, options in option_fields.items():
+        invalid = ~records[field].isin(options)
+        errors[invalid & (errors == "")] = f"Invalid {option_labels[field]} option."
+
+    return records, errors
+
+
+def predict_ensemble(models, records, timeout=None, explain=False) -> tuple:
+    '''
+    This function will run every model on the encoded records at the same time with a single predict call each
+    :param models: A list of LoadedModel tuples from the model registry
+    :param records: One validated record as a dict, or a dataframe of validated records
+    :param timeout: The number of seconds to wait for the models, the executor default is used if it is not given
+    :param explain: Whether every model also explains its predictions on the same pool thread (see explain_predictions)
+    :return: The (model_name, predictions) tuples of the models that answered in AIModels order, where every
+             prediction is at least 1, and the names of the models that timed out. When explain is set a third item
+             maps the name of every model that answered to its explanations (None if it cannot be explained)
+    '''
+    tasks = []
+    encoded = {}  # models that share a column layout share the encoded matrix
+
+    # The records are encoded up front so the pool threads only run predict
+    with rate_stage_seconds.time("encode"):
+        for model_name, model, encoder, _ in models:
+            key = tuple(encoder.columns)
+            if key not in encoded:
+                if isinstance(records, dict):
+                    encoded[key] = encoder.transform_record(records)
+                else:
+                    encoded[key] = encoder.transform(records)
+            features = encoded[key]
+
+            # Models pickled before encoders existed were trained on dataframes and expect the column names
+            if getattr(model, "feature_names_in_", None) is not None:
+                import pandas as pd
+
+                features = pd.DataFrame(features, columns=encoder.columns)
+
+            tasks.append((model_name, partial(_predict, model_name, model, features, encoder if explain else None)))
+
+    with rate_stage_seconds.time("predict"):
+        results, timed_out = inference_executor.run(tasks, timeout)
+
+    for model_name in timed_out:
+        model_timeouts_total.inc(model_name)
+
+    if not explain:
+        return results, timed_out
+    predictions = [(model_name, result[0]) for model_name, result in results]
+    explanations = {model_name: result[1] for model_name, result in results}
+    return predictions, timed_out, explanations
+
+
+def _predict(model_name, model, features, encoder=None):
+    '''
+    This function will run one model and clamp its predictions to the lowest rating
+    :param model_name: The name of the model, used for its predict time metric
+    :param model: The trained model
+    :param features: The encoded features
+    :param encoder: The encoder of the model, the predictions are also explained when it is given
+    :return: The predictions where every prediction is at least 1, with their explanations when an encoder is given
+    '''
+    with model_predict_seconds.time(model_name):
+        predicted = model.predict(features)
+    predictions = np.maximum(np.asarray(predicted), 1)
+    if encoder is None:
+        return predictions
+
+    with model_explain_seconds.time(model_name):
+        explanations = explain_predictions(model, features, encoder, predicted)
+    return predictions, explanations
+
+
+def top_factors(explanation, num_factors=3) -> list:
+    '''
+    This function will pick the fields that moved one prediction the most
+    :param explanation: One row of the explanations from explain_predictions
+    :param num_factors: The number of fields returned
+    :return: A list of (field label, contribution) tuples, the largest contribution first
+    '''
+    contributions = explanation[:-1]
+    order = np.argsort(-np.abs(contributions), kind="stable")[:num_factors]
+    return [(field_labels[explained_fields[i]], float(contributions[i])) for i in order]
+
+
+def rate_records(models, records: pd.DataFrame, timeout=None, explain=False) -> tuple:
+    '''
+    This function will rate validated records with the whole ensemble
+    :param models: A list of LoadedModel tuples from the model registry
+    :param records: A dataframe of validated records (see validate_frame)
+    :param timeout: The number of seconds to wait for the models
+    :param explain: Whether the predictions are also explained (see predict_ensemble)
+    :return: The (model_name, predictions) tuples, the averaged rating of every record (None if no model answered)
+             and the names of the models that timed out, with the explanations of every model when explain is set
+    '''
+    results = predict_ensemble(models, records, timeout, explain)
+    predictions, timed_out = results[:2]
+    overall_rating = None
+    if predictions:
+        overall_rating = sum(prediction for _, prediction in predictions) / len(predictions)
+    return (predictions, overall_rating, *results[1:])
@@ -0,0 +1,75 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+
+
+class InferenceExecutor:
+    '''
+    This runs the predict calls of the ensemble at the same time on a bounded thread pool.
+    The tree models release the GIL while predicting so the request takes about as long as the slowest model
+    instead of the sum of all of them. Models that do not answer within the timeout are reported instead of waited on.
+    '''
+
+    def __init__(self, max_workers=None, timeout=5.0):
+        '''
+        :param max_workers: The largest number of predict calls that run at once
+        :param timeout: The number of seconds a request waits for the models to answer
+        '''
+        self.max_workers = max_workers or min(8, os.cpu_count() or 1)
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._pool = None
+        self._pid = None
+
+    def configure(self, max_workers=None, timeout=None):
+        '''
+        This function will change the pool size and the timeout, the pool is rebuilt on the next run
+        :param max_workers: The largest number of predict calls that run at once
+        :param timeout: The number of seconds a request waits for the models to answer
+        '''
+        with self._lock:
+            if max_workers:
+                self.max_workers = max_workers
+            if timeout:
+                self.timeout = timeout
+            if self._pool is not None:
+                self._pool.shutdown(wait=False)
+                self._pool = None
+
+    def _get_pool(self):
+        '''
+        This function will return the thread pool, creating it on first use and again in a forked worker
+        :return: The thread pool
+        '''
+        with self._lock:
+            if self._pool is None or self._pid != os.getpid():
+                self._pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="inference")
+                self._pid = os.getpid()
+            return self._pool
+
+    def run(self, tasks, timeout=None):
+        '''
+        This function will run every task on the pool and wait for them up to the timeout
+        :param tasks: A list of (name, callable) tuples
+        :param timeout: The number of seconds to wait, the executor timeout is used if it is not given
+        :return: The (name, result) tuples of the tasks that finished in task order, and the names of the ones that timed out
+        '''
+        pool = self._get_pool()
+        futures = [(name, pool.submit(task)) for name, task in tasks]
+        done, _ = wait([future for _, future in futures], timeout=timeout or self.timeout)
+
+        results = []
+        timed_out = []
+        for name, future in futures:
+            if future in done:
+                results.append((name, future.result()))
+            else:
+                # A call that has not started yet is dropped, one that is running finishes in the background
+                future.cancel()
+                timed_out.append(name)
+
+        return results, timed_out
+
+
+# The executor shared by every request handled by this process
+inference_executor = InferenceExecutor()
@@ -1,66 +1,13 @@
-import os.path
-import pickle
-
-from flask import Blueprint, render_template, request, flash, redirect, url_for, current_app
-from src.admin.functions import process_dataset
-import pandas as pd
-from src.models import AIModels
+from flask import Blueprint, render_template, request, flash, redirect, url_for, current_app, Response, jsonify
+from src.registry import model_registry
+from src.rate.functions import *
+from src.rate.cache import prediction_cache
+from src.metrics import rate_stage_seconds
 
 # Blueprint for the rating page
 # This maps to the "/rate" URL prefix when registered in app.py
 rate_bp = Blueprint("rate", __name__, template_folder="templates")
 
-soilDrainageOptions = [
-    "Excessively drained",
-    "Somewhat excessively drained",
-    "Well drained",
-    "Moderately well drained",
-    "High",
-    "Somewhat poorly drained",
-    "Poorly drained",
-    "Very poorly drained",
-]
-
-culvertMaterialOptions = [
-    "Aluminum",
-    "Corrugated Steel",
-    "High Density Polyethylene",
-    "Poly Vinyl Chloride",
-    "Steel Plate",
-    "Steel plate",
-    "Reinforced Concrete",
-    "Unreinforced Concrete",
-]
-
-culvertShapeOptions = [
-    "Arch",
-    "Round",
-    "Ellipse/Squashed",
-    "Box",
-    "Other",
-]
-
-floodFrequencyOptions = [
-    "No",
-    "very rare",
-    "rare",
-    "Occasional",
-    "Frequent",
-]
-
-# Helper function that converts a numeric rating into a human-readable label
-def describe_condition(score: int) -> str:
-    if score >= 5:
-        return "The culvert is in excellent condition."
-    elif score == 4:
-        return "The culvert is in good condition with minor concerns."
-    elif score == 3:
-        return "The culvert is in fair condition and should be monitored."
-    elif score == 2:
-        return "The culvert is in poor condition and maintenance is recommended."
-    else:
-        return "The culvert is in critical condition and should be evaluated urgently."
-
 
 # Main route for rating a culvert
 # GET  → show the form
@@ -71,130 +18,68 @@ def index():
         # -------------------------------
         # 1. Collect all form inputs safely
         # -------------------------------
-        soil_ph = request.form.get("soil_ph")
-        soil_drainage = request.form.get("soil_drainage")
-        soil_moisture = request.form.get("soil_moisture")
-        soil_ec = request.form.get("soil_ec")
-        flood_frequency = request.form.get("flood_frequency")
-        culvert_material = request.form.get("culvert_material")
-        culvert_shape = request.form.get("culvert_shape")
-        culvert_length = request.form.get("culvert_length")
-        culvert_age = request.form.get("culvert_age")
-
-        # This checks to make sure that all fields are filled and valid
-        if not (soil_ph and
-                soil_drainage and
-                soil_moisture and
-                soil_ec and
-                flood_frequency and
-                culvert_material and
-                culvert_shape and
-                culvert_length and
-                culvert_age):
-            flash("Please fill in all required fields.", "danger")
+        with rate_stage_seconds.time("parse"):
+            record = {field: request.form.get(field) for field in rate_fields}
+
+            # This checks to make sure that all fields are filled and valid
+            if not all(record.values()):
+                flash("Please fill in all required fields.", "danger")
+                return redirect(url_for("rate.index"))
+
+            # Basic validation of numeric fields and option selections
+            try:
+                record = validate_record(record)
+            except ValueError as e:
+                flash(f"Invalid input: {e}", "danger")
+                return redirect(url_for("rate.index"))
+
+        # The models are loaded before anything is rated so an empty ensemble can be reported
+        with rate_stage_seconds.time("models"):
+            models = model_registry.get_models(current_app.instance_path + "/current")
+        if not models:
+            flash("No trained models are available right now.", "danger")
             return redirect(url_for("rate.index"))
 
-        # Basic validation of numeric fields and option selections
-        try:
-            soil_ph = float(soil_ph)
-            soil_moisture = float(soil_moisture)
-            soil_ec = float(soil_ec)
-            culvert_length = float(culvert_length)
-            culvert_age = int(culvert_age)
-
-            if soil_drainage not in soilDrainageOptions:
-                raise ValueError("Invalid soil drainage option.")
-            if flood_frequency not in floodFrequencyOptions:
-                raise ValueError("Invalid flood frequency option.")
-            if culvert_material not in culvertMaterialOptions:
-                raise ValueError("Invalid culvert material option.")
-            if culvert_shape not in culvertShapeOptions:
-                raise ValueError("Invalid culvert shape option.")
-        except ValueError as e:
-            flash(f"Invalid input: {e}", "danger")
-            return redirect(url_for("rate.index"))
+        # Repeated ratings are answered from the prediction cache, the explanations are cached with the predictions
+        with rate_stage_seconds.time("cache"):
+            cache_key = prediction_cache.key(record, models)
+            cached = prediction_cache.get(cache_key)
+        timed_out = []
+
+        # The models predict and explain at the same time and any that do not answer in time are left out of the average
+        if cached is None:
+            predictions, timed_out, explanations = predict_ensemble(models, record, explain=True)
+            if not predictions:
+                flash("None of the models answered in time, please try again.", "danger")
+                return redirect(url_for("rate.index"))
+
+            # Only a prediction from the whole ensemble is cached
+            if not timed_out:
+                prediction_cache.set(cache_key, (predictions, explanations))
+        else:
+            predictions, explanations = cached
 
         # Flash message (optional — useful during debugging)
         flash("Rating Submitted Properly", "success")
 
-        # Process the inputs into the necessary format for the ML model
-        df = pd.DataFrame([{
-            "Soil_pH": soil_ph,
-            "Soil_Moisture": soil_moisture,
-            "Soil_Elec_Conductivity": soil_ec,
-            "length": culvert_length,
-            "Age": culvert_age,
-        }])
-
-        # Map soil drainage to numerical values
-        match soil_drainage:
-            case 'Very poorly drained':
-                df['Soil_Drainage_Class'] = 0
-            case 'Poorly drained':
-                df['Soil_Drainage_Class'] = 1
-            case 'Somewhat poorly drained':
-                df['Soil_Drainage_Class'] = 2
-            case 'Moderately well drained':
-                df['Soil_Drainage_Class'] = 3
-            case 'Well drained':
-                df['Soil_Drainage_Class'] = 4
-            case 'High':
-                df['Soil_Drainage_Class'] = 5
-            case 'Somewhat excessively drained':
-                df['Soil_Drainage_Class'] = 6
-            case 'Excessively drained':
-                df['Soil_Drainage_Class'] = 7
-
-        # Map flood frequency tonumerical values
-        match flood_frequency:
-            case 'No':
-                df['Flooding_Frequency'] = 0
-            case 'very rare':
-                df['Flooding_Frequency'] = 1
-            case 'rare':
-                df['Flooding_Frequency'] = 2
-            case 'Occasional':
-                df['Flooding_Frequency'] = 3
-            case 'Frequent':
-                df['Flooding_Frequency'] = 4
-
-        # Create one-hot encodingfor culvert material
-        for material in culvertMaterialOptions:
-            col_name = f"mat_{material}"
-            df[col_name] = 1 if culvert_material == material else 0
-
-        # Create one-hot encoding for culvert shape
-        for shape in culvertShapeOptions:
-            col_name = f"type_{shape}"
-            df[col_name] = 1 if culvert_shape == shape else 0
-
-        # Order the columns alphabetically
-        columns = [col for col in df.columns ]
-        columns.sort()
-        df = df[columns]
-
+        # Lists every model in AIModels order with the fields that moved its rating the most, marking the ones that timed out
+        answered = dict(predictions)
         ml_list = []
-
-        # Puts all the variables into a dataframe with there column names
-        for model in AIModels.query.all():
-            model_path = current_app.instance_path + "/current" + model.file_path
-            if os.path.exists(model_path):
-                with open(model_path, "rb") as f:
-                    ml_model = pickle.load(f)
-                    prediction = ml_model.predict(df)
-                    if prediction[0] < 1:
-                        prediction[0] = 1
-                    ml_list.append([model.model_name, prediction[0]])
-
-
+        for model in models:
+            if model.model_name in answered:
+                explanation = explanations.get(model.model_name)
+                factors = top_factors(explanation[0]) if explanation is not None else None
+                ml_list.append([model.model_name, answered[model.model_name][0], factors])
+            else:
+                ml_list.append([model.model_name, "Timed out", None])
 
         # -------------------------------
         # 2. Calculate the overall rating by averaging all model predictions
         # -------------------------------
         overall_rating = 0
-        for ml in ml_list:
-            overall_rating += ml[1]
-        overall_rating = overall_rating / len(ml_list)
+        for model_name, prediction in predictions:
+            overall_rating += prediction[0]
+        overall_rating = overall_rating / len(predictions)
 
         # Convert the final score into a readable condition description
         condition_label = describe_condition(int(overall_rating))
@@ -202,30 +87,142 @@ def index():
         # -------------------------------
         # 3. Build a row list for the input table on export_rate.html
         # -------------------------------
-        input_rows = [
-            ("Soil pH", soil_ph),
-            ("Soil drainage class", soil_drainage),
-            ("Soil moisture (%)", soil_moisture),
-            ("Soil electrical conductivity", soil_ec),
-            ("Flood frequency", flood_frequency),
-            ("Culvert material", culvert_material),
-            ("Culvert shape", culvert_shape),
-            ("Culvert length (ft)", culvert_length),
-            ("Culvert age (years)", culvert_age),
-        ]
+        input_rows = [(field_labels[field], record[field]) for field in rate_fields]
 
         # -------------------------------
         # 4. Render the results page with all computed values
         # -------------------------------
-        return render_template(
-            "export_rate.html",
-            overall_rating=overall_rating,
-            ml_list=ml_list,
-            condition_label=condition_label,
-            input_rows=input_rows,
-        )
+        with rate_stage_seconds.time("render"):
+            return render_template(
+                "export_rate.html",
+                overall_rating=overall_rating,
+                ml_list=ml_list,
+                condition_label=condition_label,
+                input_rows=input_rows,
+            )
 
     # -------------------------------
     # GET request — simply show the rating form
     # -------------------------------
     return render_template("rate.html")
+
+
+# Route for rating a whole culvert inventory from a CSV upload
+# The CSV uses the same column names as the rate form fields and the ratings come back as a CSV download
+@rate_bp.route("/batch", methods=["POST"])
+def batch():
+    file = request.files.get("file")
+
+    if not file or not file.filename:
+        flash("Please choose a CSV file to rate.", "danger")
+        return redirect(url_for("rate.index"))
+
+    import pandas as pd
+
+    # Everything is read as text so the validation can report bad cells instead of failing the parse
+    try:
+        df = pd.read_csv(file, dtype=str, skipinitialspace=True)
+        records, errors = validate_frame(df)
+    except (ValueError, UnicodeDecodeError) as e:
+        flash(f"Invalid CSV: {e}", "danger")
+        return redirect(url_for("rate.index"))
+
+    models = model_registry.get_models(current_app.instance_path + "/current")
+    if not models:
+        flash("No trained models are available right now.", "danger")
+        return redirect(url_for("rate.index"))
+
+    # Only the valid rows are encoded and each model predicts all of them in one call
+    valid = (errors == "").to_numpy()
+    result = df.copy()
+
+    # The explanations add a column for every field of every model
+    explain = request.form.get("explain") == "on"
+
+    if valid.any():
+        predictions, overall_rating, timed_out, *explained = rate_records(models, records[valid], explain=explain)
+
+        if not predictions:
+            flash("None of the models answered in time, please try again.", "danger")
+            return redirect(url_for("rate.index"))
+
+        for model_name, prediction in predictions:
+            result.loc[valid, model_name] = prediction
+
+        for model_name, explanation in (explained[0].items() if explain else []):
+            if explanation is not None:
+                for i, field in enumerate(explained_fields + ["base"]):
+                    result.loc[valid, f"{model_name} {field}"] = explanation[:, i]
+
+        result.loc[valid, "overall_rating"] = overall_rating
+        # The rows that failed validation are left blank rather than getting NaN
+        result["condition"] = ""
+        result.loc[valid, "condition"] = [describe_condition(int(score)) for score in overall_rating]
+        result.loc[valid, "timed_out"] = ";".join(timed_out)
+
+    result["error"] = errors
+
+    return Response(
+        result.to_csv(index=False),
+        mimetype="text/csv",
+        headers={"Content-Disposition": "attachment; filename=culvert_ratings.csv"},
+    )
+
+
+# JSON route for programmatic clients
+# The body is one record or a list of records using the rate form field names
+@rate_bp.route("/api/predict", methods=["POST"])
+def api_predict():
+    body = request.get_json(silent=True)
+
+    single = isinstance(body, dict)
+    items = [body] if single else body
+
+    if not isinstance(items, list) or not items or not all(isinstance(item, dict) for item in items):
+        return jsonify({"error": "The body must be a JSON object or a non-empty array of objects."}), 400
+
+    import pandas as pd
+
+    try:
+        records, errors = validate_frame(pd.DataFrame.from_records(items))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    if single and errors[0]:
+        return jsonify({"error": errors[0]}), 400
+
+    models = model_registry.get_models(current_app.instance_path + "/current")
+    if not models:
+        return jsonify({"error": "No trained models are available right now."}), 503
+
+    # Every invalid record keeps its error and the valid ones are rated together
+    results = [{"error": error} for error in errors]
+    valid = (errors == "").to_numpy()
+
+    # ?explain=true adds how much each field moved the prediction of every model
+    explain = request.args.get("explain", "").lower() in ("1", "true")
+
+    if valid.any():
+        predictions, overall_rating, timed_out, *explained = rate_records(models, records[valid], explain=explain)
+
+        if not predictions:
+            return jsonify({"error": "None of the models answered in time.", "timed_out": timed_out}), 504
+
+        for row, position in enumerate(valid.nonzero()[0]):
+            results[position] = {
+                "predictions": {model_name: prediction[row].item() for model_name, prediction in predictions},
+                "overall_rating": overall_rating[row].item(),
+                "condition": describe_condition(int(overall_rating[row])),
+                "timed_out": timed_out,
+            }
+            if explain:
+                results[position]["explanations"] = {
+                    model_name: None if explanation is None
+                    else dict(zip(explained_fields + ["base"], explanation[row].tolist()))
+                    for model_name, explanation in explained[0].items()
+                }
+
+    if single:
+        return jsonify(results[0])
+
+    return jsonify({"results": results})
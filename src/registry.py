@@ -0,0 +1,309 @@
+import logging
+import os
+import threading
+import time
+from collections import namedtuple
+
+from src.encoder import FeatureEncoder, encoder_path
+from src.metrics import registry_query_seconds, model_load_seconds
+from src.rate.compiled import compile_model
+from src.storage import PickleFormat, find_model_file, load_model, model_file, native_format, save_model
+from src.versions import MANIFEST, read_manifest, write_manifest
+
+logger = logging.getLogger(__name__)
+
+# A model served by the registry along with the encoder it was trained with and the signature of its files
+LoadedModel = namedtuple("LoadedModel", ["model_name", "model", "encoder", "signature"], defaults=[None])
+
+# The loaded models of one version directory, key is (version directory, AIModels entries) and paths are the model files
+ModelSet = namedtuple("ModelSet", ["key", "models", "paths"])
+
+# A model as it is registered in AIModels, the format and the inference backend can be left off
+ModelEntry = namedtuple(
+    "ModelEntry", ["model_name", "file_path", "model_format", "inference_backend"], defaults=["pickle", "native"]
+)
+
+
+def _query_ai_models():
+    '''
+    This function will read the AIModels table into plain tuples so they can be cached outside of the db session
+    :return: A list of ModelEntry tuples in AIModels order
+    '''
+    from src.models import AIModels
+
+    return [
+        ModelEntry(model.model_name, model.file_path, model.model_format, model.inference_backend)
+        for model in AIModels.query.all()
+    ]
+
+
+def _update_ai_model(model_name, file_path, model_format):
+    '''
+    This function will record the new file and format of a model that was migrated out of pickle
+    '''
+    from src.app import db
+    from src.models import AIModels
+
+    model = db.session.get(AIModels, model_name)
+    if model is not None:
+        model.file_path = file_path
+        model.model_format = model_format
+        db.session.commit()
+
+
+class ModelRegistry:
+    '''
+    This is a process-wide cache of the trained models that are used by the rate pages.
+    Each model file is only read once and is kept in memory until the file on disk changes
+    (its inode, size or modification time) or the registry is invalidated.
+    Models that are still pickled are served as they are, migrate writes them again in their native format when the
+    models are preloaded or promoted (never while a rating is being served).
+    Models registered with the "compiled" inference backend are served as a CompiledTrees built from the loaded model.
+    When the model directory is a version (a symlink to a directory with a manifest, see src/versions.py) the whole
+    ensemble is loaded side by side with the one being served and the requests switch to it in one reference swap.
+    The previous ensemble is kept as well so rolling back to it does not load anything.
+    '''
+
+    def __init__(self, entries_loader=_query_ai_models, metadata_ttl=60, migrator=_update_ai_model):
+        '''
+        :param entries_loader: A callable returning the ModelEntry (or plain) tuples of the models to serve
+        :param metadata_ttl: The number of seconds the AIModels metadata is trusted before it is read again
+        :param migrator: A callable given (model_name, file_path, model_format) when a pickled model was migrated,
+                         None turns the migration off
+        '''
+        self._entries_loader = entries_loader
+        self._metadata_ttl = metadata_ttl
+        self._migrator = migrator
+        self._lock = threading.RLock()
+        self._entries = None
+        self._entries_loaded_at = 0.0
+        self._models = {}  # full path -> (file signatures, model, encoder)
+        self._compiled = {}  # full path -> (file signatures, compiled model or None if it cannot be compiled)
+        self._active = None  # the ModelSet being served
+        self._standby = None  # the ModelSet served before it
+        self._build_lock = threading.Lock()
+        self.version = 0
+
+    def invalidate(self):
+        '''
+        This function will drop every cached model and the cached metadata, it should be called whenever the
+        models in instance/current or the AIModels table change
+        '''
+        with self._lock:
+            self._entries = None
+            self._models.clear()
+            self._compiled.clear()
+            self._active = self._standby = None
+            self.version += 1
+
+    def entries(self):
+        '''
+        This function will return the cached AIModels metadata, reloading it when it is missing or too old
+        :return: A list of ModelEntry tuples
+        '''
+        with self._lock:
+            expired = time.monotonic() - self._entries_loaded_at > self._metadata_ttl
+            if self._entries is None or expired:
+                with registry_query_seconds.time():
+                    self._entries = [ModelEntry(*entry) for entry in self._entries_loader()]
+                self._entries_loaded_at = time.monotonic()
+            return self._entries
+
+    def get_models(self, model_dir):
+        '''
+        This function will return every registered model that exists in the model directory
+        :param model_dir: The directory the model file paths are relative to (normally instance/current)
+        :return: A list of LoadedModel tuples in AIModels order
+        '''
+        version_path = os.path.realpath(model_dir)
+        entries = tuple(self.entries())
+        key = (version_path, entries)
+
+        model_set = self._find_set(key)
+        if model_set is not None:
+            return list(model_set.models)
+
+        # A plain directory is read file by file, each file is reloaded when it changes
+        if not os.path.exists(os.path.join(version_path, MANIFEST)):
+            return self._load_models(model_dir, entries)[0]
+
+        # The new version is loaded by one request while the others keep being answered by the active ensemble
+        active = self._active
+        if not self._build_lock.acquire(blocking=active is None):
+            return list(active.models)
+        try:
+            model_set = self._find_set(key)
+            if model_set is None:
+                model_set = ModelSet(key, *map(tuple, self._load_models(version_path, entries)))
+                with self._lock:
+                    self._standby, self._active = self._active, model_set
+                    self._drop_unused()
+        finally:
+            self._build_lock.release()
+        return list(model_set.models)
+
+    def _find_set(self, key):
+        '''
+        This function will return the loaded ensemble of a version, switching back to the standby one if it matches
+        '''
+        active, standby = self._active, self._standby
+        if active is not None and active.key == key:
+            return active
+        if standby is not None and standby.key == key:
+            with self._lock:
+                if self._standby is standby:
+                    self._standby, self._active = self._active, standby
+            return standby
+        return None
+
+    def _drop_unused(self):
+        '''
+        This function will forget the cached models that are in neither the active nor the standby ensemble
+        '''
+        keep = set()
+        for model_set in (self._active, self._standby):
+            if model_set is not None:
+                keep.update(model_set.paths)
+        for cache in (self._models, self._compiled):
+            for path in [path for path in cache if path not in keep]:
+                del cache[path]
+
+    def _load_models(self, model_dir, entries):
+        '''
+        This function will load every registered model that exists in the model directory
+        :return: The list of LoadedModel tuples and the list of the model files they were loaded from
+        '''
+        loaded = []
+        paths = []
+        for model_name, file_path, model_format, inference_backend in entries:
+            found = find_model_file(model_dir + file_path, model_format or PickleFormat.name)
+            if found is None:
+                continue
+
+            cached = self._load(*found)
+            if cached is None:
+                continue
+
+            model, encoder, signature = cached
+            if inference_backend == "compiled":
+                model = self._compile(found[0], signature, model)
+            loaded.append(LoadedModel(model_name, model, encoder, signature))
+            paths.append(found[0])
+        return loaded, paths
+
+    def _compile(self, full_path, signature, model):
+        '''
+        This function will return the compiled version of a model, the model itself is returned if it cannot be compiled
+        '''
+        with self._lock:
+            cached = self._compiled.get(full_path)
+            if cached is None or cached[0] != signature:
+                try:
+                    compiled = compile_model(model)
+                except ValueError as e:
+                    logger.error("Serving model %s without compiling it: %s", full_path, e)
+                    compiled = None
+                cached = self._compiled[full_path] = (signature, compiled)
+            return model if cached[1] is None else cached[1]
+
+    def _load(self, full_path, model_format):
+        '''
+        This function will return the model stored at full_path and its encoder, only reading them when a file has changed
+        :param full_path: The full path to the model file
+        :param model_format: The format the model file is stored in
+        :return: A (model, encoder, signature) tuple or None if the model does not exist or cannot be used
+        '''
+        signature = (_signature(full_path), _signature(encoder_path(full_path)))
+
+        with self._lock:
+            if signature[0] is None:
+                self._models.pop(full_path, None)
+                return None
+
+            cached = self._models.get(full_path)
+            if cached is not None and cached[0] == signature:
+                return cached[1], cached[2], signature
+
+            with model_load_seconds.time(model_format):
+                model = load_model(full_path, model_format)
+
+            # Models saved with the threads they were trained with would start a thread pool for every prediction
+            if "n_jobs" in getattr(model, "get_params", dict)():
+                model.set_params(n_jobs=None)
+
+            # Models saved before encoders were stored next to them still know their feature names
+            try:
+                if signature[1] is not None:
+                    encoder = FeatureEncoder.load(encoder_path(full_path))
+                else:
+                    encoder = FeatureEncoder.from_model(model)
+            except ValueError as e:
+                logger.error("Skipping model %s: %s", full_path, e)
+                return None
+
+            self._models[full_path] = (signature, model, encoder)
+            return model, encoder, signature
+
+    def migrate(self, model_dir) -> int:
+        '''
+        This function will write the pickled models of a model directory again in their native format and record the
+        new files in AIModels, the pickles are left in place for workers that have not noticed. When the directory is
+        a version its manifest is written again so it lists the new files. It must only run where nothing else writes
+        the directory at the same time: while the models are preloaded or right after they were promoted.
+        :param model_dir: The directory the model file paths are relative to (normally instance/current)
+        :return: The number of models that were migrated
+        '''
+        if self._migrator is None:
+            return 0
+
+        version_path = os.path.realpath(model_dir)
+        migrated = 0
+        for model_name, file_path, model_format, _ in self.entries():
+            found = find_model_file(version_path + file_path, model_format or PickleFormat.name)
+            if found is None or found[1] != PickleFormat.name:
+                continue
+
+            full_path = found[0]
+            try:
+                model = load_model(full_path, PickleFormat.name)
+                new_format = native_format(model)
+                if new_format == PickleFormat.name:
+                    continue
+                new_path = model_file(full_path, new_format)
+                save_model(model, new_path, new_format)
+
+                # The encoder file is shared by every format of the model
+                if not os.path.exists(encoder_path(new_path)):
+                    FeatureEncoder.from_model(model).save(encoder_path(new_path))
+                self._migrator(model_name, new_path[len(version_path):], new_format)
+            except Exception as e:
+                logger.error("Could not migrate model %s: %s", full_path, e)
+                continue
+
+            logger.info("Migrated model %s to %s", full_path, new_format)
+            migrated += 1
+
+        if migrated:
+            manifest = read_manifest(version_path)
+            if manifest is not None:
+                write_manifest(version_path, manifest["version"], manifest["created"])
+            with self._lock:
+                self._entries = None
+        return migrated
+
+
+def _signature(path):
+    '''
+    This function will return what identifies the current version of a file on disk
+    :param path: The path of the file
+    :return: An (inode, size, mtime) tuple or None if the file does not exist
+    '''
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return stat.st_ino, stat.st_size, stat.st_mtime_ns
+
+
+# The registry shared by every request handled by this process
+model_registry = ModelRegistry()
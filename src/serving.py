@@ -0,0 +1,58 @@
+import gc
+import os
+import signal
+
+from flask import current_app
+
+
+def preload_models(app) -> int:
+    '''
+    This function will load the models in instance/current before the server forks its workers.
+    The workers start with the models already in memory and share their pages with the parent until something
+    writes to them, so each extra worker costs little memory and answers its first rating without loading anything.
+    :param app: The flask app
+    :return: The number of models that were loaded
+    '''
+    from src.app import db
+    from src.registry import model_registry
+
+    # The objects frozen by an earlier preload are handed back to the garbage collector so the old models can go
+    gc.unfreeze()
+    model_registry.invalidate()
+
+    with app.app_context():
+        # Nothing is serving the models yet so the pickled ones can be written again in their native format
+        model_registry.migrate(app.instance_path + "/current")
+        models = model_registry.get_models(app.instance_path + "/current")
+
+        # A database connection must not be shared by the forked workers, each one opens its own
+        db.engine.dispose()
+
+    # The collector would otherwise touch every preloaded object in each worker and copy the pages they are on
+    gc.collect()
+    gc.freeze()
+
+    return len(models)
+
+
+def request_reload() -> bool:
+    '''
+    This function will ask the server to replace its workers after the models were promoted (see gunicorn.conf.py).
+    The new workers are forked from a parent that has loaded the new models and the old ones finish the requests
+    they are handling before they exit, so no request is dropped.
+    The training jobs run in the workers so while one is running the reload is sent by the last job to end.
+    :return: True if a reload was requested, False when the app is not run by the production server
+    '''
+    from src.admin.jobs import job_runner
+
+    server_pid = current_app.config.get("SERVER_PID")
+    if not server_pid:
+        return False
+
+    if job_runner.defer_reload(server_pid):
+        current_app.logger.info("The reload of the server (pid %s) waits for the running training jobs", server_pid)
+        return True
+
+    os.kill(server_pid, signal.SIGHUP)
+    current_app.logger.info("Asked the server (pid %s) to reload the models", server_pid)
+    return True
@@ -0,0 +1,166 @@
+import os
+import pickle
+import tempfile
+
+
+class ModelFormat:
+    '''
+    This is how a trained model is written to and read from disk. The name of the format is stored in
+    AIModels.model_format and its suffix is the extension of the model file.
+    '''
+    name = None
+    suffix = None
+
+    def handles(self, model) -> bool:
+        '''
+        This function will return whether the format can store a model natively
+        :param model: The trained model
+        '''
+        return False
+
+    def save(self, model, path):
+        raise NotImplementedError
+
+    def load(self, path):
+        raise NotImplementedError
+
+
+class PickleFormat(ModelFormat):
+    '''
+    This stores any model with pickle, it is what every model was saved with before the native formats
+    '''
+    name = "pickle"
+    suffix = ".pkl"
+
+    def handles(self, model) -> bool:
+        return True
+
+    def save(self, model, path):
+        with open(path, "wb") as f:
+            pickle.dump(model, f)
+
+    def load(self, path):
+        with open(path, "rb") as f:
+            return pickle.load(f)
+
+
+class XGBoostFormat(ModelFormat):
+    '''
+    This stores XGBoost models in XGBoost's own UBJSON format, which is smaller and faster to load than a pickle
+    and does not depend on the version of the python classes
+    '''
+    name = "xgboost-ubj"
+    suffix = ".ubj"
+
+    def handles(self, model) -> bool:
+        return type(model).__module__.startswith("xgboost") and hasattr(model, "save_model")
+
+    def save(self, model, path):
+        model.save_model(path)
+
+    def load(self, path):
+        from xgboost import XGBClassifier
+
+        model = XGBClassifier()
+        model.load_model(path)
+        return model
+
+
+class JoblibFormat(ModelFormat):
+    '''
+    This stores scikit-learn models with joblib, which writes the tree arrays as raw numpy data that are memory mapped
+    when the model is loaded instead of being unpickled from a byte string
+    '''
+    name = "joblib-mmap"
+    suffix = ".joblib"
+
+    def handles(self, model) -> bool:
+        return type(model).__module__.startswith("sklearn")
+
+    def save(self, model, path):
+        import joblib
+
+        joblib.dump(model, path)
+
+    def load(self, path):
+        import joblib
+
+        return joblib.load(path, mmap_mode="r")
+
+
+# Every format a model can be stored in, the native formats are tried before pickle
+formats = {model_format.name: model_format for model_format in (XGBoostFormat(), JoblibFormat(), PickleFormat())}
+
+# The format a newly registered model is stored in, models that are not listed are pickled
+default_formats = {
+    "Random Forest": JoblibFormat.name,
+    "XGBoost": XGBoostFormat.name,
+}
+
+
+def native_format(model) -> str:
+    '''
+    This function will return the best format to store a model in
+    :param model: The trained model
+    :return: The name of the format
+    '''
+    for model_format in formats.values():
+        if model_format.handles(model):
+            return model_format.name
+
+
+def model_file(file_path, model_format) -> str:
+    '''
+    This function will return the path a model is stored at in a format
+    :param file_path: The path of the model file in any format (the extension is replaced)
+    :param model_format: The name of the format
+    :return: The path with the extension of the format
+    '''
+    return os.path.splitext(file_path)[0] + formats[model_format].suffix
+
+
+def save_model(model, path, model_format):
+    '''
+    This function will write a model in a format, the file is only replaced once it is completely written
+    :param model: The trained model
+    :param path: The path of the model file, it should have the extension of the format (see model_file)
+    :param model_format: The name of the format
+    '''
+    # The temporary file keeps the extension because XGBoost picks its format from it, its name is unique so two
+    # processes saving the same model never write into each other's file
+    stem, suffix = os.path.splitext(path)
+    fd, temp_path = tempfile.mkstemp(suffix=".tmp" + suffix, prefix=os.path.basename(stem) + ".",
+                                     dir=os.path.dirname(path) or None)
+    os.close(fd)
+    try:
+        formats[model_format].save(model, temp_path)
+        os.replace(temp_path, path)
+    except BaseException:
+        os.remove(temp_path)
+        raise
+
+
+def load_model(path, model_format):
+    '''
+    This function will read a model written by save_model
+    :param path: The path of the model file
+    :param model_format: The name of the format
+    :return: The model
+    '''
+    return formats[model_format].load(path)
+
+
+def find_model_file(path, model_format):
+    '''
+    This function will find the file of a model, falling back to the other formats of the same model when the
+    recorded one is missing (e.g. a model trained while its file was being migrated)
+    :param path: The full path of the model file from AIModels
+    :param model_format: The format recorded in AIModels
+    :return: A (path, format) tuple or None if there is no file for the model
+    '''
+    candidates = [model_format] + [name for name in formats if name != model_format]
+    for name in candidates:
+        candidate = model_file(path, name)
+        if os.path.exists(candidate):
+            return candidate, name
+    return None
@@ -0,0 +1,76 @@
+import pytest
+
+@pytest.fixture
+def admin_app(tmp_path):
+    from src.app import create_app, db
+    from src.models import Admin
+
+    app = create_app(config={"SQLALCHEMY_DATABASE_URI": f"sqlite:///{tmp_path}/admin.db", "TESTING": True},
+                     instance_path=str(tmp_path))
+    with app.app_context():
+        db.create_all()
+        db.session.add(Admin("admin@example.com"))
+        db.session.commit()
+    yield app
+
+def test_admin_cache_hits_after_first_check(admin_app):
+    """Only the first check of an admin should read the table, someone who is not an admin is never cached."""
+    from src.admin.auth import AdminCache
+
+    cache = AdminCache(ttl=30)
+    with admin_app.app_context():
+        assert cache.is_admin("admin@example.com") is True
+        assert cache.is_admin("admin@example.com") is True
+        assert cache.is_admin("someone@example.com") is False
+        assert cache.is_admin("someone@example.com") is False
+
+    assert cache.stats() == {"hits": 1, "misses": 3, "size": 1}
+
+def test_admin_cache_invalidated_when_admins_change(admin_app):
+    """Adding or removing an admin should take effect on the next check."""
+    from src.app import db
+    from src.admin.auth import admin_cache
+    from src.models import Admin
+
+    with admin_app.app_context():
+        assert admin_cache.is_admin("new@example.com") is False
+        db.session.add(Admin("new@example.com"))
+        db.session.commit()
+        assert admin_cache.is_admin("new@example.com") is True
+
+        Admin.query.filter_by(email="new@example.com").delete()
+        db.session.commit()
+        assert admin_cache.is_admin("new@example.com") is False
+
+def test_job_polling_only_checks_the_table_once(admin_app):
+    """Polling a job should be answered from the admin cache after the first request."""
+    from src.admin.auth import admin_cache
+
+    client = admin_app.test_client()
+    with client.session_transaction() as sess:
+        sess["username"] = "admin@example.com"
+
+    misses = admin_cache.stats()["misses"]
+    for _ in range(5):
+        response = client.get("/admin/jobs/missing")
+        assert response.status_code == 404
+
+    assert admin_cache.stats()["misses"] == misses + 1
+
+def test_admin_cache_is_cleared_on_commit(admin_app):
+    """A removed admin should stay cached until the removal is committed and never after it."""
+    from src.app import db
+    from src.admin.auth import admin_cache
+    from src.models import Admin
+
+    with admin_app.app_context():
+        admin_cache.invalidate()
+        assert admin_cache.is_admin("admin@example.com") is True
+
+        db.session.delete(db.session.get(Admin, "admin@example.com"))
+        db.session.flush()
+        assert admin_cache.stats()["size"] == 1
+
+        db.session.commit()
+        assert admin_cache.stats()["size"] == 0
+        assert admin_cache.is_admin("admin@example.com") is False
@@ -0,0 +1,110 @@
+import os
+import time
+
+import pandas as pd
+
+DATA = {
+    'latitude': [34.05, 36.16, 25.16, 40.71, 34.05, 36.16, 25.16, 40.71],
+    'longitude': [-118.24, -115.15, -119.70, -74.00, -118.24, -115.15, -119.70, -74.00],
+    'length': [100, 150, 200, 250, 120, 130, 140, 160],
+    'cul_matl': ['Concrete', 'Steel', 'Wood', 'Concrete', 'UNKNOWN', 'Steel', 'Wood', 'Steel'],
+    'cul_type': ['Box', 'Pipe', 'Ellipse/Squashed', 'Box', 'Pipe', 'UNKNOWN', 'Box', 'Pipe'],
+    'Soil_Drainage_Class': ['Well drained', 'Poorly drained', 'Well drained', 'Well drained', 'Poorly drained', 'Well drained', 'Poorly drained', 'Well drained'],
+    'Soil_Moisture': [20.5, 30.2, 25.3, 22.1, 28.4, 21.0, None, 23.3],
+    'Soil_pH': [6.5, 7.0, 5.8, 6.9, 7.2, 6.1, 6.6, 6.4],
+    'Soil_Elec_Conductivity': [1.2, 0.8, 1.5, 1.1, 0.9, 1.0, 1.3, 1.4],
+    'Flooding_Frequency': ['No', 'rare', 'Frequent', 'No', 'rare', 'bad', 'No', 'rare'],
+    'State': ['CA', 'NV', 'CA', 'NY', 'NV', 'CA', 'CA', 'NV'],
+    'Soil_Surface_Texture': ['Loam', 'Clay', 'Sandy', 'Loam', 'Clay', 'Loam', 'Clay', 'Sandy'],
+    'Cul_rating': ['5', '3', '3', 'Unknown', '3', '3', '5', '3'],
+    'Age': [10, 20, 30, 15, 25, 35, 40, 22]
+}
+
+def test_process_dataset_file_matches_process_dataset(tmp_path):
+    """Processing the CSV in chunks should give the same dataset as process_dataset on the whole file."""
+    from src.admin.dataset import process_dataset_file, load_processed
+    from src.admin.functions import process_dataset
+
+    csv_path = tmp_path / "data.csv"
+    pd.DataFrame(DATA).to_csv(csv_path, index=False)
+    expected = process_dataset(pd.read_csv(csv_path)).reset_index(drop=True)
+
+    # Chunks of two rows so the vocabulary and the quartiles have to be gathered across chunks
+    rows = process_dataset_file(csv_path, tmp_path / "processed", chunksize=2)
+
+    assert rows == len(expected)
+    pd.testing.assert_frame_equal(load_processed(tmp_path / "processed"), expected)
+
+def test_processed_split_matches_the_dataframe_split(tmp_path):
+    """Gathering the split from the processed columns in chunks should give the split of the whole dataframe."""
+    import numpy as np
+    from sklearn.model_selection import train_test_split
+    from src.admin.dataset import process_dataset_file, load_processed
+    from src.admin.training import save_split, save_processed_split, load_split
+    from src.encoder import FeatureEncoder
+
+    csv_path = tmp_path / "data.csv"
+    pd.DataFrame({col: values * 10 for col, values in DATA.items()}).to_csv(csv_path, index=False)
+    process_dataset_file(csv_path, tmp_path / "processed")
+
+    processed = load_processed(tmp_path / "processed")
+    features = processed.drop(columns=['Cul_rating'])
+    encoder = FeatureEncoder.fit(features)
+    save_split(str(tmp_path / "expected"), encoder,
+               *train_test_split(features, processed['Cul_rating'], test_size=0.2, random_state=42))
+
+    # Chunks of three rows so the rows are gathered across chunks
+    save_processed_split(str(tmp_path / "split"), str(tmp_path / "processed"), chunksize=3)
+
+    expected, split = load_split(str(tmp_path / "expected")), load_split(str(tmp_path / "split"))
+    assert split[0].columns == expected[0].columns
+    for got, want in zip(split[1:], expected[1:]):
+        assert got.dtype == want.dtype
+        assert np.array_equal(got, want)
+
+def test_dataset_cache_evicts_least_recently_used(tmp_path):
+    """Once the cache is over its size the datasets used longest ago should be removed first."""
+    from src.admin.dataset_cache import DatasetCache
+
+    cache = DatasetCache(str(tmp_path / "cache"), max_bytes=2500)
+    for key in ["a", "b", "c"]:
+        os.makedirs(tmp_path / key)
+        (tmp_path / key / "X_train.npy").write_bytes(b"0" * 1000)
+        cache.put(key, str(tmp_path / key), {"rows": 1})
+        time.sleep(0.05)
+        if key == "b":
+            # Using "a" again makes "b" the oldest
+            assert cache.get("a") is not None
+            time.sleep(0.05)
+
+    assert cache.get("b") is None
+    assert cache.get("a")[1] == {"rows": 1}
+    assert cache.get("c") is not None
+
+def test_dataset_cache_keeps_entries_in_use(tmp_path):
+    """An entry a job holds a lease on should survive eviction until the job releases it."""
+    from src.admin.dataset_cache import DatasetCache
+
+    cache = DatasetCache(str(tmp_path / "cache"), max_bytes=2500)
+    os.makedirs(tmp_path / "a")
+    (tmp_path / "a" / "X_train.npy").write_bytes(b"0" * 1000)
+    cache.put("a", str(tmp_path / "a"), {"rows": 1}, user="job-1")
+    assert cache.get("a", user="job-2") is not None
+
+    for key in ["b", "c"]:
+        time.sleep(0.05)
+        os.makedirs(tmp_path / key)
+        (tmp_path / key / "X_train.npy").write_bytes(b"0" * 1000)
+        cache.put(key, str(tmp_path / key), {"rows": 1})
+
+    # "a" is the oldest but still in use so "b" goes instead
+    assert os.path.exists(tmp_path / "cache" / "a" / "X_train.npy")
+    assert cache.get("b") is None
+
+    cache.release("a", "job-1")
+    cache.release("a", "job-2")
+    os.makedirs(tmp_path / "d")
+    (tmp_path / "d" / "X_train.npy").write_bytes(b"0" * 1000)
+    cache.put("d", str(tmp_path / "d"), {"rows": 1})
+    assert cache.get("a") is None
+    assert sorted(os.listdir(tmp_path / "cache")) == ["c", "d"]
@@ -1,6 +1,6 @@
 import pandas as pd
 import os
-import time
+import shutil
 
 def test_process_dataset_function():
     from src.admin.functions import process_dataset
@@ -102,7 +102,11 @@ def test_train_model_function():
     # Make sure the model file got saved
     assert os.path.exists(db_path + "/tmp" + path), f"Model file was not saved at {db_path + path}"
 
+    # Make sure the encoder got saved next to the model
+    assert os.path.exists(db_path + "/tmp/test_model.encoder.json"), "Encoder file was not saved next to the model"
+
     os.remove(db_path + "/tmp" + path)
+    os.remove(db_path + "/tmp/test_model.encoder.json")
     os.rmdir(db_path + "/tmp")  # Clean up the created directory after test
 
 def test_train_model_invalid_name():
@@ -201,26 +205,45 @@ def test_save_models_function():
     assert os.path.exists(db_path + "/current" + path) == True
 
     train_model(model_name, path, db_path, X_train, X_test, y_train, y_test)
-    time.sleep(1)  # Ensure a time difference for file modification
     save_models(db_path)
     train_model(model_name, path, db_path, X_train, X_test, y_train, y_test)
-    time.sleep(1)
     save_models(db_path)
     train_model(model_name, path, db_path, X_train, X_test, y_train, y_test)
-    time.sleep(1)
     save_models(db_path)
 
+    # instance/current points at the newest of the retained versions
     assert os.path.exists(db_path + "/current" + path) == True
     assert os.path.exists(db_path + "/tmp" + path) == False
-    assert len(os.listdir(db_path)) <= 3
+    assert os.path.islink(db_path + "/current")
+    versions = sorted(os.listdir(db_path + "/versions"))
+    assert len(versions) == 3
+    assert os.readlink(db_path + "/current") == os.path.join("versions", versions[-1])
+    assert os.path.exists(db_path + "/versions/" + versions[-1] + "/manifest.json")
+
+    shutil.rmtree(db_path)  # Clean up the created files after test
+
+
+def test_preview_dataset_function():
+    import io
+    from src.admin.functions import preview_dataset
 
-    os.remove(db_path + "/current" + path)  # Clean up the created file after test
-    dir_list = os.listdir(db_path)
-    for file in dir_list:
-        if file != "current":
-            os.remove(db_path + "/" + file + path)
-            os.rmdir(os.path.join(db_path, file))
+    # A quoted field with a newline and a blank line should not change the number of rows
+    data = 'a,b,c\n1,"two\nlines",3\n\n4,5,6\n7,8,9\n10,11,12\n13,14,15\n16,17,18\n'
+    stream = io.BytesIO(data.encode())
 
-    os.rmdir("./src/tests/admin/instance/current")
-    os.rmdir("./src/tests/admin/instance")
+    preview, num_rows, columns = preview_dataset(stream, num_rows=3)
+
+    assert columns == ['a', 'b', 'c']
+    assert num_rows == len(pd.read_csv(io.StringIO(data)))
+    assert preview.equals(pd.read_csv(io.StringIO(data)).head(3))
+    assert not stream.closed
+
+def test_process_dataset_matches_legacy():
+    from src.admin.functions import process_dataset
+    from src.benchmarks.data import synthetic_inventory
+    from src.benchmarks.legacy import legacy_process_dataset
 
+    # The vectorized cleaning should give exactly the rows, columns and types the old loop did
+    for seed in range(3):
+        df = synthetic_inventory(5000, seed=seed)
+        pd.testing.assert_frame_equal(process_dataset(df), legacy_process_dataset(df))
@@ -0,0 +1,253 @@
+import os
+import time
+
+import pandas as pd
+
+DATA = {
+    'latitude': [34.05, 36.16, 25.16, 40.71, 34.05],
+    'longitude': [-118.24, -115.15, -119.70, -74.00, -118.24],
+    'length': [100, 150, 200, 250, 120],
+    'cul_matl': ['Concrete', 'Steel', 'Wood', 'Concrete', 'Steel'],
+    'cul_type': ['Box', 'Pipe', 'Circle', 'Box', 'Pipe'],
+    'Soil_Drainage_Class': ['Well drained', 'Poorly drained', 'Moderately well Drained', 'Well drained', 'Poorly drained'],
+    'Soil_Moisture': [20.5, 30.2, 25.3, 22.1, 28.4],
+    'Soil_pH': [6.5, 7.0, 5.8, 6.9, 7.2],
+    'Soil_Elec_Conductivity': [1.2, 0.8, 1.5, 1.1, 0.9],
+    'Flooding_Frequency': ['No', 'rare', 'Frequent', 'No', 'rare'],
+    'State': ['CA', 'NV', 'CA', 'NY', 'NV'],
+    'Soil_Surface_Texture': ['Loam', 'Clay', 'Sandy', 'Loam', 'Clay'],
+    'Cul_rating': ['5', '3', '3', '4', '2'],
+    'Age': [10, 20, 30, 15, 25]
+}
+
+def wait_for(runner, job_id, timeout=120):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        status = runner.status(job_id)
+        if status["status"] in ("finished", "failed", "cancelled"):
+            return status
+        time.sleep(0.2)
+    raise AssertionError("The job did not finish in time")
+
+def test_job_trains_and_stages_models(tmp_path):
+    """A job should train every model, report its accuracy and stage the models in tmp."""
+    from src.admin.jobs import JobRunner
+
+    runner = JobRunner(max_workers=1)
+    runner.jobs_dir = str(tmp_path / "jobs")
+
+    job_id = runner.create([("Random Forest", "/randomForest.pkl", "pickle"), ("Not a Model", "/notAModel.pkl", "pickle")])
+    pd.DataFrame(DATA).to_csv(runner.upload_path(job_id), index=False)
+    runner.start(job_id, str(tmp_path))
+    status = wait_for(runner, job_id)
+
+    assert status["status"] == "finished", status["error"]
+    assert status["models"][0]["status"] == "done"
+    assert 0.0 <= status["models"][0]["accuracy"] <= 1.0
+    assert status["models"][1]["status"] == "failed"
+    assert os.path.exists(tmp_path / "tmp" / "randomForest.pkl")
+    assert os.path.exists(tmp_path / "tmp" / "randomForest.encoder.json")
+
+    # Only the status is left in the job directory
+    assert os.listdir(runner.job_dir(job_id)) == ["status.json"]
+
+def test_cancelled_job_stages_nothing(tmp_path):
+    """A job cancelled before it runs should not leave any model behind."""
+    from src.admin.jobs import JobRunner
+
+    runner = JobRunner(max_workers=1)
+    runner.jobs_dir = str(tmp_path / "jobs")
+
+    job_id = runner.create([("Random Forest", "/randomForest.pkl", "pickle")])
+    pd.DataFrame(DATA).to_csv(runner.upload_path(job_id), index=False)
+    assert runner.cancel(job_id)
+    runner.start(job_id, str(tmp_path))
+    status = wait_for(runner, job_id)
+
+    assert status["status"] == "cancelled"
+    assert status["models"][0]["status"] == "cancelled"
+    assert not os.path.exists(tmp_path / "tmp")
+    assert not runner.cancel(job_id)
+
+def test_unknown_job_has_no_status(tmp_path):
+    """Ids that do not name a job, including path tricks, should have no status."""
+    from src.admin.jobs import JobRunner
+
+    runner = JobRunner()
+    runner.jobs_dir = str(tmp_path / "jobs")
+    assert runner.status("missing") is None
+    assert runner.status("..") is None
+
+def test_compare_job_reports_incremental_and_full_accuracy(tmp_path):
+    """A compare job should continue the current model and report the accuracy of a full retrain next to it."""
+    from src.admin.functions import save_models
+    from src.admin.jobs import JobRunner
+
+    runner = JobRunner(max_workers=1)
+    runner.jobs_dir = str(tmp_path / "jobs")
+
+    for mode in ["full", "compare"]:
+        job_id = runner.create([("Random Forest", "/randomForest.pkl", "pickle")], mode)
+        pd.DataFrame(DATA).to_csv(runner.upload_path(job_id), index=False)
+        runner.start(job_id, str(tmp_path))
+        status = wait_for(runner, job_id)
+        assert status["status"] == "finished", status["error"]
+        save_models(str(tmp_path))
+
+    model = status["models"][0]
+    assert status["mode"] == "compare"
+    assert model["mode"] == "incremental"
+    assert 0.0 <= model["full_accuracy"] <= 1.0
+    assert model["full_seconds"] > 0
+
+def test_same_upload_reuses_the_cached_split(tmp_path):
+    """A second job with the same file should train on the cached split without processing the file again."""
+    from src.admin.dataset_cache import DatasetCache
+    from src.admin.jobs import JobRunner
+
+    runner = JobRunner(max_workers=1)
+    runner.jobs_dir = str(tmp_path / "jobs")
+    runner.dataset_cache = DatasetCache(str(tmp_path / "dataset-cache"))
+
+    statuses = []
+    for _ in range(2):
+        job_id = runner.create([("Random Forest", "/randomForest.pkl", "pickle")])
+        pd.DataFrame(DATA).to_csv(runner.upload_path(job_id), index=False)
+        runner.start(job_id, str(tmp_path))
+        statuses.append(wait_for(runner, job_id))
+
+    assert [status["status"] for status in statuses] == ["finished", "finished"]
+    assert [status["cached"] for status in statuses] == [False, True]
+    assert statuses[0]["rows"] == statuses[1]["rows"]
+    assert statuses[0]["models"][0]["accuracy"] == statuses[1]["models"][0]["accuracy"]
+    assert len(os.listdir(tmp_path / "dataset-cache")) == 1
+
+SPACE = {"n_estimators": [5, 10], "max_depth": [None, 3]}
+
+def test_search_finds_and_promotes_the_best_configuration(tmp_path):
+    """A search should score its configurations in rungs and stage the best one in tmp when it is promoted."""
+    from src.admin.jobs import JobRunner
+
+    runner = JobRunner(max_workers=2)
+    runner.jobs_dir = str(tmp_path / "jobs")
+
+    job_id = runner.create_search(("Random Forest", "/randomForest.pkl", "pickle"), SPACE, num_configs=4, eta=2)
+    pd.DataFrame(DATA).to_csv(runner.upload_path(job_id), index=False)
+    runner.start(job_id, str(tmp_path))
+    status = wait_for(runner, job_id)
+
+    assert status["status"] == "finished", status["error"]
+    assert [len([trial for trial in status["trials"] if trial["rung"] == rung]) for rung in range(4)] == [4, 2, 1, 0]
+    assert status["best"]["params"] in status["search"]["configs"]
+    assert 0.0 <= status["best"]["accuracy"] <= 1.0
+    assert not os.path.exists(tmp_path / "tmp")
+
+    assert runner.promote_search(job_id, str(tmp_path))
+    assert os.path.exists(tmp_path / "tmp" / "randomForest.pkl")
+    assert not runner.promote_search(job_id, str(tmp_path))
+
+def test_resumed_search_keeps_its_finished_trials(tmp_path):
+    """Resuming a cancelled search should not run the trials it already finished again."""
+    from src.admin.jobs import JobRunner
+
+    runner = JobRunner(max_workers=2)
+    runner.jobs_dir = str(tmp_path / "jobs")
+
+    job_id = runner.create_search(("Random Forest", "/randomForest.pkl", "pickle"), SPACE, num_configs=4, eta=2)
+    pd.DataFrame(DATA).to_csv(runner.upload_path(job_id), index=False)
+    assert runner.cancel(job_id)
+    runner.start(job_id, str(tmp_path))
+    assert wait_for(runner, job_id)["status"] == "cancelled"
+    assert runner.interrupted(job_id)
+
+    # This stands in for a trial that finished before the search was cancelled
+    status = runner.status(job_id)
+    status["trials"].append({"config": 0, "rung": 0, "fraction": 1 / 9, "accuracy": 1.0, "seconds": -1.0})
+    runner._write_status(job_id, status)
+
+    assert runner.resume(job_id, str(tmp_path))
+    status = wait_for(runner, job_id)
+
+    assert status["status"] == "finished", status["error"]
+    first_rung = [trial for trial in status["trials"] if trial["rung"] == 0]
+    assert len(first_rung) == 4
+    assert [trial["seconds"] for trial in first_rung if trial["config"] == 0] == [-1.0]
+    assert not runner.resume(job_id, str(tmp_path))
+
+def test_promoted_search_keeps_the_other_models(tmp_path):
+    """Swapping in the best model of a search should keep every other model of the current version."""
+    import numpy as np
+    from src.admin.jobs import JobRunner
+    from src.admin.functions import train_model, save_models
+    from src.registry import ModelRegistry
+
+    rng = np.random.default_rng(0)
+    features = pd.DataFrame({"Age": rng.integers(0, 60, 100), "length": rng.uniform(10, 100, 100)})
+    labels = pd.Series((features["Age"] // 20).astype(int))
+    entries = [("Random Forest", "/rf.joblib", "joblib-mmap"), ("XGBoost", "/xgb.ubj", "xgboost-ubj")]
+    for name, path, model_format in entries:
+        train_model(name, path, str(tmp_path), features, features, labels, labels, model_format=model_format)
+    save_models(str(tmp_path))
+
+    runner = JobRunner(max_workers=2)
+    runner.jobs_dir = str(tmp_path / "jobs")
+    job_id = runner.create_search(entries[0], SPACE, num_configs=2, eta=2)
+    pd.DataFrame(DATA).to_csv(runner.upload_path(job_id), index=False)
+    runner.start(job_id, str(tmp_path))
+    assert wait_for(runner, job_id)["status"] == "finished"
+    assert runner.promote_search(job_id, str(tmp_path))
+    assert sorted(os.listdir(tmp_path / "tmp")) == ["rf.encoder.json", "rf.joblib"]
+    save_models(str(tmp_path))
+
+    registry = ModelRegistry(entries_loader=lambda: entries, migrator=None)
+    loaded = registry.get_models(str(tmp_path / "current"))
+    assert [model.model_name for model in loaded] == ["Random Forest", "XGBoost"]
+
+def test_training_job_of_a_stopped_server_fails(tmp_path):
+    """A training job whose status stopped being written should be marked failed instead of running forever."""
+    from src.admin.jobs import JobRunner, STALE_SECONDS
+
+    runner = JobRunner(max_workers=1)
+    runner.jobs_dir = str(tmp_path / "jobs")
+
+    job_id = runner.create([("Random Forest", "/randomForest.pkl", "pickle")])
+    status = runner.status(job_id)
+    status["status"] = "training"
+    status["models"][0]["status"] = "training"
+    runner._write_status(job_id, status)
+    assert runner.active_jobs() == [job_id]
+
+    stale = time.time() - STALE_SECONDS - 1
+    os.utime(os.path.join(runner.job_dir(job_id), "status.json"), (stale, stale))
+
+    status = runner.status(job_id)
+    assert status["status"] == "failed" and status["models"][0]["status"] == "failed"
+    assert runner.active_jobs() == []
+    assert not runner.cancel(job_id)
+
+def test_reload_waits_for_running_jobs(tmp_path):
+    """A reload asked for while a job runs should only be sent once no job is running."""
+    import signal
+    from src.admin.jobs import JobRunner
+
+    runner = JobRunner(max_workers=1)
+    runner.jobs_dir = str(tmp_path / "jobs")
+    job_id = runner.create([("Random Forest", "/randomForest.pkl", "pickle")])
+
+    received = []
+    previous = signal.signal(signal.SIGHUP, lambda signum, frame: received.append(signum))
+    try:
+        assert runner.defer_reload(os.getpid())
+        runner._reload_if_pending()
+        assert received == []
+
+        status = runner.status(job_id)
+        status["status"] = "finished"
+        runner._write_status(job_id, status)
+        runner._reload_if_pending()
+        runner._reload_if_pending()
+    finally:
+        signal.signal(signal.SIGHUP, previous)
+
+    assert received == [signal.SIGHUP]
+    assert not runner.defer_reload(os.getpid())
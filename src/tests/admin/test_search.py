@@ -0,0 +1,38 @@
+import pytest
+
+def test_halving_rungs_cut_configurations_and_grow_data():
+    """Every rung should keep 1/eta of the configurations on eta times the data, ending on all of it."""
+    from src.admin.search import halving_rungs
+
+    assert halving_rungs(9) == [(9, 1 / 9), (3, 1 / 3), (1, 1.0)]
+    assert halving_rungs(10, eta=2, min_fraction=0.25) == [(10, 0.25), (5, 0.5), (3, 1.0)]
+
+def test_halving_rungs_end_at_one_configuration():
+    """The plan should stop at the first rung with one configuration instead of training it again on more data."""
+    from src.admin.search import halving_rungs
+
+    assert halving_rungs(4, eta=2) == [(4, 1 / 9), (2, 2 / 9), (1, 4 / 9)]
+    assert halving_rungs(3, eta=3) == [(3, 1 / 9), (1, 1 / 3)]
+    assert halving_rungs(2, eta=2, min_fraction=0.25) == [(2, 0.25), (1, 0.5)]
+    assert halving_rungs(1) == [(1, 1 / 9)]
+    assert halving_rungs(27) == [(27, 1 / 9), (9, 1 / 3), (3, 1.0)]
+
+def test_sample_configs_are_distinct_and_repeatable():
+    """The same seed should pick the same distinct configurations, never more than the grid holds."""
+    from src.admin.search import sample_configs
+
+    space = {"max_depth": [3, 6], "learning_rate": [0.1, 0.3]}
+    configs = sample_configs(space, 3)
+
+    assert configs == sample_configs(space, 3)
+    assert len({tuple(sorted(config.items())) for config in configs}) == 3
+    assert len(sample_configs(space, 10)) == 4
+
+def test_check_space_rejects_empty_values():
+    """A space must map every hyperparameter to a non-empty list."""
+    from src.admin.search import check_space
+
+    with pytest.raises(ValueError):
+        check_space({"max_depth": []})
+    with pytest.raises(ValueError):
+        check_space([1, 2])
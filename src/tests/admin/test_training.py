@@ -0,0 +1,73 @@
+import numpy as np
+import pandas as pd
+
+
+def test_split_round_trip_is_memory_mapped(tmp_path):
+    """A saved split should load back as read-only memory mapped arrays with the same values."""
+    from src.admin.training import save_split, load_split
+    from src.encoder import FeatureEncoder
+
+    features = pd.DataFrame({"Age": [10, 20, 30, 40], "length": [1.5, 2.5, 3.5, 4.5]})
+    labels = pd.Series([1, 2, 3, 4])
+    encoder = FeatureEncoder.fit(features)
+
+    save_split(str(tmp_path), encoder, features[:3], features[3:], labels[:3], labels[3:])
+    loaded, X_train, X_test, y_train, y_test = load_split(str(tmp_path))
+
+    assert loaded.columns == encoder.columns
+    assert isinstance(X_train, np.memmap) and not X_train.flags.writeable
+    assert X_train.dtype == np.float32 and y_train.dtype == np.int64
+    assert np.array_equal(X_test, encoder.transform_dataset(features[3:]))
+    assert list(y_train) == [1, 2, 3] and list(y_test) == [4]
+
+
+def test_plan_threads_divides_the_cores():
+    """The cores should be shared between the models that train at the same time."""
+    from src.admin.training import plan_threads
+
+    assert plan_threads(2, 2, cores=8) == (2, 4)
+    assert plan_threads(3, 2, cores=8) == (2, 4)
+    assert plan_threads(2, 4, cores=1) == (1, 1)
+    assert plan_threads(1, 4, cores=6) == (1, 6)
+
+
+def test_incremental_training_continues_current_models(tmp_path):
+    """Incremental training should add trees and boosting rounds to the models in instance/current."""
+    from src.admin.functions import train_model, save_models, load_current_model, can_continue, INCREMENTAL_ESTIMATORS
+    from src.storage import load_model
+
+    rng = np.random.default_rng(0)
+    features = pd.DataFrame({"Age": rng.integers(0, 60, 200), "length": rng.uniform(10, 100, 200)})
+    labels = pd.Series((features["Age"] // 20).astype(int))
+
+    for name, path, model_format in [("Random Forest", "/rf.joblib", "joblib-mmap"), ("XGBoost", "/xgb.ubj", "xgboost-ubj")]:
+        train_model(name, path, str(tmp_path), features, features, labels, labels, model_format=model_format)
+    save_models(str(tmp_path))
+
+    # New data without one of the classes cannot continue the models
+    assert not can_continue("XGBoost", load_current_model("/xgb.ubj", str(tmp_path), "xgboost-ubj")[0], labels[labels > 0])
+
+    for name, path, model_format in [("Random Forest", "/rf.joblib", "joblib-mmap"), ("XGBoost", "/xgb.ubj", "xgboost-ubj")]:
+        base = load_current_model(path, str(tmp_path), model_format)
+        assert can_continue(name, base[0], labels)
+        accuracy = train_model(name, path, str(tmp_path), features, features, labels, labels, model_format=model_format,
+                               base=base)
+        assert 0.0 <= accuracy <= 1.0
+
+    forest = load_model(str(tmp_path) + "/tmp/rf.joblib", "joblib-mmap")
+    booster = load_model(str(tmp_path) + "/tmp/xgb.ubj", "xgboost-ubj").get_booster()
+    assert len(forest.estimators_) == 100 + INCREMENTAL_ESTIMATORS
+    assert booster.num_boosted_rounds() == 100 + INCREMENTAL_ESTIMATORS
+
+
+def test_saved_models_do_not_keep_the_training_threads(tmp_path):
+    """The threads a model is trained with should not be saved, a served model predicts on the request's thread."""
+    from src.admin.functions import train_model
+    from src.storage import load_model
+
+    features = pd.DataFrame({"Age": [10, 20, 30, 40, 50, 60], "length": [1.5, 2.5, 3.5, 4.5, 5.5, 6.5]})
+    labels = pd.Series([0, 0, 1, 1, 2, 2])
+
+    for name, path, model_format in [("Random Forest", "/rf.joblib", "joblib-mmap"), ("XGBoost", "/xgb.ubj", "xgboost-ubj")]:
+        train_model(name, path, str(tmp_path), features, features, labels, labels, n_jobs=4, model_format=model_format)
+        assert load_model(str(tmp_path) + "/tmp" + path, model_format).get_params()["n_jobs"] is None
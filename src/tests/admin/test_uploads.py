@@ -0,0 +1,40 @@
+import io
+import os
+
+
+def test_big_upload_is_spooled_under_instance_and_linked(tmp_path):
+    """An upload bigger than the in-memory size should be spooled to instance/uploads and saved without a copy."""
+    from src.app import create_app
+    from src.uploads import SPOOL_MEMORY_SIZE, spooled_path, save_upload, read_header
+
+    app = create_app(instance_path=str(tmp_path))
+    body = b"Age,length\n" + b"10,1.5\n" * (SPOOL_MEMORY_SIZE // 7 + 1)
+
+    with app.test_request_context("/", method="POST", data={"file": (io.BytesIO(body), "data.csv", "text/csv")}):
+        from flask import request
+
+        file = request.files["file"]
+        path = spooled_path(file)
+        assert os.path.dirname(path) == str(tmp_path / "uploads")
+        assert read_header(file) == ["Age", "length"]
+
+        save_upload(file, str(tmp_path / "upload.csv"))
+        assert os.path.samefile(path, tmp_path / "upload.csv")
+
+    # The spooled file is gone once the request ends and the saved upload is whole
+    assert os.listdir(tmp_path / "uploads") == []
+    assert (tmp_path / "upload.csv").read_bytes() == body
+
+
+def test_upload_over_the_limit_is_rejected(tmp_path):
+    """A request bigger than MAX_CONTENT_LENGTH should be turned away before it is read."""
+    from src.app import create_app
+
+    app = create_app({"MAX_CONTENT_LENGTH": 1024}, instance_path=str(tmp_path))
+    client = app.test_client()
+
+    response = client.post("/rate/batch", data={"file": (io.BytesIO(b"x" * 2048), "data.csv", "text/csv")})
+
+    assert response.status_code == 302
+    with client.session_transaction() as session:
+        assert "uploads are limited to" in session["_flashes"][0][1]
@@ -0,0 +1,20 @@
+import os
+
+import pytest
+
+
+def test_create_app_does_not_import_heavy_modules():
+    """Creating the app and serving a core page should not import pandas, sklearn, xgboost or scipy."""
+    from src.benchmarks.startup import import_times, heavy_modules
+
+    times = import_times()
+    assert "src.app" in times
+    assert [name for name in heavy_modules if name in times] == []
+
+# Wall clock timings fail at random on a loaded machine, so this one only runs when DMS_TIMING_TESTS is set
+@pytest.mark.skipif(not os.environ.get("DMS_TIMING_TESTS"), reason="set DMS_TIMING_TESTS=1 to run the timing tests")
+def test_startup_is_within_budget():
+    """A new process should create the app and answer /info within the startup budget."""
+    from src.benchmarks.startup import startup_seconds, STARTUP_BUDGET
+
+    assert startup_seconds("/info") < STARTUP_BUDGET
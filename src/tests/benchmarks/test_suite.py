@@ -0,0 +1,31 @@
+def test_synthetic_inventory_has_every_column():
+    """The generated inventory should be accepted by the upload checks and survive process_dataset."""
+    from src.admin.functions import process_dataset
+    from src.admin.routes import correct_column_list
+    from src.benchmarks.data import synthetic_inventory
+
+    df = synthetic_inventory(2000)
+
+    assert sorted(df.columns) == sorted(correct_column_list)
+    assert len(df) == 2000
+    assert len(process_dataset(df)) > 0
+
+
+def test_rate_forms_are_valid():
+    """Every generated submission should pass the rate page validation."""
+    from src.benchmarks.data import rate_forms
+    from src.rate.functions import validate_record
+
+    for form in rate_forms(50):
+        validate_record(form)
+
+
+def test_compare_reports_regressions():
+    """Only benchmarks slower than the baseline by more than the threshold should be reported."""
+    from src.benchmarks.suite import compare
+
+    baseline = {"results": {"a": {"seconds": 1.0}, "b": {"seconds": 1.0}, "c": {"seconds": 1.0}}}
+    results = {"results": {"a": {"seconds": 1.1}, "b": {"seconds": 1.5}, "new": {"seconds": 9.0}}}
+
+    assert compare(results, baseline, threshold=0.25) == [("b", 1.0, 1.5)]
+    assert compare(results, baseline, threshold=0.05) == [("a", 1.0, 1.1), ("b", 1.0, 1.5)]
@@ -0,0 +1,72 @@
+import os
+
+
+def _static_dir(tmp_path):
+    from PIL import Image
+
+    static_dir = tmp_path / "static"
+    os.makedirs(static_dir / "img")
+    os.makedirs(static_dir / "css")
+    (static_dir / "css" / "styles.css").write_text("body { color: black; }")
+    Image.new("RGB", (1000, 500), (30, 120, 200)).save(static_dir / "img" / "photo.jpg")
+    Image.new("RGBA", (100, 100), (0, 0, 0, 0)).save(static_dir / "img" / "logo.png")
+    return static_dir
+
+
+def test_build_assets_writes_fingerprinted_variants(tmp_path):
+    """Every image should be resized (never enlarged) into AVIF, WebP and its own format under hashed names."""
+    from src.assets import build_assets, fingerprint, AssetManifest
+
+    static_dir = _static_dir(tmp_path)
+    manifest = build_assets(str(static_dir))
+
+    photo = manifest["img/photo.jpg"]
+    assert list(photo["sources"]) == ["image/avif", "image/webp", "image/jpeg"]
+    assert [w for _, w in photo["sources"]["image/webp"]] == [160, 400, 800, 1000]
+    assert (photo["width"], photo["height"]) == (1000, 500)
+    assert [w for _, w in manifest["img/logo.png"]["sources"]["image/png"]] == [100]
+
+    css = manifest["css/styles.css"]["url"]
+    assert css == f"dist/css/styles.{fingerprint(b'body { color: black; }')}.css"
+    assert (static_dir / css).read_text() == "body { color: black; }"
+
+    assets = AssetManifest()
+    assets.load(str(static_dir))
+    html = assets.picture("img/photo.jpg", "A photo", sizes="800px", **{"class": "hero-img"})
+    assert html.startswith('<picture><source type="image/avif"')
+    assert 'width="1000" height="500"' in html and 'class="hero-img"' in html
+    assert assets.url("img/photo.jpg", width=300, mimetype="image/webp").endswith(".webp")
+
+    # A file that changed since the build is served as it is until it is built again
+    (static_dir / "css" / "styles.css").write_text("body { color: red; }")
+    assets.load(str(static_dir))
+    assert assets.url("css/styles.css") == "/css/styles.css"
+
+
+def test_fingerprinted_files_are_cached_for_a_year(tmp_path):
+    """The built files should get far future cache headers while the originals keep being revalidated."""
+    from src.app import create_app
+    from src.assets import build_assets, asset_manifest
+
+    static_dir = _static_dir(tmp_path)
+    manifest = build_assets(str(static_dir))
+
+    app = create_app(instance_path=str(tmp_path / "instance"))
+    original = app.static_folder
+    app.static_folder = str(static_dir)
+    asset_manifest.load(str(static_dir))
+    try:
+        client = app.test_client()
+
+        response = client.get("/" + manifest["css/styles.css"]["url"])
+        assert response.status_code == 200
+        assert response.headers["Cache-Control"] == "public, max-age=31536000, immutable"
+        assert client.get("/" + manifest["css/styles.css"]["url"],
+                          headers={"If-None-Match": response.headers["ETag"]}).status_code == 304
+
+        assert "immutable" not in client.get("/css/styles.css").headers.get("Cache-Control", "")
+
+        page = client.get("/").get_data(as_text=True)
+        assert "/" + manifest["css/styles.css"]["url"] in page
+    finally:
+        asset_manifest.load(original)
@@ -0,0 +1,57 @@
+from src.registry import LoadedModel
+
+RECORD = {
+    "soil_ph": 6.5,
+    "soil_drainage": "Well drained",
+    "soil_moisture": 10.5,
+    "soil_ec": 1.2,
+    "flood_frequency": "rare",
+    "culvert_material": "Reinforced Concrete",
+    "culvert_shape": "Round",
+    "culvert_length": 10.0,
+    "culvert_age": 5,
+}
+
+MODELS = [LoadedModel("Random Forest", None, None, ((1, 2, 3), None))]
+
+def test_lru_cache_evicts_least_recently_used():
+    """The oldest unused entry should be evicted once the cache is full."""
+    from src.rate.cache import LRUCache
+
+    cache = LRUCache(threshold=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")  # "b" is now the least recently used
+    cache.set("c", 3)
+
+    assert cache.get("a") == 1
+    assert cache.get("b") is None
+    assert cache.get("c") == 3
+    assert cache.evictions == 1
+
+def test_prediction_cache_counts_hits_and_misses():
+    """A repeated record should be a hit even when its numbers are written differently."""
+    from src.rate.cache import PredictionCache
+
+    cache = PredictionCache()
+    key = cache.key(RECORD, MODELS)
+    assert cache.get(key) is None
+    cache.set(key, [("Random Forest", [4])])
+
+    same = dict(RECORD, soil_ph=6.50, culvert_length=10)
+    assert cache.get(cache.key(same, MODELS)) == [("Random Forest", [4])]
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["misses"] == 1
+
+def test_prediction_cache_key_changes_with_models():
+    """A swapped model file or a new model-set version should never reuse a cached prediction."""
+    from src.rate.cache import PredictionCache
+
+    cache = PredictionCache()
+    key = cache.key(RECORD, MODELS)
+
+    swapped = [LoadedModel("Random Forest", None, None, ((4, 5, 6), None))]
+    assert cache.key(RECORD, swapped) != key
+
+    cache.bump_version()
+    assert cache.key(RECORD, MODELS) != key
@@ -0,0 +1,112 @@
+import pickle
+
+import numpy as np
+import pytest
+
+
+def training_data():
+    rng = np.random.default_rng(0)
+    X = rng.random((400, 6)).astype(np.float32)
+    X[:, :2] = rng.integers(0, 2, (400, 2))
+    y = (X[:, 0] * 2 + X[:, 3] * 3).astype(int)
+    return X, y
+
+
+def test_compiled_forest_matches_sklearn():
+    """A compiled forest should give exactly the probabilities and predictions of the forest."""
+    from sklearn.ensemble import RandomForestClassifier
+    from src.rate.compiled import compile_model
+
+    X, y = training_data()
+    model = RandomForestClassifier(n_estimators=20, random_state=0).fit(X, y)
+    compiled = compile_model(model)
+
+    # The training rows sit exactly on the split thresholds
+    assert np.array_equal(compiled.predict_proba(X), model.predict_proba(X))
+    assert np.array_equal(compiled.predict(X), model.predict(X))
+
+
+@pytest.mark.parametrize("binary", [False, True])
+def test_compiled_xgboost_matches_xgboost(binary):
+    """A compiled booster should end in the same leaves and predict the same classes as XGBoost."""
+    from xgboost import DMatrix, XGBClassifier
+    from src.rate.compiled import compile_model
+
+    X, y = training_data()
+    if binary:
+        y = (y > 2).astype(int)
+    model = XGBClassifier(n_estimators=20, max_depth=4).fit(X, y)
+    compiled = compile_model(model)
+
+    leaves = model.get_booster().predict(DMatrix(X), pred_leaf=True).astype(int)
+    assert np.array_equal(compiled.apply(X) - compiled.roots, leaves)
+    assert np.array_equal(compiled.predict(X), model.predict(X))
+    assert np.allclose(compiled.predict_proba(X), model.predict_proba(X), rtol=0, atol=1e-6)
+
+
+def test_forest_contributions_add_up_to_probability():
+    """The contributions of a row should add up to the probability the forest gives its predicted class."""
+    from sklearn.ensemble import RandomForestClassifier
+    from src.rate.compiled import compile_model
+
+    X, y = training_data()
+    model = RandomForestClassifier(n_estimators=20, random_state=0).fit(X, y)
+    contributions = compile_model(model).contributions(X, model.predict(X))
+
+    assert contributions.shape == (len(X), X.shape[1] + 1)
+    assert np.allclose(contributions.sum(axis=1), model.predict_proba(X).max(axis=1))
+
+
+@pytest.mark.parametrize("binary", [False, True])
+def test_xgboost_contributions_match_approx_contribs(binary):
+    """A compiled booster should explain the predicted class the same way XGBoost's approx_contribs does."""
+    from xgboost import DMatrix, XGBClassifier
+    from src.rate.compiled import compile_model
+    from src.rate.explain import _contributions
+
+    X, y = training_data()
+    if binary:
+        y = (y > 2).astype(int)
+    model = XGBClassifier(n_estimators=20, max_depth=4).fit(X, y)
+
+    native = _contributions(model, X, None)
+    assert np.allclose(compile_model(model).contributions(X), native, rtol=0, atol=1e-5)
+
+    margin = model.get_booster().predict(DMatrix(X), output_margin=True)
+    if binary:
+        margin = np.where(model.predict(X) == 1, margin, -margin)
+    else:
+        margin = margin.max(axis=1)
+    assert np.allclose(native.sum(axis=1), margin, rtol=0, atol=1e-5)
+
+
+def test_compile_model_rejects_other_models():
+    """Models that are not tree ensembles cannot be compiled."""
+    from sklearn.linear_model import LogisticRegression
+    from src.rate.compiled import compile_model
+
+    X, y = training_data()
+    with pytest.raises(ValueError):
+        compile_model(LogisticRegression().fit(X, y))
+
+
+def test_registry_serves_compiled_models(tmp_path):
+    """A model registered with the compiled backend should be served as CompiledTrees."""
+    from sklearn.ensemble import RandomForestClassifier
+    from src.encoder import FeatureEncoder, encoder_path
+    from src.rate.compiled import CompiledTrees
+    from src.registry import ModelRegistry
+
+    X, y = training_data()
+    model = RandomForestClassifier(n_estimators=5, random_state=0).fit(X, y)
+    with open(tmp_path / "forest.pkl", "wb") as f:
+        pickle.dump(model, f)
+    FeatureEncoder([str(i) for i in range(6)]).save(encoder_path(str(tmp_path / "forest.pkl")))
+
+    entries = [("Forest", "/forest.pkl", "pickle", "compiled"), ("Native", "/forest.pkl", "pickle", "native")]
+    registry = ModelRegistry(entries_loader=lambda: entries, migrator=None)
+    compiled, native = registry.get_models(str(tmp_path))
+
+    assert isinstance(compiled.model, CompiledTrees)
+    assert not isinstance(native.model, CompiledTrees)
+    assert registry.get_models(str(tmp_path))[0].model is compiled.model
@@ -0,0 +1,86 @@
+import numpy as np
+import pandas as pd
+
+RECORD = {
+    "soil_ph": 6.5,
+    "soil_drainage": "Well drained",
+    "soil_moisture": 10.5,
+    "soil_ec": 1.2,
+    "flood_frequency": "rare",
+    "culvert_material": "Reinforced Concrete",
+    "culvert_shape": "Round",
+    "culvert_length": 10.0,
+    "culvert_age": 5,
+}
+
+def processed_features():
+    # Columns in the same order process_dataset produces them
+    return pd.DataFrame({
+        "Age": [10, 20],
+        "Flooding_Frequency": [0, 2],
+        "Soil_Drainage_Class": [4, 1],
+        "Soil_Elec_Conductivity": [1.2, 0.8],
+        "Soil_Moisture": [20.5, 30.2],
+        "Soil_pH": [6.5, 7.0],
+        "length": [100, 150],
+        "mat_Reinforced Concrete": [True, False],
+        "mat_Steel Plate": [False, True],
+        "type_Box": [False, True],
+        "type_Round": [True, False],
+    })
+
+def test_encoder_keeps_training_column_order():
+    """The encoder should produce the training columns in the training order."""
+    from src.encoder import FeatureEncoder
+
+    encoder = FeatureEncoder.fit(processed_features())
+    row = encoder.transform_record(RECORD)
+
+    assert row.dtype == np.float32
+    assert row.shape == (1, 11)
+    assert row[0].tolist() == [5, 2, 4, np.float32(1.2), 10.5, 6.5, 10, 1, 0, 0, 1]
+
+def test_encoder_batch_matches_record():
+    """Encoding a batch should give the same rows as encoding each record."""
+    from src.encoder import FeatureEncoder
+
+    encoder = FeatureEncoder.fit(processed_features())
+    other = dict(RECORD, culvert_material="Aluminum", culvert_shape="Box", flood_frequency="Frequent")
+    batch = encoder.transform(pd.DataFrame([RECORD, other]))
+
+    assert np.array_equal(batch[0], encoder.transform_record(RECORD)[0])
+    assert np.array_equal(batch[1], encoder.transform_record(other)[0])
+
+def test_encoder_unknown_category_is_all_zeros():
+    """A category the training data never had should not create a new column."""
+    from src.encoder import FeatureEncoder
+
+    encoder = FeatureEncoder.fit(processed_features())
+    row = encoder.transform_record(dict(RECORD, culvert_material="Aluminum"))
+
+    material_columns = [i for i, col in enumerate(encoder.columns) if col.startswith("mat_")]
+    assert row[0, material_columns].sum() == 0
+
+def test_encoder_transform_dataset_aligns_columns():
+    """Processed features with extra or missing dummies should line up with the encoder columns."""
+    from src.encoder import FeatureEncoder
+
+    encoder = FeatureEncoder.fit(processed_features())
+    shuffled = processed_features().drop(columns=["type_Box"])
+    shuffled["mat_Wood"] = True
+    shuffled = shuffled[sorted(shuffled.columns, reverse=True)]
+
+    matrix = encoder.transform_dataset(shuffled)
+    assert matrix.shape == (2, 11)
+    assert matrix[:, encoder.columns.index("type_Box")].tolist() == [0, 0]
+    assert matrix[:, encoder.columns.index("Age")].tolist() == [10, 20]
+
+def test_encoder_save_and_load(tmp_path):
+    """A saved encoder should load with the same columns."""
+    from src.encoder import FeatureEncoder, encoder_path
+
+    path = encoder_path(str(tmp_path / "randomForest.pkl"))
+    assert path.endswith("randomForest.encoder.json")
+
+    FeatureEncoder.fit(processed_features()).save(path)
+    assert FeatureEncoder.load(path).columns == list(processed_features().columns)
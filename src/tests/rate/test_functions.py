@@ -0,0 +1,93 @@
+import pandas as pd
+import pytest
+
+VALID_RECORD = {
+    "soil_ph": "6.5",
+    "soil_drainage": "Well drained",
+    "soil_moisture": "10.5",
+    "soil_ec": "1.2",
+    "flood_frequency": "rare",
+    "culvert_material": "Reinforced Concrete",
+    "culvert_shape": "Round",
+    "culvert_length": "10",
+    "culvert_age": "5",
+}
+
+def test_validate_record_converts_numbers():
+    """A valid record should come back with its numeric fields converted."""
+    from src.rate.functions import validate_record
+
+    record = validate_record(VALID_RECORD)
+    assert record["soil_ph"] == 6.5
+    assert record["culvert_age"] == 5
+    assert record["culvert_shape"] == "Round"
+
+    # A whole number written with a decimal point is a valid age, as it is in a batch
+    assert validate_record(dict(VALID_RECORD, culvert_age="5.0"))["culvert_age"] == 5
+
+@pytest.mark.parametrize("field, value", [("soil_ec", "abc"), ("culvert_shape", "Triangle"), ("culvert_age", ""),
+                                          ("soil_ph", "nan"), ("soil_ph", "inf"), ("culvert_length", "1e39"),
+                                          ("culvert_age", True)])
+def test_validate_record_rejects_bad_values(field, value):
+    """Bad numbers, unknown options and missing values should raise a ValueError."""
+    from src.rate.functions import validate_record
+
+    with pytest.raises(ValueError):
+        validate_record(dict(VALID_RECORD, **{field: value}))
+
+def test_validate_frame_marks_bad_rows():
+    """Only the invalid rows of a batch should get an error message."""
+    from src.rate.functions import validate_frame
+
+    df = pd.DataFrame([VALID_RECORD] * 4)
+    df.loc[1, "soil_ph"] = "not-a-number"
+    df.loc[2, "soil_drainage"] = "Swampy"
+    df.loc[3, "culvert_age"] = "5.5"
+
+    records, errors = validate_frame(df)
+    assert errors[0] == ""
+    assert errors[1] == "Invalid soil_ph."
+    assert errors[2] == "Invalid soil drainage option."
+    assert errors[3] == "Invalid culvert_age."
+    assert records.loc[0, "soil_ph"] == 6.5
+
+@pytest.mark.parametrize("value", ["inf", "-inf", "Infinity", "1e39", "-1e39"])
+def test_validate_frame_rejects_numbers_the_models_cannot_take(value):
+    """Infinite numbers and numbers too big for float32 should be marked invalid instead of reaching the models."""
+    from src.rate.functions import validate_frame
+
+    df = pd.DataFrame([VALID_RECORD] * 2)
+    df.loc[1, "culvert_length"] = value
+
+    records, errors = validate_frame(df)
+    assert errors.tolist() == ["", "Invalid culvert_length."]
+
+def test_validate_frame_missing_columns():
+    """A batch without the required columns should be rejected."""
+    from src.rate.functions import validate_frame
+
+    with pytest.raises(ValueError):
+        validate_frame(pd.DataFrame({"soil_ph": ["6.5"]}))
+
+def test_predict_ensemble_single_and_batch_agree():
+    """Rating a record on its own and inside a batch should give the same predictions."""
+    from src.encoder import FeatureEncoder
+    from src.registry import LoadedModel
+    from src.rate.functions import validate_record, validate_frame, predict_ensemble
+
+    class SumModel:
+        def predict(self, features):
+            return features.sum(axis=1)
+
+    encoder = FeatureEncoder(["Age", "Soil_Drainage_Class", "mat_Aluminum", "type_Box"])
+    models = [LoadedModel("Sum", SumModel(), encoder)]
+    other = dict(VALID_RECORD, soil_drainage="Poorly drained", culvert_material="Aluminum", culvert_shape="Box")
+
+    records, errors = validate_frame(pd.DataFrame([VALID_RECORD, other]))
+    batch, batch_timed_out = predict_ensemble(models, records)
+    single, single_timed_out = predict_ensemble(models, validate_record(other))
+
+    # Age 5 + Well drained (4) with no one-hot columns, then Age 5 + Poorly drained (1) + Aluminum + Box
+    assert batch[0][1].tolist() == [9, 8]
+    assert single[0][1].tolist() == [8]
+    assert batch_timed_out == single_timed_out == []
@@ -0,0 +1,43 @@
+import threading
+import time
+
+
+def test_executor_keeps_task_order():
+    """Results should come back in the order the tasks were given, not the order they finish."""
+    from src.rate.inference import InferenceExecutor
+
+    executor = InferenceExecutor(max_workers=3, timeout=5)
+    tasks = [
+        ("slow", lambda: time.sleep(0.2) or "slow"),
+        ("fast", lambda: "fast"),
+        ("medium", lambda: time.sleep(0.1) or "medium"),
+    ]
+    results, timed_out = executor.run(tasks)
+
+    assert results == [("slow", "slow"), ("fast", "fast"), ("medium", "medium")]
+    assert timed_out == []
+
+
+def test_executor_runs_tasks_at_the_same_time():
+    """Every task should be running at once when the pool is big enough."""
+    from src.rate.inference import InferenceExecutor
+
+    barrier = threading.Barrier(3, timeout=2)
+    executor = InferenceExecutor(max_workers=3, timeout=5)
+    results, timed_out = executor.run([(str(i), barrier.wait) for i in range(3)])
+
+    assert len(results) == 3
+    assert timed_out == []
+
+
+def test_executor_reports_timed_out_tasks():
+    """A task that is slower than the timeout should be reported and the others still returned."""
+    from src.rate.inference import InferenceExecutor
+
+    release = threading.Event()
+    executor = InferenceExecutor(max_workers=2, timeout=5)
+    results, timed_out = executor.run([("stuck", lambda: release.wait(2)), ("quick", lambda: 4)], timeout=0.1)
+    release.set()
+
+    assert results == [("quick", 4)]
+    assert timed_out == ["stuck"]
@@ -0,0 +1,37 @@
+def test_histogram_renders_cumulative_buckets():
+    """Observations should be counted into cumulative buckets with their sum and count."""
+    from src.metrics import MetricsRegistry, Histogram
+
+    registry = MetricsRegistry()
+    histogram = Histogram(registry, "test_seconds", "A test histogram.", labels=("stage",), buckets=(0.1, 1.0))
+    histogram.observe(0.05, "parse")
+    histogram.observe(0.5, "parse")
+    histogram.observe(5.0, "parse")
+
+    text = registry.render()
+    assert "# TYPE test_seconds histogram" in text
+    assert 'test_seconds_bucket{stage="parse",le="0.1"} 1' in text
+    assert 'test_seconds_bucket{stage="parse",le="1.0"} 2' in text
+    assert 'test_seconds_bucket{stage="parse",le="+Inf"} 3' in text
+    assert 'test_seconds_sum{stage="parse"} 5.55' in text
+    assert 'test_seconds_count{stage="parse"} 3' in text
+
+def test_disabled_metrics_record_nothing():
+    """Timers and counters should do nothing while the metrics are turned off."""
+    from src.metrics import MetricsRegistry, Histogram, Counter
+
+    registry = MetricsRegistry(enabled=False)
+    histogram = Histogram(registry, "test_seconds", "A test histogram.")
+    counter = Counter(registry, "test_total", "A test counter.", labels=("model",))
+
+    with histogram.time():
+        pass
+    counter.inc("XGBoost")
+
+    assert histogram.collect() == []
+    assert counter.collect() == []
+
+def test_metrics_requires_admin(client):
+    """The metrics endpoint should redirect home when nobody is logged in."""
+    response = client.get("/admin/metrics")
+    assert response.status_code == 302
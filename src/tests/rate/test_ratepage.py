@@ -34,6 +34,9 @@ def test_post_ratepage(client):
     # Checks that the submission was successful
     assert b"Rating Submitted Properly" in response.data
 
+    # Checks that the ratings are explained
+    assert b"most influenced by" in response.data
+
 def test_post_missing_fields_is_not_success(client):
     """Omit required fields and assert submission is not considered successful."""
     data = {
@@ -109,4 +112,99 @@ def test_methods_not_allowed(client):
     assert resp.status_code == 405
 
 
-# TODO: Add more tests when David is done with the rate page logic
\ No newline at end of file
+def test_batch_without_file_is_rejected(client):
+    """Posting to the batch route without a CSV should redirect back to the form."""
+    resp = client.post("/rate/batch", data={}, follow_redirects=True)
+    assert resp.status_code == 200
+    assert b"Please choose a CSV file to rate." in resp.data
+
+def test_batch_with_wrong_columns_is_rejected(client):
+    """A CSV that does not have the rate form columns should not be rated."""
+    import io
+    data = {"file": (io.BytesIO(b"a,b\n1,2\n"), "inventory.csv")}
+    resp = client.post("/rate/batch", data=data, content_type="multipart/form-data", follow_redirects=True)
+    assert resp.status_code == 200
+    assert b"Invalid CSV" in resp.data
+
+def test_batch_leaves_invalid_rows_unrated(client):
+    """Rows that fail validation should come back with their error and an empty condition."""
+    import io
+
+    import pandas as pd
+
+    row = "6.5,Well drained,10.5,1.2,rare,Reinforced Concrete,Round,10,{}"
+    body = "\n".join([
+        "soil_ph,soil_drainage,soil_moisture,soil_ec,flood_frequency,culvert_material,culvert_shape,culvert_length,"
+        "culvert_age", row.format(5), row.format("inf"), row.format(7),
+    ])
+    resp = client.post("/rate/batch", data={"file": (io.BytesIO(body.encode()), "culverts.csv")})
+    assert resp.status_code == 200
+
+    result = pd.read_csv(io.BytesIO(resp.data), keep_default_na=False)
+    assert result["error"].tolist() == ["", "Invalid culvert_age.", ""]
+    assert result["condition"][1] == ""
+    assert result["condition"][0].startswith("The culvert is in") and result["condition"][2].startswith("The culvert is in")
+
+def test_api_predict_rejects_non_json(client):
+    """The JSON API should answer a body that is not JSON with a 400 error."""
+    resp = client.post("/rate/api/predict", data="not json")
+    assert resp.status_code == 400
+    assert "error" in resp.get_json()
+
+def test_api_predict_rejects_invalid_record(client):
+    """A single invalid record should be rejected with its validation error."""
+    record = {
+        "soil_ph": "6.5",
+        "soil_drainage": "Well drained",
+        "soil_moisture": "10.5",
+        "soil_ec": "not-a-number",
+        "flood_frequency": "rare",
+        "culvert_material": "Reinforced Concrete",
+        "culvert_shape": "Round",
+        "culvert_length": "10",
+        "culvert_age": "5",
+    }
+    resp = client.post("/rate/api/predict", json=record)
+    assert resp.status_code == 400
+    assert resp.get_json() == {"error": "Invalid soil_ec."}
+
+def test_api_predict_rejects_infinite_numbers(client):
+    """A number the models cannot take should be a validation error, not a server error."""
+    record = {
+        "soil_ph": "6.5", "soil_drainage": "Well drained", "soil_moisture": "10.5", "soil_ec": "1.2",
+        "flood_frequency": "rare", "culvert_material": "Reinforced Concrete", "culvert_shape": "Round",
+        "culvert_length": "1e39", "culvert_age": "5",
+    }
+    resp = client.post("/rate/api/predict", json=record)
+    assert resp.status_code == 400
+    assert resp.get_json() == {"error": "Invalid culvert_length."}
+    assert client.post("/rate/api/predict", json=dict(record, culvert_length=True)).status_code == 400
+
+    resp = client.post("/rate/api/predict", json=[dict(record, culvert_length="10"), dict(record, soil_ph="inf")])
+    assert resp.status_code == 200
+    assert resp.get_json()["results"][1] == {"error": "Invalid soil_ph."}
+
+def test_api_predict_methods_not_allowed(client):
+    """The JSON API only accepts POST requests."""
+    resp = client.put("/rate/api/predict")
+    assert resp.status_code == 405
+
+def test_api_predict_explains_predictions(client):
+    """Asking the API to explain should give every model's contribution of each field, adding up to its score."""
+    from src.encoder import explained_fields
+
+    record = {
+        "soil_ph": "6.5", "soil_drainage": "Well drained", "soil_moisture": "10.5", "soil_ec": "1.2",
+        "flood_frequency": "rare", "culvert_material": "Reinforced Concrete", "culvert_shape": "Round",
+        "culvert_length": "10", "culvert_age": "5",
+    }
+    resp = client.post("/rate/api/predict?explain=true", json=[record, record])
+    assert resp.status_code == 200
+
+    first, second = resp.get_json()["results"]
+    assert first["explanations"] == second["explanations"]
+    for explanation in first["explanations"].values():
+        assert sorted(explanation) == sorted(explained_fields + ["base"])
+
+    assert "explanations" not in client.post("/rate/api/predict", json=record).get_json()
+
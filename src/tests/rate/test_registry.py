@@ -0,0 +1,76 @@
+import os
+import pickle
+
+
+def write_model(path, value):
+    from src.encoder import FeatureEncoder, encoder_path
+
+    with open(path, "wb") as f:
+        pickle.dump(value, f)
+    FeatureEncoder(["Age", "length"]).save(encoder_path(str(path)))
+
+
+def test_registry_loads_each_model_once(tmp_path):
+    """Models should only be unpickled the first time they are requested."""
+    from src.registry import ModelRegistry
+
+    write_model(tmp_path / "randomForest.pkl", {"name": "rf"})
+    calls = []
+
+    def loader():
+        calls.append(1)
+        return [("Random Forest", "/randomForest.pkl", "pickle"), ("Missing", "/missing.pkl", "pickle")]
+
+    registry = ModelRegistry(entries_loader=loader)
+    first = registry.get_models(str(tmp_path))
+    second = registry.get_models(str(tmp_path))
+
+    # The missing model is skipped and the same object is returned both times
+    assert [entry.model_name for entry in first] == ["Random Forest"]
+    assert first[0][1] is second[0][1]
+    assert len(calls) == 1
+
+
+def test_registry_reloads_changed_file(tmp_path):
+    """A model file replaced on disk should be reloaded on the next request."""
+    from src.registry import ModelRegistry
+
+    path = tmp_path / "xgboost.pkl"
+    write_model(path, "old")
+    registry = ModelRegistry(entries_loader=lambda: [("XGBoost", "/xgboost.pkl", "pickle")])
+    assert registry.get_models(str(tmp_path))[0][1] == "old"
+
+    # Replace the file the same way save_models promotes a model
+    with open(tmp_path / "new.pkl", "wb") as f:
+        pickle.dump("new model", f)
+    os.replace(tmp_path / "new.pkl", path)
+    assert registry.get_models(str(tmp_path))[0][1] == "new model"
+
+
+def test_registry_invalidate_reloads_metadata(tmp_path):
+    """Invalidating the registry should re-read the metadata and bump the version."""
+    from src.registry import ModelRegistry
+
+    write_model(tmp_path / "a.pkl", "a")
+    write_model(tmp_path / "b.pkl", "b")
+    entries = [("A", "/a.pkl", "pickle")]
+    registry = ModelRegistry(entries_loader=lambda: list(entries))
+    assert len(registry.get_models(str(tmp_path))) == 1
+
+    entries.append(("B", "/b.pkl", "pickle"))
+    assert len(registry.get_models(str(tmp_path))) == 1
+
+    version = registry.version
+    registry.invalidate()
+    assert registry.version == version + 1
+    assert [entry.model_name for entry in registry.get_models(str(tmp_path))] == ["A", "B"]
+
+
+def test_registry_skips_model_without_encoder(tmp_path):
+    """A model with no encoder file and no recorded feature names cannot be served."""
+    from src.registry import ModelRegistry
+
+    with open(tmp_path / "unknown.pkl", "wb") as f:
+        pickle.dump("no feature names", f)
+    registry = ModelRegistry(entries_loader=lambda: [("Unknown", "/unknown.pkl", "pickle")])
+    assert registry.get_models(str(tmp_path)) == []
@@ -0,0 +1,41 @@
+import os
+import signal
+
+def test_request_reload_without_server(app):
+    """Nothing should be signalled when the app is not run by the production server."""
+    from src.serving import request_reload
+
+    with app.app_context():
+        assert request_reload() is False
+
+def test_request_reload_signals_server(app):
+    """A reload should send SIGHUP to the server parent recorded in the config."""
+    from src.serving import request_reload
+
+    received = []
+    previous = signal.signal(signal.SIGHUP, lambda signum, frame: received.append(signum))
+    try:
+        app.config["SERVER_PID"] = os.getpid()
+        with app.app_context():
+            assert request_reload() is True
+    finally:
+        signal.signal(signal.SIGHUP, previous)
+
+    assert received == [signal.SIGHUP]
+
+def test_preload_models_with_no_models(tmp_path):
+    """Preloading an instance without models should load nothing and leave the app usable."""
+    import gc
+    from src.app import create_app, db
+    from src.registry import model_registry
+    from src.serving import preload_models
+
+    app = create_app(config={"SQLALCHEMY_DATABASE_URI": f"sqlite:///{tmp_path}/admin.db"}, instance_path=str(tmp_path))
+    with app.app_context():
+        db.create_all()
+
+    try:
+        assert preload_models(app) == 0
+    finally:
+        gc.unfreeze()
+        model_registry.invalidate()  # the other tests use the models of the default instance
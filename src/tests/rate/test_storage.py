@@ -0,0 +1,97 @@
+import os
+import pickle
+
+import numpy as np
+
+
+def small_models():
+    from sklearn.ensemble import RandomForestClassifier
+    from xgboost import XGBClassifier
+
+    X = np.random.default_rng(0).random((60, 3)).astype(np.float32)
+    y = np.arange(60) % 3
+    return X, RandomForestClassifier(n_estimators=5, random_state=0).fit(X, y), XGBClassifier(n_estimators=5).fit(X, y)
+
+
+def test_native_formats_round_trip(tmp_path):
+    """Models saved in their native format should predict the same once they are loaded again."""
+    from src.storage import native_format, model_file, save_model, load_model
+
+    X, forest, booster = small_models()
+    for model, expected in [(forest, "joblib-mmap"), (booster, "xgboost-ubj")]:
+        model_format = native_format(model)
+        assert model_format == expected
+
+        path = model_file(str(tmp_path / "model.pkl"), model_format)
+        save_model(model, path, model_format)
+        loaded = load_model(path, model_format)
+
+        assert np.array_equal(loaded.predict_proba(X), model.predict_proba(X))
+
+    assert native_format({"not": "a model"}) == "pickle"
+
+
+def test_registry_migrates_pickled_models(tmp_path):
+    """A pickled model should be served as it is until it is migrated, which writes it again in its native format,
+    updates its AIModels entry and lists the new file in the manifest of its version."""
+    from src.registry import ModelRegistry
+    from src.encoder import FeatureEncoder, encoder_path
+    from src.versions import write_manifest, read_manifest
+
+    X, forest, _ = small_models()
+    with open(tmp_path / "randomForest.pkl", "wb") as f:
+        pickle.dump(forest, f)
+    FeatureEncoder(["a", "b", "c"]).save(encoder_path(str(tmp_path / "randomForest.pkl")))
+
+    entries = [("Random Forest", "/randomForest.pkl", "pickle")]
+    migrated = []
+
+    def migrator(model_name, file_path, model_format):
+        migrated.append((model_name, file_path, model_format))
+        entries[0] = (model_name, file_path, model_format)
+
+    write_manifest(str(tmp_path), "v1")
+    registry = ModelRegistry(entries_loader=lambda: list(entries), migrator=migrator)
+    first = registry.get_models(str(tmp_path))
+    assert migrated == []
+
+    assert registry.migrate(str(tmp_path)) == 1
+    assert migrated == [("Random Forest", "/randomForest.joblib", "joblib-mmap")]
+    assert os.path.exists(tmp_path / "randomForest.pkl")
+    assert "randomForest.joblib" in read_manifest(str(tmp_path))["files"]
+    assert registry.migrate(str(tmp_path)) == 0
+
+    # The next request is served from the migrated file
+    second = registry.get_models(str(tmp_path))
+    assert second[0].signature != first[0].signature
+    assert np.array_equal(second[0].model.predict(X), forest.predict(X))
+    assert len(migrated) == 1
+
+
+def test_save_model_uses_a_unique_temporary_file(tmp_path, monkeypatch):
+    """Each save should write its own temporary file and leave nothing behind when it fails."""
+    import pytest
+    from src.storage import save_model, formats
+
+    temp_paths = []
+    original = formats["pickle"].save
+
+    def save(model, path):
+        temp_paths.append(path)
+        original(model, path)
+
+    monkeypatch.setattr(formats["pickle"], "save", save)
+    save_model({"a": 1}, str(tmp_path / "model.pkl"), "pickle")
+    save_model({"a": 2}, str(tmp_path / "model.pkl"), "pickle")
+
+    assert len(set(temp_paths)) == 2
+    assert all(path.endswith(".tmp.pkl") for path in temp_paths)
+    assert os.listdir(tmp_path) == ["model.pkl"]
+
+    def failing_save(model, path):
+        raise OSError("disk full")
+
+    monkeypatch.setattr(formats["pickle"], "save", failing_save)
+    with pytest.raises(OSError):
+        save_model({"a": 3}, str(tmp_path / "model.pkl"), "pickle")
+    assert os.listdir(tmp_path) == ["model.pkl"]
@@ -0,0 +1,74 @@
+import os
+import pickle
+
+
+def write_version(directory, value):
+    from src.encoder import FeatureEncoder, encoder_path
+
+    os.makedirs(directory)
+    with open(directory / "model.pkl", "wb") as f:
+        pickle.dump(value, f)
+    FeatureEncoder(["Age", "length"]).save(encoder_path(str(directory / "model.pkl")))
+
+
+def test_promote_adopts_legacy_directories(tmp_path):
+    """The old plain current directory and timestamp directories should become versions."""
+    from src.versions import create_version, current_version, list_versions, promote
+
+    write_version(tmp_path / "current", "current")
+    write_version(tmp_path / "2025-01-01_00.00.00", "old")
+    write_version(tmp_path / "tmp", "new")
+
+    version_id = create_version(str(tmp_path), str(tmp_path / "tmp"))
+    promote(str(tmp_path), version_id)
+
+    assert current_version(str(tmp_path)) == version_id
+    assert not os.path.exists(tmp_path / "tmp")
+    assert not os.path.exists(tmp_path / "2025-01-01_00.00.00")
+    versions = list_versions(str(tmp_path))
+    assert len(versions) == 3
+    assert versions[0]["version"] == "2025-01-01_00.00.00"
+    assert [version["current"] for version in versions] == [False, False, True]
+    assert versions[-1]["files"] == ["model.encoder.json", "model.pkl"]
+
+
+def test_rollback_and_prune(tmp_path):
+    """Rolling back should promote the previous version and pruning should never remove the current one."""
+    from src.versions import create_version, current_version, promote, prune_versions, rollback
+
+    ids = []
+    for value in ["a", "b", "c", "d"]:
+        write_version(tmp_path / "tmp", value)
+        ids.append(create_version(str(tmp_path), str(tmp_path / "tmp")))
+        promote(str(tmp_path), ids[-1])
+
+    assert rollback(str(tmp_path)) == ids[2]
+    assert current_version(str(tmp_path)) == ids[2]
+
+    promote(str(tmp_path), ids[0])
+    assert prune_versions(str(tmp_path), keep=2) == [ids[1]]
+    assert sorted(os.listdir(tmp_path / "versions")) == [ids[0], ids[2], ids[3]]
+
+
+def test_registry_swaps_whole_versions(tmp_path):
+    """The registry should serve one version at a time and switch back to the previous one without loading it."""
+    from src.registry import ModelRegistry
+    from src.versions import create_version, promote, rollback
+
+    write_version(tmp_path / "tmp", "first")
+    first = create_version(str(tmp_path), str(tmp_path / "tmp"))
+    promote(str(tmp_path), first)
+
+    registry = ModelRegistry(entries_loader=lambda: [("Model", "/model.pkl", "pickle")], migrator=None)
+    model_dir = str(tmp_path / "current")
+    assert registry.get_models(model_dir)[0].model == "first"
+
+    write_version(tmp_path / "tmp", "second")
+    promote(str(tmp_path), create_version(str(tmp_path), str(tmp_path / "tmp")))
+    assert registry.get_models(model_dir)[0].model == "second"
+
+    # The first ensemble is still in memory so the rollback loads nothing
+    loaded = dict(registry._models)
+    rollback(str(tmp_path))
+    assert registry.get_models(model_dir)[0].model == "first"
+    assert registry._models == loaded
@@ -0,0 +1,113 @@
+import csv
+import io
+import os
+import shutil
+import tempfile
+import time
+
+from flask import Request, current_app, request, flash, redirect, url_for, jsonify
+
+# Files no bigger than this are kept in memory, anything bigger (or of unknown size) is written to instance/uploads
+SPOOL_MEMORY_SIZE = 512 * 1024
+
+# Spooled files left behind by a worker that was killed mid request are removed once they are this old
+STALE_UPLOAD_SECONDS = 24 * 60 * 60
+
+SPOOL_PREFIX = "upload-"
+
+
+def upload_dir(app) -> str:
+    return os.path.join(app.instance_path, "uploads")
+
+
+class SpooledRequest(Request):
+    '''
+    This is the request class of the app. Werkzeug spools big uploads to an anonymous file in the system temp
+    directory, which has no name and is copied again when the view saves it. This spools them to a named file under
+    instance/uploads instead, so a job can hard link the upload into its directory (see save_upload) and the file is
+    on the same disk as everything else the upload turns into.
+    The size of the whole request is capped by MAX_CONTENT_LENGTH before any of it is read.
+    '''
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        if total_content_length is not None and total_content_length <= SPOOL_MEMORY_SIZE:
+            return io.BytesIO()
+
+        directory = upload_dir(current_app)
+        os.makedirs(directory, exist_ok=True)
+
+        # The file is removed when werkzeug closes it at the end of the request
+        return tempfile.NamedTemporaryFile("wb+", dir=directory, prefix=SPOOL_PREFIX, suffix=".part")
+
+
+def spooled_path(file):
+    '''
+    This function will return the path of the file an upload was spooled to
+    :param file: The uploaded file
+    :return: The path or None if the upload is in memory
+    '''
+    name = getattr(file.stream, "name", None)
+    return name if isinstance(name, str) and os.path.exists(name) else None
+
+
+def save_upload(file, path):
+    '''
+    This function will save an upload to a path, an upload spooled to disk is hard linked so it is not copied
+    :param file: The uploaded file
+    :param path: The path the upload is saved to
+    '''
+    source = spooled_path(file)
+    if source is not None:
+        file.stream.flush()
+        try:
+            os.link(source, path)
+            return
+        except OSError:
+            # The instance directory is on a file system without hard links (or the path is on another one)
+            shutil.copyfile(source, path)
+            return
+    file.save(path)
+
+
+def read_header(file) -> list:
+    '''
+    This function will read the column names of an uploaded CSV without reading any of its rows
+    :param file: The uploaded file
+    :return: The column names, empty if the file is empty
+    '''
+    header = next(csv.reader([file.stream.readline().decode("utf-8-sig", errors="replace")]), [])
+    file.stream.seek(0)
+    return header
+
+
+def upload_too_large(error):
+    '''
+    This function is the handler of a request that is bigger than MAX_CONTENT_LENGTH
+    '''
+    limit = f"{current_app.config['MAX_CONTENT_LENGTH'] / 1024 ** 2:.0f} MB"
+
+    # The batch rating is a form so it goes back to the rate page, the admin uploads are fetched and read the JSON
+    if request.blueprint == "rate":
+        flash(f"The file is too large, uploads are limited to {limit}.", "danger")
+        return redirect(url_for("rate.index"))
+    return jsonify({"error": f"The upload is too large, uploads are limited to {limit}."}), 413
+
+
+def remove_stale_uploads(app):
+    '''
+    This function will remove the spooled uploads that were left behind by workers that stopped mid request
+    :param app: The flask app
+    '''
+    directory = upload_dir(app)
+    if not os.path.isdir(directory):
+        return
+
+    cutoff = time.time() - STALE_UPLOAD_SECONDS
+    for file_name in os.listdir(directory):
+        full_file_name = os.path.join(directory, file_name)
+        try:
+            if file_name.startswith(SPOOL_PREFIX) and os.path.getmtime(full_file_name) < cutoff:
+                os.remove(full_file_name)
+        except OSError:
+            # Another worker removed it first
+            pass
@@ -0,0 +1,237 @@
+import hashlib
+import json
+import os
+import re
+import shutil
+from datetime import datetime
+
+# instance/current is a symlink to one of the directories in instance/versions, each holding a complete model set
+VERSIONS_DIR = "versions"
+CURRENT = "current"
+MANIFEST = "manifest.json"
+
+# The number of model sets kept, including the current one, the older ones can be rolled back to
+RETAINED_VERSIONS = 3
+
+# The name of the timestamp directories save_models used to move the replaced models into
+_timestamp = re.compile(r"^\d{4}-\d{2}-\d{2}_\d{2}\.\d{2}\.\d{2}(-\d+)?$")
+
+
+def versions_dir(db_path) -> str:
+    return os.path.join(db_path, VERSIONS_DIR)
+
+
+def version_dir(db_path, version_id) -> str:
+    return os.path.join(db_path, VERSIONS_DIR, version_id)
+
+
+def _new_version_id(db_path) -> str:
+    '''
+    This function will name a new version after the current time, the names sort in the order they were made
+    '''
+    base = datetime.now().strftime("%Y-%m-%d_%H.%M.%S")  # Format: YYYY-MM-DD_HH.MM.SS
+    version_id = base
+    count = 1
+    while os.path.exists(version_dir(db_path, version_id)):
+        count += 1
+        version_id = f"{base}-{count}"
+    return version_id
+
+
+def _sha256(path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def write_manifest(directory, version_id, created=None):
+    '''
+    This function will list every file of a model set with its size and hash in the manifest of its directory,
+    a directory is only a complete version once it has a manifest
+    :param directory: The directory of the version
+    :param version_id: The name of the version
+    :param created: When the version was made, now by default (a manifest written again keeps its time)
+    '''
+    files = {
+        file_name: {"size": os.path.getsize(os.path.join(directory, file_name)),
+                    "sha256": _sha256(os.path.join(directory, file_name))}
+        for file_name in sorted(os.listdir(directory))
+        if file_name != MANIFEST and os.path.isfile(os.path.join(directory, file_name))
+    }
+    manifest = {"version": version_id, "created": created or datetime.now().isoformat(timespec="seconds"),
+                "files": files}
+
+    # Written to a temporary file first so a reader never sees half a manifest
+    path = os.path.join(directory, MANIFEST)
+    with open(path + ".tmp", "w") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(path + ".tmp", path)
+
+
+def read_manifest(directory):
+    '''
+    This function will read the manifest of a version directory
+    :param directory: The directory of the version
+    :return: The manifest or None if the directory is not a complete version
+    '''
+    try:
+        with open(os.path.join(directory, MANIFEST)) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def _carry_over(db_path, source_dir):
+    '''
+    This function will link the files of the current models that source_dir has no new files for into source_dir,
+    so a version made from some of the models (e.g. the best model of a search) still holds the whole ensemble
+    '''
+    current = os.path.join(db_path, CURRENT)
+    if not os.path.isdir(current):
+        return
+
+    # A file belongs to the model named before its first dot (randomForest.joblib, randomForest.encoder.json)
+    staged = {file_name.split(".", 1)[0] for file_name in os.listdir(source_dir)}
+    manifest = read_manifest(current)
+    file_names = manifest["files"] if manifest is not None else os.listdir(current)
+
+    for file_name in file_names:
+        path = os.path.join(current, file_name)
+        if file_name == MANIFEST or file_name.split(".", 1)[0] in staged or not os.path.isfile(path):
+            continue
+        # The files of a version are never written to again so the new version can share them
+        try:
+            os.link(path, os.path.join(source_dir, file_name))
+        except OSError:
+            shutil.copy2(path, os.path.join(source_dir, file_name))
+
+
+def create_version(db_path, source_dir) -> str:
+    '''
+    This function will turn a directory of trained models into a new version, the directory is moved in one rename.
+    The current models that were not trained again are carried over into it.
+    :param db_path: The instance directory
+    :param source_dir: The directory holding the models and their encoders (normally instance/tmp)
+    :return: The name of the new version
+    '''
+    _carry_over(db_path, source_dir)
+
+    # The models being replaced are adopted first so they sort before the new version
+    _adopt_legacy(db_path)
+    version_id = _new_version_id(db_path)
+    os.rename(source_dir, version_dir(db_path, version_id))
+    write_manifest(version_dir(db_path, version_id), version_id)
+    return version_id
+
+
+def current_version(db_path):
+    '''
+    This function will return the name of the version instance/current points at
+    :param db_path: The instance directory
+    :return: The name of the version or None if there is no versioned model set
+    '''
+    current = os.path.join(db_path, CURRENT)
+    if not os.path.islink(current):
+        return None
+    return os.path.basename(os.path.normpath(os.readlink(current)))
+
+
+def list_versions(db_path) -> list:
+    '''
+    This function will list the retained versions from the oldest to the newest
+    :param db_path: The instance directory
+    :return: A list of dicts with the name, creation time, files and whether the version is the current one
+    '''
+    current = current_version(db_path)
+    versions = []
+    if os.path.isdir(versions_dir(db_path)):
+        for version_id in sorted(os.listdir(versions_dir(db_path))):
+            manifest = read_manifest(version_dir(db_path, version_id))
+            if manifest is not None:
+                versions.append({
+                    "version": version_id,
+                    "created": manifest["created"],
+                    "files": sorted(manifest["files"]),
+                    "current": version_id == current,
+                })
+    return versions
+
+
+def _adopt_legacy(db_path):
+    '''
+    This function will move the model directories of the old layout (a plain instance/current directory and the
+    timestamp directories next to it) into instance/versions so they can be promoted and rolled back to
+    '''
+    os.makedirs(versions_dir(db_path), exist_ok=True)
+    for name in os.listdir(db_path):
+        if _timestamp.match(name) and os.path.isdir(os.path.join(db_path, name)):
+            os.rename(os.path.join(db_path, name), version_dir(db_path, name))
+            write_manifest(version_dir(db_path, name), name)
+
+    current = os.path.join(db_path, CURRENT)
+    if os.path.isdir(current) and not os.path.islink(current):
+        if os.listdir(current):
+            version_id = _new_version_id(db_path)
+            os.rename(current, version_dir(db_path, version_id))
+            write_manifest(version_dir(db_path, version_id), version_id)
+        else:
+            os.rmdir(current)
+
+
+def promote(db_path, version_id):
+    '''
+    This function will make a version the current one by replacing the instance/current symlink in one rename,
+    a reader sees either the whole old model set or the whole new one
+    :param db_path: The instance directory
+    :param version_id: The name of the version
+    :raises ValueError: If the version does not exist or is not complete
+    '''
+    if read_manifest(version_dir(db_path, version_id)) is None:
+        raise ValueError(f"There is no version {version_id}.")
+
+    _adopt_legacy(db_path)
+
+    # The link is relative so the instance directory can be moved
+    link = os.path.join(db_path, CURRENT)
+    temp_link = f"{link}.{os.getpid()}.tmp"
+    if os.path.lexists(temp_link):
+        os.remove(temp_link)
+    os.symlink(os.path.join(VERSIONS_DIR, version_id), temp_link)
+    os.replace(temp_link, link)
+
+
+def rollback(db_path, version_id=None) -> str:
+    '''
+    This function will promote an earlier version again
+    :param db_path: The instance directory
+    :param version_id: The name of the version, by default the newest version older than the current one
+    :return: The name of the version that is now current
+    :raises ValueError: If there is no version to roll back to
+    '''
+    if version_id is None:
+        current = current_version(db_path)
+        older = [version["version"] for version in list_versions(db_path)
+                 if current is None or version["version"] < current]
+        if not older:
+            raise ValueError("There is no earlier version to roll back to.")
+        version_id = older[-1]
+
+    promote(db_path, version_id)
+    return version_id
+
+
+def prune_versions(db_path, keep=RETAINED_VERSIONS) -> list:
+    '''
+    This function will delete the oldest versions so only the newest ones are kept, the current version is never deleted
+    :param db_path: The instance directory
+    :param keep: The number of versions kept
+    :return: The names of the deleted versions
+    '''
+    current = current_version(db_path)
+    versions = [version["version"] for version in list_versions(db_path)]
+    removed = [version_id for version_id in versions[:max(0, len(versions) - keep)] if version_id != current]
+    for version_id in removed:
+        shutil.rmtree(version_dir(db_path, version_id))
+    return removed